@@ -1,20 +1,234 @@
-from constants import GEMINI_KEY, OPENAI_KEY, ANTHROPIC_KEY
+from constants import CACHE_PATH, CACHE_MAX_BYTES, RATE_LIMITS, MAX_RETRIES, PRICES, HTTP_POOL
+from pipeline.cache import shared_cache, cache_enabled
+from pipeline.telemetry import record, timed_call, mark_first_token
+from scheduler import scheduler_for, estimate_tokens, log_usage, ProviderScheduler
+import constants # API keys are read when the first client is built
+import importlib.util
+import threading
+import asyncio
+import weakref
+import random
+import time
 
-class GeminiAgent():
+class Agent():
     def __init__(self) -> None:
-        from google import generativeai
-        generativeai.configure(api_key=GEMINI_KEY)
-        self.client = generativeai.GenerativeModel("gemini-2.5-pro")
+        # parsed responses are replayed from disk unless MPCO_NO_CACHE is set
+        self.cache = shared_cache(CACHE_PATH, CACHE_MAX_BYTES) if cache_enabled() else None
+        self.usage = [] # one entry per provider call - tokens & prompt cache hits
+
+    def _record_usage(self, response) -> None:
+        # also logs latency, time to first token & cost, tagged with the results row being worked on
+        usage = self._usage(response)
+        log_usage(self.usage, usage)
+        record(usage, self.model_name, self.model_id, PRICES.get(self.model_name))
+
+    def _usage(self, response) -> dict:
+        raise NotImplementedError("No usage parser defined for this Agent")
+
+    def prompt_cache_stats(self, since : int = 0) -> dict:
+        calls = self.usage[since:]
+        input_tokens = sum(call['input_tokens'] for call in calls)
+        cached_tokens = sum(call['cached_tokens'] for call in calls)
+        return {'calls': len(calls),
+                'input_tokens': input_tokens,
+                'cached_tokens': cached_tokens,
+                'hit_rate': cached_tokens / input_tokens if input_tokens else 0.0}
+
+    @property
+    def scheduler(self):
+        # rate limits, backoff & Retry-After for every call to this provider
+        return scheduler_for(self.model_name, {**RATE_LIMITS[self.model_name], 'max_retries': MAX_RETRIES})
+
+    def _cached(self, request : dict, call):
+        call = _timed(call)
+        if self.cache is None:
+            return self.scheduler.run(call, request)
+
+        key = self.cache.key(self.model_name, self.model_id, request)
+        value = self.cache.get(key)
+        if value is None:
+            value = self.scheduler.run(call, request)
+            self.cache.put(key, value)
+        return value
+
+    async def _acached(self, request : dict, acall):
+        acall = _atimed(acall)
+        if self.cache is None:
+            return await self.scheduler.arun(acall, request)
+
+        key = self.cache.key(self.model_name, self.model_id, request)
+        value = self.cache.get(key)
+        if value is None:
+            value = await self.scheduler.arun(acall, request)
+            self.cache.put(key, value)
+        return value
+
+class GeminiAgent(Agent):
+    def __init__(self) -> None:
+        super().__init__()
+        self.client = shared_client("25", _gemini_client)
         self.model_name = "25"
+        self.model_id = "gemini-2.5-pro"
+
+    def _usage(self, response) -> dict:
+        # 2.5 models cache repeated prefixes implicitly
+        usage = getattr(response, 'usage_metadata', None)
+        return {'input_tokens': _tokens(usage, 'prompt_token_count'),
+                'output_tokens': _tokens(usage, 'candidates_token_count'),
+                'cached_tokens': _tokens(usage, 'cached_content_token_count'),
+                'cache_write_tokens': 0}
 
-class OpenAIAgent():
+    @property
+    def aclient(self):
+        # GenerativeModel serves both - generate_content_async is the async entry point
+        return self.client
+
+class OpenAIAgent(Agent):
     def __init__(self) -> None:
+        super().__init__()
         from openai import OpenAI
-        self.client = OpenAI(api_key=OPENAI_KEY)
+        self.client = shared_client("4o", lambda: OpenAI(api_key=constants.OPENAI_KEY, http_client=_http_client()))
         self.model_name = "4o"
+        self.model_id = "gpt-4o"
+
+    def _usage(self, completion) -> dict:
+        # prompts over 1024 tokens are prefix-cached automatically
+        usage = getattr(completion, 'usage', None)
+        return {'input_tokens': _tokens(usage, 'prompt_tokens'),
+                'output_tokens': _tokens(usage, 'completion_tokens'),
+                'cached_tokens': _tokens(getattr(usage, 'prompt_tokens_details', None), 'cached_tokens'),
+                'cache_write_tokens': 0}
 
-class AnthroAgent():
+    @property
+    def aclient(self):
+        from openai import AsyncOpenAI
+        return shared_aclient("4o", lambda: AsyncOpenAI(api_key=constants.OPENAI_KEY, http_client=_http_client(True)))
+
+class AnthroAgent(Agent):
     def __init__(self) -> None:
+        super().__init__()
         from anthropic import Anthropic
-        self.client = Anthropic(api_key=ANTHROPIC_KEY)
-        self.model_name = "40"
\ No newline at end of file
+        self.client = shared_client("40", lambda: Anthropic(api_key=constants.ANTHROPIC_KEY, http_client=_http_client()))
+        self.model_name = "40"
+        self.model_id = "claude-sonnet-4-20250514"
+
+    def _usage(self, message) -> dict:
+        # input_tokens excludes cache reads & writes - fold them back in for a comparable total
+        usage = getattr(message, 'usage', None)
+        cached, written = _tokens(usage, 'cache_read_input_tokens'), _tokens(usage, 'cache_creation_input_tokens')
+        return {'input_tokens': _tokens(usage, 'input_tokens') + cached + written,
+                'output_tokens': _tokens(usage, 'output_tokens'),
+                'cached_tokens': cached,
+                'cache_write_tokens': written}
+
+    @property
+    def aclient(self):
+        from anthropic import AsyncAnthropic
+        return shared_aclient("40", lambda: AsyncAnthropic(api_key=constants.ANTHROPIC_KEY, http_client=_http_client(True)))
+
+class MockAgent(Agent):
+    """
+    Offline provider. Subclasses answer in `_respond(request)`; each answer
+    arrives after `latency` seconds, the first `ttft` of them before any output,
+    so the pipeline's own overhead can be measured without API keys.
+    """
+    def __init__(self, model_name : str = "4o", latency : float = 0, ttft : float = None, seed : int = None) -> None:
+        super().__init__()
+        self.cache = None # nothing worth replaying
+        self.model_name = model_name # impersonates a real model so its contexts & prompts apply
+        self.model_id = f"mock-{model_name}"
+        self.latency = latency
+        self.ttft = latency / 4 if ttft is None else min(ttft, latency)
+        self.random = random.Random(seed)
+        self._scheduler = ProviderScheduler(requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+
+    @property
+    def scheduler(self):
+        # unthrottled - and kept apart from the real provider's budget
+        return self._scheduler
+
+    def _respond(self, request : dict) -> str:
+        raise NotImplementedError("No responder defined for this MockAgent")
+
+    def _usage(self, response : dict) -> dict:
+        return {'input_tokens': estimate_tokens(response['request']),
+                'output_tokens': len(response['text']) // 4,
+                'cached_tokens': 0,
+                'cache_write_tokens': 0}
+
+    def _mock_call(self, request : dict) -> str:
+        time.sleep(self.ttft)
+        mark_first_token()
+        time.sleep(self.latency - self.ttft)
+        return self._answer(request)
+
+    async def _mock_acall(self, request : dict) -> str:
+        await asyncio.sleep(self.ttft)
+        mark_first_token()
+        await asyncio.sleep(self.latency - self.ttft)
+        return self._answer(request)
+
+    def _answer(self, request : dict) -> str:
+        text = self._respond(request)
+        self._record_usage({'request': request, 'text': text})
+        return text
+
+# one SDK client per provider - metaprompters, optimizers & batch jobs all reuse its keep-alive connections
+_clients = {}
+_aclients = weakref.WeakKeyDictionary() # event loop -> {provider: async client}
+_clients_lock = threading.Lock()
+
+def shared_client(provider : str, factory):
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = factory()
+        return _clients[provider]
+
+def shared_aclient(provider : str, factory):
+    # async connections belong to the loop that opened them - shared per loop, dropped with it
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _aclients.setdefault(loop, {})
+        if provider not in clients:
+            clients[provider] = factory()
+        return clients[provider]
+
+def reset_clients() -> None:
+    # forget every shared client - the next agent of each provider builds a new one (e.g. a patched SDK in tests)
+    with _clients_lock:
+        _clients.clear()
+        _aclients.clear()
+
+def http2_enabled() -> bool:
+    # HTTP/2 multiplexes concurrent calls over one connection - needs the optional h2 package
+    return HTTP_POOL['http2'] and importlib.util.find_spec('h2') is not None
+
+def _http_client(asynchronous : bool = False):
+    import httpx # ships with the openai & anthropic SDKs
+    limits = httpx.Limits(max_connections=HTTP_POOL['max_connections'],
+                          max_keepalive_connections=HTTP_POOL['max_keepalive'],
+                          keepalive_expiry=HTTP_POOL['keepalive_expiry'])
+    client = httpx.AsyncClient if asynchronous else httpx.Client
+    return client(limits=limits, http2=http2_enabled(), follow_redirects=True)
+
+def _gemini_client():
+    # generativeai keeps one process-wide gRPC channel (HTTP/2 already) - the model wrapper is shared on top
+    from google import generativeai
+    generativeai.configure(api_key=constants.GEMINI_KEY)
+    return generativeai.GenerativeModel("gemini-2.5-pro")
+
+def _timed(call):
+    def timed(request : dict):
+        with timed_call():
+            return call(request)
+    return timed
+
+def _atimed(acall):
+    async def atimed(request : dict):
+        with timed_call():
+            return await acall(request)
+    return atimed
+
+def _tokens(usage, field : str) -> int:
+    value = getattr(usage, field, None)
+    return value if isinstance(value, int) else 0
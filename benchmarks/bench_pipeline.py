@@ -0,0 +1,115 @@
+"""
+End-to-end throughput benchmark for the optimization pipeline.
+
+Runs optimize_projects on the small fixture repo in benchmarks/fixture with
+the offline mock provider, so the pipeline's own overhead (profiling, patching,
+validation, test runs & scheduling) is measured without API keys. Exits
+non-zero if the run is slower than --max-seconds, for use as a CI gate.
+
+    python benchmarks/bench_pipeline.py --latency 0.5 --max-seconds 900
+
+Needs py-spy on PATH, like any pipeline run.
+"""
+from functools import partial
+from pathlib import Path
+import subprocess
+import argparse
+import shutil
+import json
+import time
+import sys
+import os
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURE = ROOT / "benchmarks" / "fixture"
+FIXTURE_NAME = "mpco_fixture"
+
+os.chdir(ROOT) # constants.py resolves its context files relative to the repo root
+sys.path.insert(0, str(ROOT))
+
+from constants import PROJECTS, PROJECT_CONTEXTS, MODELS
+from pipeline.pipeline import optimize_projects
+from pipeline.grid import optimize_grid
+from pipeline.optimizers import MockOptimizer
+from pipeline.metaprompters import MockMP
+from pipeline.profiler.filter_profiles import PROFILER_DIR, venv_python
+from pipeline.telemetry import records, summarize, export_calls
+
+def setup_fixture() -> None:
+    # fresh git checkout of the fixture where setup.py would clone a real project
+    repo_path = PROFILER_DIR / "projects" / FIXTURE_NAME
+    if repo_path.exists():
+        shutil.rmtree(repo_path)
+    shutil.copytree(FIXTURE, repo_path)
+
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost"]
+    subprocess.run(git + ["init", "-q"], cwd=repo_path, check=True)
+    subprocess.run(git + ["add", "-A"], cwd=repo_path, check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "fixture"], cwd=repo_path, check=True)
+
+    # the fixture has no dependencies beyond pytest - reuse this interpreter's site-packages
+    venv_py = venv_python(FIXTURE_NAME)
+    if not venv_py.exists():
+        subprocess.run([sys.executable, "-m", "venv", "--system-site-packages",
+                        str(PROFILER_DIR / "venvs" / f"venv_{FIXTURE_NAME}")], check=True)
+    if subprocess.run([str(venv_py), "-m", "pytest", "--version"], capture_output=True).returncode != 0:
+        subprocess.run([str(venv_py), "-m", "pip", "install", "-q", "pytest"], check=True)
+
+    for folder in ("profiles", "temp"):
+        (PROFILER_DIR / folder).mkdir(exist_ok=True)
+
+    PROJECTS.add(FIXTURE_NAME)
+    PROJECT_CONTEXTS[FIXTURE_NAME] = {'name': FIXTURE_NAME,
+                                      'description': "Benchmark fixture with deliberately slow hotspots",
+                                      'languages': "Python"}
+
+def run(args) -> dict:
+    factories = {model: partial(MockOptimizer, args.mode, replay_path=args.replay_path, fault_rate=args.fault_rate,
+                                model_name=model, latency=args.latency, seed=args.seed)
+                 for model in args.models}
+    metaprompter = partial(MockMP, latency=args.latency, seed=args.seed)
+
+    started = time.perf_counter()
+    if args.jobs is None:
+        tester = optimize_projects(tuple(factory() for factory in factories.values()), metaprompter(), [FIXTURE_NAME])
+    else:
+        tester = optimize_grid(factories, metaprompter, [FIXTURE_NAME], workers=args.jobs or None)
+    rows = sum(len(results) for results in tester)
+    wall = time.perf_counter() - started
+
+    return {'wall_seconds': wall, 'rows': rows, 'rows_per_minute': rows / wall * 60 if wall else 0.0,
+            **summarize(records(project=FIXTURE_NAME))}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="mutate", choices=("canned", "mutate", "replay"))
+    parser.add_argument("--replay-path", default="./results/test_results.csv")
+    parser.add_argument("--latency", type=float, default=0.5, help="synthetic seconds per mock LLM call")
+    parser.add_argument("--fault-rate", type=float, default=0.1, help="share of deliberately broken candidates")
+    parser.add_argument("--models", nargs="+", default=sorted(MODELS), choices=sorted(MODELS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, nargs="?", const=0, help="run the grid scheduler on N processes")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if the run takes longer")
+    parser.add_argument("--output", default="./results/benchmark.json")
+    args = parser.parse_args()
+
+    if shutil.which("py-spy") is None:
+        print("py-spy is required on PATH to profile the fixture")
+        return 2
+
+    setup_fixture()
+    summary = run(args)
+    export_calls(Path(args.output).with_suffix(".calls.csv"))
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'config': vars(args), **summary}, f, indent=4)
+    print(json.dumps(summary, indent=4))
+
+    if args.max_seconds is not None and summary['wall_seconds'] > args.max_seconds:
+        print(f"Pipeline took {summary['wall_seconds']:.1f}s - over the {args.max_seconds:.1f}s budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
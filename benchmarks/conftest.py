@@ -0,0 +1,2 @@
+# the fixture repo's tests run inside its own checkout during benchmarks, not in this suite
+collect_ignore = ["fixture"]
@@ -0,0 +1 @@
+from fixture_pkg.hotspots import *
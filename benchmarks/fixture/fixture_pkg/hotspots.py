@@ -0,0 +1,63 @@
+# deliberately slow implementations - each is a distinct bottleneck for the profiler to find
+
+def dedupe(items):
+    result = []
+    for item in items:
+        if item not in result:
+            result.append(item)
+    return result
+
+def fib(n):
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def count_words(text):
+    counts = {}
+    for word in text.split():
+        counts[word] = len([w for w in text.split() if w == word])
+    return counts
+
+def primes_below(n):
+    return [i for i in range(2, n) if all(i % d for d in range(2, i))]
+
+def common_items(a, b):
+    return [x for x in a if x in b]
+
+def join_all(parts):
+    text = ""
+    for part in parts:
+        text = text + str(part) + ","
+    return text
+
+def running_totals(values):
+    return [sum(values[:i + 1]) for i in range(len(values))]
+
+def bubble_sort(values):
+    values = list(values)
+    for i in range(len(values)):
+        for j in range(len(values) - 1 - i):
+            if values[j] > values[j + 1]:
+                values[j], values[j + 1] = values[j + 1], values[j]
+    return values
+
+def max_pair_sum(values):
+    best = None
+    for i in range(len(values)):
+        for j in range(i + 1, len(values)):
+            if best is None or values[i] + values[j] > best:
+                best = values[i] + values[j]
+    return best
+
+class Matrix:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def multiply(self, other):
+        size, inner, cols = len(self.rows), len(other.rows), len(other.rows[0])
+        result = [[0] * cols for _ in range(size)]
+        for i in range(size):
+            for j in range(cols):
+                for k in range(inner):
+                    result[i][j] += self.rows[i][k] * other.rows[k][j]
+        return Matrix(result)
@@ -0,0 +1,35 @@
+from fixture_pkg import *
+
+
+def test_dedupe():
+    assert dedupe(list(range(1500)) * 2) == list(range(1500))
+
+def test_fib():
+    assert fib(22) == 17711
+
+def test_count_words():
+    text = " ".join(f"w{i % 50}" for i in range(2000))
+    assert count_words(text)["w0"] == 40
+
+def test_primes_below():
+    assert len(primes_below(4000)) == 550
+
+def test_common_items():
+    assert len(common_items(list(range(3000)), list(range(1500, 4500)))) == 1500
+
+def test_join_all():
+    assert join_all(range(20000)).count(",") == 20000
+
+def test_running_totals():
+    assert running_totals(list(range(2000)))[-1] == sum(range(2000))
+
+def test_bubble_sort():
+    assert bubble_sort(range(600, 0, -1)) == list(range(1, 601))
+
+def test_max_pair_sum():
+    assert max_pair_sum(list(range(700))) == 699 + 698
+
+def test_matrix_multiply():
+    identity = Matrix([[int(i == j) for j in range(60)] for i in range(60)])
+    values = Matrix([[i * j for j in range(60)] for i in range(60)])
+    assert values.multiply(identity).rows == values.rows
@@ -1,4 +1,5 @@
 import json
+import os
 from textwrap3 import dedent
 
 # tasks, and models allowed
@@ -8,31 +9,130 @@ MODELS : set = {'25', '4o', '40'}
 MAX_TOKENS : int = 16384 
 # this needs to be super long just for gemini for some reason but ig better to have really long and avoid errors than not
 
+# number of isolated checkouts (git worktrees) a project's candidates can be tested in at once
+WORKERS : int = os.cpu_count() or 1
+
+# max in-flight async generations per model (metaprompter & optimizer calls to a model share a limit)
+CONCURRENCY_LIMITS : dict = {'25': 4, '4o': 8, '40': 4}
+
+# per-model provider limits the scheduler paces calls under - set these to your account's tier
+RATE_LIMITS : dict = {'25': {'requests_per_minute': 150, 'tokens_per_minute': 2_000_000},
+                      '4o': {'requests_per_minute': 500, 'tokens_per_minute': 30_000},
+                      '40': {'requests_per_minute': 50, 'tokens_per_minute': 30_000}}
+MAX_RETRIES : int = 6 # backoff retries on rate limits & transient provider errors
+
+# USD per million tokens, for the per-call cost column in results/llm_calls.csv
+PRICES : dict = {'25': {'input': 1.25, 'cached': 0.31, 'output': 10.00},
+                 '4o': {'input': 2.50, 'cached': 1.25, 'output': 10.00},
+                 '40': {'input': 3.00, 'cached': 0.30, 'cache_write': 3.75, 'output': 15.00}}
+CALLS_PATH : str = './results/llm_calls.csv'
+
+# connection pool shared by every agent of a provider - size it above the CONCURRENCY_LIMITS it serves
+# http2 is used when the h2 package is installed (pip install h2)
+HTTP_POOL : dict = {'max_connections': 32, 'max_keepalive': 16, 'keepalive_expiry': 60.0, 'http2': True}
+
+# persistent LLM response cache - least recently used entries are evicted past the size cap
+CACHE_PATH : str = './results/llm_cache.sqlite'
+CACHE_MAX_BYTES : int = 512 * 1024 ** 2
+
+# tokens of callee signatures, class attributes & imports added to each optimization prompt
+CONTEXT_TOKEN_BUDGET : int = 1024
+
+# attempts at each bottleneck before it's given up on (a failed revision)
+MAX_ATTEMPTS : int = 10
+
+# candidates sampled per attempt - above 1, all are tested in parallel worktrees and the 
+# fastest survivor (best of TOURNAMENT_ROUNDS sequential runs) is kept
+CANDIDATES_PER_ATTEMPT : int = 1
+TOURNAMENT_ROUNDS : int = 3
+
+# the baseline run records a reservoir sample of CAPTURE_SAMPLES calls (arguments & return values)
+# per bottleneck - microbenchmarks replay them best of MICROBENCH_REPEAT through each version
+CAPTURE_SAMPLES : int = 20
+MICROBENCH_REPEAT : int = 5
+
+# candidates replay the recorded calls before the suite runs - outcomes must match the original's,
+# floats & NumPy arrays up to these tolerances
+DIFF_TOLERANCE : dict = {'rel': 1e-6, 'abs': 1e-9}
+DIFF_TIMEOUT : int = 60
+
+# each accepted patch is left out of the stack in turn (best of ATTRIBUTION_ROUNDS suite runs) to measure
+# its own contribution - with DROP_REGRESSIONS, patches slowing the suite by over ATTRIBUTION_TOLERANCE
+# (whose function isn't faster in its microbenchmark either) are reverted before the final benchmark
+ATTRIBUTION_ROUNDS : int = 3
+ATTRIBUTION_TOLERANCE : float = 0.02
+DROP_REGRESSIONS : bool = False
+
+# journal of finished jobs, baselines & accepted patches - reruns resume from it (main.py --fresh starts over)
+JOURNAL_DIR : str = './results/journal'
+
+# baselines (runtime, failing tests & profile) reused across sweeps while the project's commit, venv packages,
+# Python & machine are unchanged (main.py --remeasure measures again)
+BASELINE_CACHE_DIR : str = './results/baselines'
+
+# work queue of multi-machine sweeps (main.py --queue coordinates, --worker pulls jobs) - a worker keeps
+# renewing its lease on a running job, and a job whose lease runs out goes to the next worker asking
+QUEUE_PATH : str = './results/queue.sqlite'
+QUEUE_LEASE_SECONDS : int = 300
+QUEUE_POLL_SECONDS : int = 10
+QUEUE_MAX_ATTEMPTS : int = 3
+
+# live counters & histograms (llm calls, candidates, test runs, benchmarks, jobs) - rewritten as a Prometheus
+# text file every METRICS_INTERVAL seconds, and served at http://METRICS_HOST:<port>/metrics with --metrics-port
+METRICS_PATH : str = './results/metrics.prom'
+METRICS_INTERVAL : int = 15
+METRICS_HOST : str = '127.0.0.1'
+
+# meta prompts are pooled per (project, task, model) and reused across runs - rotated on failure,
+# retired after META_PROMPT_MAX_FAILURES failures
+META_PROMPTS_PATH : str = './results/meta_prompts.json'
+META_PROMPT_POOL : int = 3
+META_PROMPT_MAX_FAILURES : int = 5
+
+# offline provider used by --mock & benchmarks/ - mode is canned, mutate or replay
+MOCK_CONFIG : dict = {'mode': 'mutate', 'latency': 2.0, 'fault_rate': 0.1,
+                      'replay_path': './results/test_results.csv', 'seed': 0}
+
+# how often batch jobs are polled when running with --batch
+BATCH_POLL_SECONDS : int = 60
+
 def load_json(path, key = None):
     with open(path, mode='r', encoding="utf-8") as handle:
         return json.load(handle) if key is None else json.load(handle)[key]
 
-files = {
+_files = {
     'api_keys' : './API_KEYS.json',
     'model_contexts' : "./contexts/model_contexts.json",
     'project_contexts' : "./contexts/project_contexts.json",
-    'task_contexts' : "./contexts/task_contexts.json"
+    'task_contexts' : "./contexts/task_contexts.json",
+    'objective' : './contexts/objective.json'
 }
 
-# API keys
-GEMINI_KEY : str = load_json(files['api_keys'], 'GEMINI_KEY')
-OPENAI_KEY : str = load_json(files['api_keys'], 'OPENAI_KEY')
-ANTHROPIC_KEY : str = load_json(files['api_keys'], 'ANTHROPIC_KEY')
+def _api_key(name : str):
+    # optional, so offline (--mock) runs & tests work without API_KEYS.json
+    return load_json(_files['api_keys']).get(name) if os.path.exists(_files['api_keys']) else None
+
+# JSON-backed constants are read on first access (PEP 562), not at import
+_LAZY = {
+    # API keys
+    'GEMINI_KEY' : lambda: _api_key('GEMINI_KEY'),
+    'OPENAI_KEY' : lambda: _api_key('OPENAI_KEY'),
+    'ANTHROPIC_KEY' : lambda: _api_key('ANTHROPIC_KEY'),
 
-# Project, model, and task constants
-PROJECT_CONTEXTS : dict = load_json(files['project_contexts'])
-MODEL_CONTEXTS : dict = load_json(files['model_contexts'])
-TASK_CONTEXTS : dict = load_json(files['task_contexts'])
+    # Project, model, and task constants
+    'PROJECT_CONTEXTS' : lambda: load_json(_files['project_contexts']),
+    'MODEL_CONTEXTS' : lambda: load_json(_files['model_contexts']),
+    'TASK_CONTEXTS' : lambda: load_json(_files['task_contexts']),
 
-PROJECTS = set(PROJECT_CONTEXTS.keys())
-OBJECTIVE : str = load_json('./contexts/objective.json', 'objective')
+    'PROJECTS' : lambda: set(__getattr__('PROJECT_CONTEXTS').keys()),
+    'OBJECTIVE' : lambda: load_json(_files['objective'], 'objective'),
+}
 
-del files
+def __getattr__(name : str):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # setdefault keeps one object per name (e.g. benchmarks add to PROJECTS in place)
+    return globals().setdefault(name, _LAZY[name]())
 
 # JSON structures:
 """
@@ -140,3 +240,7 @@ Please follow these reasoning steps:
 
 Think through each step, then provide only the final optimized code.""".strip()
 
+# star imports resolve the lazy names too - direct `from constants import X` only loads X.
+# API keys are left out, so star importers never read API_KEYS.json
+__all__ = [name for name in list(globals()) if not name.startswith('_')] + \
+          [name for name in _LAZY if not name.endswith('_KEY')]
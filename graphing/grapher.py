@@ -1,4 +1,6 @@
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg') # graphs are only saved to files - skip probing for a GUI backend
 import matplotlib.pyplot as plt
 
 def plot_data(data: pd.DataFrame):
@@ -59,7 +61,7 @@ def plot_clustered_bar(data: pd.DataFrame):
     }
     # Group by prompt_type and optimizer, then unstack for clustered bar
     grouped = data.groupby(['prompt_type', 'optimizer'])['runtime_p'].mean().unstack('optimizer').reindex(prompt_types)
-    grouped = grouped[optimizers]  # Ensure correct optimizer order
+    grouped = grouped.reindex(columns=optimizers)  # Ensure correct optimizer order
 
     grouped.index = [prompt_type_labels.get(pt, pt) for pt in grouped.index]
     grouped.columns = [optimizer_labels.get(opt, opt) for opt in grouped.columns]
@@ -128,7 +130,7 @@ def plot_failed_attempts_clustered_bar(data: pd.DataFrame):
         '40': 'Claude Sonnet 4.0'
     }
     grouped = data.groupby(['prompt_type', 'optimizer'])['failed_attempts'].sum().unstack('optimizer').reindex(prompt_types)
-    grouped = grouped[optimizers]  # Ensure correct optimizer order
+    grouped = grouped.reindex(columns=optimizers)  # Ensure correct optimizer order
     grouped.index = [prompt_type_labels.get(pt, pt) for pt in grouped.index]
     grouped.columns = [optimizer_labels.get(opt, opt) for opt in grouped.columns]
     ax = grouped.plot(kind='bar', figsize=(10, 6), edgecolor='black')
@@ -141,8 +143,9 @@ def plot_failed_attempts_clustered_bar(data: pd.DataFrame):
     plt.savefig('./graphing/graphs/failed_attempts_v_prompt_optim.png')
 
 def graph_main(dataset_file):
-    data = pd.read_csv(dataset_file)
-    data['runtime_p'] = (data['original_runtimes'] - data['avg_runtime']) / data['original_runtimes'] * 100
+    data = pd.read_csv(dataset_file, dtype={'optimizer': str}) # '40' & '25' would otherwise parse as ints
+    original = data['original_runtime'] if 'original_runtime' in data else data['original_runtimes'] # older datasets
+    data['runtime_p'] = (original - data['avg_runtime']) / original * 100
 
     plot_data(data)
     plot_clustered_bar(data)
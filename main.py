@@ -1,11 +1,14 @@
-from pipeline.pipeline import optimize_projects
-from graphing import *
-from constants import *
+from constants import (CALLS_PATH, JOURNAL_DIR, MOCK_CONFIG, MODELS, QUEUE_PATH, METRICS_PATH, METRICS_INTERVAL,
+                       METRICS_HOST)
 
 from pathlib import Path
 
-import pandas as pd
+import argparse
 import sys
+import os
+
+DATASET_FILE = "./results/test_results.csv"
+DETAIL_FILE = "./results/test_results_detailed.csv" # every column - the dataset keeps the header it started with
 
 
 class Teer:
@@ -24,20 +27,44 @@ class Teer:
     def close(self):
         self.log.close()
 
-def main():
+def main(mock : bool = False, models : list = None, jobs : int = None, fresh : bool = False,
+         queue : str = None, metrics_port : int = None):
+    # pandas & the provider SDKs load only once a run actually starts
+    from pipeline.pipeline import optimize_projects
+    from pipeline.journal import Journal, fresh_journal
+    from pipeline.telemetry import export_calls
+
+    if fresh:
+        fresh_journal(JOURNAL_DIR)
+    journal = Journal(JOURNAL_DIR) # finished jobs are skipped & interrupted ones resumed on restart
+
     teer, old_stdout  = Teer("./results/test_logs.txt"), sys.stdout
     sys.stdout = teer
+    exporter = _metrics_exporter(metrics_port)
 
     try:
-        dataset_file = "./results/test_results.csv"
-        tester = optimize_projects()
+        dataset_file = DATASET_FILE
+        if queue is not None:
+            from pipeline.workqueue import WorkQueue, optimize_queue # workers on any node run the jobs
+            optim_names = list(_provider_factories(models, mock)[0])
+            tester = optimize_queue(optim_names, WorkQueue(queue), journal=journal)
+        elif jobs is not None:
+            from pipeline.grid import optimize_grid # each job logs to pipeline/profiler/runs/<job>/log.txt
+            tester = optimize_grid(*_provider_factories(models, mock), workers=jobs or None, journal=journal)
+        elif mock:
+            tester = optimize_projects(*_mock_providers(models), journal=journal)
+        elif models:
+            tester = optimize_projects(_providers(models), journal=journal)
+        else:
+            tester = optimize_projects(journal=journal)
+        exported = 0 # llm call records already written to CALLS_PATH
 
         while True:
             try:
                 test_results = next(tester)
-                test_results.to_csv(dataset_file, mode='a', 
-                                    header=not pd.io.common.file_exists(dataset_file), 
-                                    index=False)
+                _append_results(test_results, DETAIL_FILE)
+                _append_results(test_results, dataset_file)
+                exported = export_calls(CALLS_PATH, exported)
 
             except StopIteration:
                 break
@@ -46,13 +73,107 @@ def main():
                 continue
 
     finally:
+        exporter.close()
         sys.stdout = old_stdout
         teer.close()
 
         for profile in Path('./pipeline/profiler/profiles/').iterdir():
             profile.unlink() # cleanup
 
-        graph_main(dataset_file)
-            
+        graph(dataset_file)
+
+def work(queue : str, mock : bool = False, models : list = None, jobs : int = None, metrics_port : int = None):
+    # a worker node - pulls jobs until the coordinator's sweep is done, results go back through the queue
+    from pipeline.workqueue import WorkQueue, run_worker
+    import platform
+    path = Path(METRICS_PATH).with_name(f"metrics-{platform.node()}-{os.getpid()}.prom") # results/ may be shared
+    with _metrics_exporter(metrics_port, path):
+        finished = run_worker(WorkQueue(queue), *_provider_factories(models, mock), slots=jobs or None)
+    print(f"Queue drained - {finished} jobs run by this worker")
+
+def _append_results(results, path) -> None:
+    # rows go under the file's existing header - columns it doesn't have are left out, missing ones left blank
+    import pandas as pd
+    if not pd.io.common.file_exists(path):
+        results.to_csv(path, index=False)
+        return
+    header = list(pd.read_csv(path, nrows=0).columns)
+    if 'original_runtimes' in header: # older datasets
+        results = results.rename(columns={'original_runtime': 'original_runtimes'})
+    results.reindex(columns=header).to_csv(path, mode='a', header=False, index=False)
+
+def _metrics_exporter(port : int = None, path = METRICS_PATH):
+    from pipeline.metrics import MetricsExporter
+    return MetricsExporter(path, port, host=METRICS_HOST, interval=METRICS_INTERVAL)
+
+def graph(dataset_file):
+    from graphing import graph_main # matplotlib is the slowest import - graphing runs only
+    graph_main(dataset_file)
+
+def _providers(models : list) -> tuple:
+    # only the selected providers' SDKs get imported
+    from pipeline.optimizers import OPTIMIZERS
+    return tuple(OPTIMIZERS[model]() for model in models)
+
+def _mock_providers(models : list = None):
+    # one offline optimizer per configured model, plus an offline metaprompter
+    from pipeline.optimizers import MockOptimizer
+    from pipeline.metaprompters import MockMP
+    optims = tuple(MockOptimizer(**MOCK_CONFIG, model_name=model) for model in (models or sorted(MODELS)))
+    return optims, MockMP(latency=MOCK_CONFIG['latency'], seed=MOCK_CONFIG['seed'])
+
+def _provider_factories(models : list = None, mock : bool = False) -> tuple:
+    # grid jobs build their own providers in worker processes - factories have to pickle
+    from functools import partial
+    if mock:
+        from pipeline.optimizers import MockOptimizer
+        from pipeline.metaprompters import MockMP
+        return ({model: partial(MockOptimizer, **MOCK_CONFIG, model_name=model) for model in (models or sorted(MODELS))},
+                partial(MockMP, latency=MOCK_CONFIG['latency'], seed=MOCK_CONFIG['seed']))
+
+    from pipeline.optimizers import OPTIMIZERS
+    from pipeline.metaprompters import OpenMP
+    return {model: OPTIMIZERS[model] for model in (models or ('40', '4o', '25'))}, OpenMP
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Optimize project bottlenecks with LLMs, then graph the results")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), help="optimizers to run (default: all)")
+    parser.add_argument('--mock', action='store_true', help="use the offline mock provider (MOCK_CONFIG)")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the LLM response cache")
+    parser.add_argument('--batch', action='store_true', help="submit first attempts as provider batch jobs")
+    parser.add_argument('--stream', action='store_true', help="stream generations and abort hopeless ones early")
+    parser.add_argument('--candidates', type=int, help="candidates per attempt - the fastest passing one is kept")
+    parser.add_argument('--jobs', type=int, nargs='?', const=0, 
+                        help="run (project, optimizer, prompt type) jobs on N processes (default: one per cpu)")
+    parser.add_argument('--fresh', action='store_true', help="set the journal aside and start a new sweep")
+    parser.add_argument('--remeasure', action='store_true', help="measure baselines again instead of reusing cached ones")
+    parser.add_argument('--queue', nargs='?', const=QUEUE_PATH, metavar='PATH',
+                        help=f"queue jobs for --worker processes on any node and collect their results (default: {QUEUE_PATH})")
+    parser.add_argument('--worker', action='store_true',
+                        help="run jobs from the --queue until the sweep is done (--jobs sets how many at once)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help=f"serve live metrics at http://{METRICS_HOST}:PORT/metrics (always written to {METRICS_PATH})")
+    parser.add_argument('--graph-only', action='store_true', help=f"only regenerate graphs from {DATASET_FILE}")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    main()
+    args = _parse_args()
+    if args.no_cache:
+        os.environ['MPCO_NO_CACHE'] = '1'
+    if args.batch:
+        os.environ['MPCO_BATCH'] = '1'
+    if args.stream:
+        os.environ['MPCO_STREAM'] = '1'
+    if args.remeasure:
+        os.environ['MPCO_REMEASURE'] = '1'
+    if args.candidates:
+        os.environ['MPCO_CANDIDATES'] = str(args.candidates)
+
+    if args.graph_only:
+        graph(DATASET_FILE)
+    elif args.worker:
+        work(args.queue or QUEUE_PATH, mock=args.mock, models=args.models, jobs=args.jobs,
+             metrics_port=args.metrics_port)
+    else:
+        main(mock=args.mock, models=args.models, jobs=args.jobs, fresh=args.fresh, queue=args.queue,
+             metrics_port=args.metrics_port)
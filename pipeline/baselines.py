@@ -0,0 +1,93 @@
+from pipeline.profiler.filter_profiles import PROFILER_DIR, venv_python
+
+from pathlib import Path
+import subprocess
+import platform
+import hashlib
+import shutil
+import json
+import os
+
+# run in the project venv - its Python & every installed distribution, in a stable order
+_VENV_PROBE = ("import sys, importlib.metadata as m; print(sys.version); "
+               "print('\\n'.join(sorted('%s==%s' % (d.metadata['Name'], d.version) for d in m.distributions())))")
+
+class BaselineCache:
+    """
+    Baseline measurements of projects, kept across sweeps.
+
+    An entry holds the failing tests, the 10 trial average runtime and the
+    filtered profile the bottlenecks were picked from. Entries are keyed by
+    an environment fingerprint - the project's commit & uncommitted edits,
+    the venv's Python and installed packages, and the machine - so anything
+    that would change the measurement measures again.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def get(self, project : str, fingerprint : dict, profile_path) -> tuple | None:
+        # (failing test ids, runtime) - the saved profile is put back so bottlenecks come out in the same order
+        entry_path, saved = self._paths(project, fingerprint)
+        if not entry_path.exists() or not saved.exists():
+            return None
+        with open(entry_path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry['fingerprint'] != fingerprint: # digest prefix collision
+            return None
+
+        Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(saved, profile_path)
+        return frozenset(entry['failures']), entry['runtime']
+
+    def put(self, project : str, fingerprint : dict, failures : frozenset, runtime : float, profile_path) -> None:
+        entry_path, saved = self._paths(project, fingerprint)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # profile first, entry last - a half written pair is never read back
+        shutil.copyfile(profile_path, f"{saved}.{os.getpid()}.tmp")
+        os.replace(f"{saved}.{os.getpid()}.tmp", saved)
+        with open(f"{entry_path}.{os.getpid()}.tmp", 'w', encoding='utf-8') as f:
+            json.dump({'project': project, 'fingerprint': fingerprint,
+                       'failures': sorted(failures), 'runtime': runtime}, f, indent=2)
+        os.replace(f.name, entry_path)
+
+    def _paths(self, project : str, fingerprint : dict) -> tuple:
+        digest = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return (self.directory / f"{project}-{digest}.json",
+                self.directory / f"{project}-{digest}_filtered0.speedscope")
+
+def baseline_cache_enabled() -> bool:
+    # bypass with MPCO_REMEASURE=1 (main.py --remeasure sets it)
+    return os.environ.get('MPCO_REMEASURE', '') not in ('1', 'true', 'yes')
+
+def environment_fingerprint(proj_name : str, repo_path = None) -> dict | None:
+    # what a baseline measurement depends on - None if the checkout or venv can't be inspected
+    repo_path = Path(repo_path or PROFILER_DIR / "projects" / proj_name)
+    try:
+        head = _output(['git', 'rev-parse', 'HEAD'], repo_path).strip()
+        edits = _output(['git', 'diff', '--binary', 'HEAD'], repo_path) # setup.py edits pyproject.toml
+        python, _, packages = _output([str(venv_python(proj_name)), '-c', _VENV_PROBE], repo_path).partition('\n')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return {'head': head,
+            'edits': hashlib.sha256(edits.encode('utf-8')).hexdigest(),
+            'packages': hashlib.sha256(packages.encode('utf-8')).hexdigest(),
+            'python': python.strip(),
+            'machine': machine_fingerprint()}
+
+def machine_fingerprint() -> dict:
+    return {'node': platform.node(), 'system': platform.system(), 'machine': platform.machine(),
+            'cpu': _cpu_model(), 'cpus': os.cpu_count()}
+
+def _cpu_model() -> str:
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.partition(':')[2].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+def _output(args : list, cwd) -> str:
+    return subprocess.run(args, cwd=cwd, check=True, capture_output=True, text=True).stdout
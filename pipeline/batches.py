@@ -0,0 +1,222 @@
+from concurrent.futures import Future
+from pathlib import Path
+import threading
+import tempfile
+import json
+import time
+import uuid
+import os
+
+class BatchError(ValueError):
+    # _optimize_snippet re-issues the request interactively - other callers see a generation error
+    pass
+
+def batch_enabled() -> bool:
+    # opt in with MPCO_BATCH=1 (main.py --batch sets it)
+    return os.environ.get('MPCO_BATCH', '') in ('1', 'true', 'yes')
+
+class BatchQueue:
+    """
+    Queues first-attempt generations for one optimizer, submits them as a
+    single provider batch job and resolves a Future per request once a
+    background poller sees the job end.
+    """
+    def __init__(self, optim, backend, request_fn, poll_interval : float = 30):
+        self.optim = optim
+        self.backend = backend
+        self.request_fn = request_fn # (prompt, snippet, scope) -> provider request dict
+        self.poll_interval = poll_interval
+
+        self.job_id = None
+        self._requests = {}
+        self._futures = {}
+        self._keys = {}
+
+    def add(self, prompt : str, snippet : str, scope) -> Future:
+        request = self.request_fn(prompt, snippet, scope)
+        future = Future()
+
+        cache = getattr(self.optim, 'cache', None)
+        if cache is not None:
+            key = cache.key(self.optim.model_name, self.optim.model_id, request)
+            cached = cache.get(key)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+
+        custom_id = f"req-{len(self._requests)}"
+        self._requests[custom_id] = request
+        self._futures[custom_id] = future
+        if cache is not None:
+            self._keys[custom_id] = key
+        return future
+
+    def submit(self) -> str | None:
+        if not self._requests:
+            return None
+
+        self.job_id = self.backend.create(self._requests)
+        print(f"Submitted batch {self.job_id} with {len(self._requests)} requests for {self.optim.name}")
+        threading.Thread(target=self._poll, daemon=True).start()
+        return self.job_id
+
+    def _poll(self) -> None:
+        try:
+            while not self.backend.done(self.job_id):
+                time.sleep(self.poll_interval)
+            results = self.backend.results(self.job_id)
+        except Exception as e:
+            for future in self._futures.values():
+                if future.cancelled(): # unused prefetches are cancelled by the pipeline
+                    continue
+                future.set_exception(BatchError(f"Batch {self.job_id} failed: {e}"))
+            return
+
+        cache = getattr(self.optim, 'cache', None)
+        for custom_id, future in self._futures.items():
+            if future.cancelled():
+                continue
+            result = results.get(custom_id)
+            if isinstance(result, str):
+                if custom_id in self._keys:
+                    cache.put(self._keys[custom_id], result)
+                future.set_result(result)
+            else:
+                future.set_exception(BatchError(f"No result for {custom_id} in batch {self.job_id}: {result}"))
+
+class OpenAIBatchBackend:
+    def __init__(self, client, endpoint : str = "/v1/chat/completions"):
+        self.client = client
+        self.endpoint = endpoint
+
+    def create(self, requests : dict) -> str:
+        lines = [json.dumps({"custom_id": custom_id, "method": "POST", "url": self.endpoint, "body": body})
+                 for custom_id, body in requests.items()]
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+            batch_path = f.name
+        try:
+            with open(batch_path, 'rb') as f:
+                batch_file = self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.unlink(batch_path)
+
+        batch = self.client.batches.create(input_file_id=batch_file.id,
+                                           endpoint=self.endpoint,
+                                           completion_window="24h")
+        return batch.id
+
+    def done(self, job_id : str) -> bool:
+        status = self.client.batches.retrieve(job_id).status
+        if status in ("failed", "expired", "cancelled"):
+            raise BatchError(f"batch {status}")
+        return status == "completed"
+
+    def results(self, job_id : str) -> dict:
+        batch = self.client.batches.retrieve(job_id)
+        output = self.client.files.content(batch.output_file_id).text
+
+        results = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            try:
+                body = entry["response"]["body"]
+                results[entry["custom_id"]] = json.loads(body["choices"][0]["message"]["content"])["code"]
+            except (KeyError, TypeError, ValueError) as e:
+                results[entry["custom_id"]] = e
+        return results
+
+class AnthropicBatchBackend:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, requests : dict) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests.items()])
+        return batch.id
+
+    def done(self, job_id : str) -> bool:
+        return self.client.messages.batches.retrieve(job_id).processing_status == "ended"
+
+    def results(self, job_id : str) -> dict:
+        from pipeline.optimizers import _tool_code
+
+        results = {}
+        for entry in self.client.messages.batches.results(job_id):
+            if entry.result.type != "succeeded":
+                results[entry.custom_id] = BatchError(f"request {entry.result.type}")
+                continue
+            try:
+                results[entry.custom_id] = _tool_code(entry.result.message)
+            except ValueError as e:
+                results[entry.custom_id] = e
+        return results
+
+class LocalBatchBackend:
+    """
+    File-backed stand-in for a provider batch endpoint. Jobs are written to
+    `root` and answered by `responder(request) -> code` once `latency` seconds
+    have passed, so batch mode can be exercised offline.
+    """
+    def __init__(self, root, responder, latency : float = 0):
+        self.root = Path(root)
+        self.responder = responder
+        self.latency = latency
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def create(self, requests : dict) -> str:
+        job_id = f"batch_{uuid.uuid4().hex[:12]}"
+        with open(self.root / f"{job_id}.requests.jsonl", 'w', encoding='utf-8') as f:
+            for custom_id, request in requests.items():
+                f.write(json.dumps({"custom_id": custom_id, "body": request}, default=repr) + '\n')
+
+        self._write_state(job_id, {"status": "in_progress", "submitted": time.time()})
+        return job_id
+
+    def done(self, job_id : str) -> bool:
+        state = self._read_state(job_id)
+        if state["status"] == "ended":
+            return True
+        if time.time() - state["submitted"] < self.latency:
+            return False
+
+        with open(self.root / f"{job_id}.requests.jsonl", 'r', encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+
+        with open(self.root / f"{job_id}.results.jsonl", 'w', encoding='utf-8') as f:
+            for entry in requests:
+                try:
+                    result = {"custom_id": entry["custom_id"], "code": self.responder(entry["body"])}
+                except Exception as e:
+                    result = {"custom_id": entry["custom_id"], "error": str(e)}
+                f.write(json.dumps(result) + '\n')
+
+        self._write_state(job_id, {**state, "status": "ended"})
+        return True
+
+    def results(self, job_id : str) -> dict:
+        results = {}
+        with open(self.root / f"{job_id}.results.jsonl", 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                results[entry["custom_id"]] = entry["code"] if "code" in entry else BatchError(entry["error"])
+        return results
+
+    def _write_state(self, job_id : str, state : dict) -> None:
+        with open(self.root / f"{job_id}.json", 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def _read_state(self, job_id : str) -> dict:
+        with open(self.root / f"{job_id}.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+def batch_backend(optim):
+    # providers with a batch endpoint - gemini's generativeai SDK has none, so it stays interactive
+    if optim.model_name == "4o":
+        return OpenAIBatchBackend(optim.client), optim._openai_request
+    if optim.model_name == "40":
+        return AnthropicBatchBackend(optim.client), optim._anthropic_request
+    return None, None
@@ -0,0 +1,104 @@
+from pathlib import Path
+from collections import Counter
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import os
+
+class ResponseCache:
+    """
+    Persistent, content-addressed store of parsed LLM responses.
+
+    Keys hash the provider, model and the full request (system prompt, assembled
+    prompt & generation parameters). Repeated identical requests within one run
+    (e.g. regenerating after a faulty candidate) get successive sample numbers,
+    so a rerun replays the same sequence instead of the same answer forever.
+    """
+    def __init__(self, path, max_bytes : int = 512 * 1024 ** 2):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,
+                                created REAL NOT NULL, accessed REAL NOT NULL)""")
+        self._conn.commit()
+
+        self._lock = threading.Lock()
+        self._samples = Counter()
+
+    def key(self, provider : str, model : str, request : dict) -> str:
+        base = _digest({'provider': provider, 'model': model, 'request': request})
+        with self._lock:
+            sample = self._samples[base]
+            self._samples[base] += 1
+        return _digest({'base': base, 'sample': sample})
+
+    def get(self, key : str):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key : str, value) -> None:
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                               (key, data, len(data.encode('utf-8')), now, now))
+            self._evict()
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        # least recently used first until the store fits
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+_shared = {}
+
+def cache_enabled() -> bool:
+    # bypass with MPCO_NO_CACHE=1 (main.py --no-cache sets it)
+    return os.environ.get('MPCO_NO_CACHE', '') not in ('1', 'true', 'yes')
+
+def shared_cache(path, max_bytes : int = 512 * 1024 ** 2) -> ResponseCache:
+    # one store (and one sample counter) per file for every agent in the process
+    path = str(Path(path).resolve())
+    if path not in _shared:
+        _shared[path] = ResponseCache(path, max_bytes)
+    return _shared[path]
+
+def _digest(parts : dict) -> str:
+    text = json.dumps(parts, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def _jsonable(obj):
+    # SDK config objects (e.g. gemini's GenerationConfig) are hashed by their fields
+    if hasattr(obj, '__dict__'):
+        return {'__type__': type(obj).__name__, **vars(obj)}
+    return repr(obj)
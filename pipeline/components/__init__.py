@@ -1,2 +1,5 @@
 from pipeline.components.projects import PyProj
-from pipeline.components.patches import MyPatch
\ No newline at end of file
+from pipeline.components.context import build_context, prompt_scope
+from pipeline.components.patches import MyPatch
+from pipeline.components.worktrees import WorktreePool
+from pipeline.components.validation import InvalidCandidate, StreamAborted, StreamGuard, check_candidate, import_check
\ No newline at end of file
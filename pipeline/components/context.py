@@ -0,0 +1,222 @@
+from ast import FunctionDef, AsyncFunctionDef, ClassDef, Import, ImportFrom
+from pathlib import Path
+import ast
+
+# definitions the object to be optimized depends on, for the prompt - signatures of the functions it
+# calls, attributes of the classes it touches & the imports it uses, most profiled first within a token budget
+
+def build_context(code_object : dict, root_dir, weights : dict = None, budget : int = 1024) -> str:
+    root_dir = Path(root_dir)
+    rel_path = Path(code_object['rel_path'])
+    try:
+        module = _parse(root_dir / rel_path)
+        snippet = ast.parse(code_object['code'])
+    except (OSError, SyntaxError):
+        return ""
+
+    uses = _Uses(snippet)
+    imports = _imports(module)
+    owner = _owner_class(module, code_object['scope'])
+    own_name = getattr(snippet.body[0], 'name', None) if snippet.body else None
+
+    items = {} # (file, qualified name) -> (weight, first use, text)
+    def add(path : Path, qualname : str, text : str, order : int) -> None:
+        # profiles name frames by function name only
+        weight = (weights or {}).get((path.as_posix(), qualname.split('.')[-1]), 0)
+        items.setdefault((path.as_posix(), qualname), (weight, order, text))
+
+    for name, order in uses.calls.items():
+        if name == own_name:
+            continue
+        for path, node in _resolve(name, rel_path, module, imports, root_dir):
+            add(path, node.name, _summary(node), order)
+
+    for name, order in uses.methods.items():
+        node = _member(owner, name)
+        if node is not None and name != own_name:
+            add(rel_path, f"{owner.name}.{name}", f"class {owner.name}:\n" + _indent(_summary(node)), order)
+
+    if owner is not None and uses.attributes:
+        fields = _fields(owner, uses.attributes)
+        if fields:
+            add(rel_path, owner.name, f"class {owner.name}:\n" + _indent("\n".join(fields)), min(uses.attributes.values()))
+
+    # imports are what make the names above resolvable - cheap & always first
+    lines = [ast.unparse(statement) for names, statement in imports if names & uses.names]
+    ranked = sorted(items.values(), key=lambda item: (-item[0], item[1]))
+
+    kept, spent = [], 0
+    for text in (["\n".join(dict.fromkeys(lines))] if lines else []) + [text for _, _, text in ranked]:
+        cost = _tokens(text)
+        if spent + cost > budget:
+            continue # a shorter item further down may still fit
+        kept.append(text)
+        spent += cost
+    return "\n\n".join(kept)
+
+def prompt_scope(code_object : dict) -> str:
+    # what the optimizers are given as the object's scope - enclosing objects, then the definitions it uses
+    context = code_object.get('context')
+    if not context:
+        return str(code_object['scope'])
+    return f"{code_object['scope']}\n\nDefinitions used by the object (most time spent first):\n\n{context}"
+
+class _Uses(ast.NodeVisitor):
+    # names the snippet calls, loads & reads off self -> position of their first use
+    def __init__(self, snippet : ast.AST):
+        self.calls, self.methods, self.attributes, self.names = {}, {}, {}, set()
+        self.uses = 0
+        self.visit(snippet)
+
+    def use(self, table : dict, name : str) -> None:
+        self.uses += 1
+        table.setdefault(name, self.uses)
+
+    def visit_Call(self, node : ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            self.use(self.calls, func.id)
+        elif isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            if func.value.id in ('self', 'cls'):
+                self.use(self.methods, func.attr)
+            else:
+                self.use(self.calls, f"{func.value.id}.{func.attr}")
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node : ast.Attribute):
+        if isinstance(node.value, ast.Name) and node.value.id in ('self', 'cls'):
+            self.use(self.attributes, node.attr)
+        self.generic_visit(node)
+
+    def visit_Name(self, node : ast.Name):
+        self.names.add(node.id)
+        if isinstance(node.ctx, ast.Load) and node.id[:1].isupper(): # classes it builds or checks against
+            self.use(self.calls, node.id)
+        self.generic_visit(node)
+
+def _resolve(name : str, rel_path : Path, module : ast.Module, imports : list, root_dir : Path):
+    # definitions in the same module first, then project modules it imports from
+    if '.' not in name:
+        for node in module.body:
+            if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)) and node.name == name:
+                yield rel_path, node
+                return
+
+    alias, _, attr = name.partition('.')
+    for _, statement in imports:
+        for imported in statement.names:
+            if (imported.asname or imported.name.split('.')[0]) != alias:
+                continue
+            if isinstance(statement, ImportFrom) and not attr:
+                target, member = _module_path(statement.module, statement.level, rel_path, root_dir), imported.name
+            elif isinstance(statement, Import) and attr:
+                target, member = _module_path(imported.name, 0, rel_path, root_dir), attr
+            else:
+                continue
+
+            node = _top_level(root_dir, target, member) if target else None
+            if node is not None:
+                yield target, node
+            return
+
+def _module_path(module : str, level : int, rel_path : Path, root_dir : Path) -> Path | None:
+    # only modules inside the project are worth describing - site-packages the model knows already
+    base = rel_path.parent
+    for _ in range(max(level - 1, 0)):
+        base = base.parent
+    parts = (module or '').split('.') if module else []
+
+    candidates = [base.joinpath(*parts)] if level else [Path(*parts), Path('src', *parts)]
+    for candidate in candidates:
+        for path in (candidate.with_suffix('.py'), candidate / '__init__.py'):
+            if (root_dir / path).is_file():
+                return path
+    return None
+
+def _top_level(root_dir : Path, path : Path, name : str):
+    try:
+        module = _parse(root_dir / path)
+    except (OSError, SyntaxError):
+        return None
+    for node in module.body:
+        if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)) and node.name == name:
+            return node
+    return None
+
+def _owner_class(module : ast.Module, scope : list):
+    # innermost enclosing class, found by walking the scope names down from the module
+    body, owner = module.body, None
+    for entry in scope:
+        node = next((node for node in body if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef))
+                     and node.name == entry['name']), None)
+        if node is None:
+            break
+        owner = node if isinstance(node, ClassDef) else owner
+        body = node.body
+    return owner
+
+def _member(owner : ClassDef, name : str):
+    if owner is None:
+        return None
+    return next((node for node in owner.body if isinstance(node, (FunctionDef, AsyncFunctionDef))
+                 and node.name == name), None)
+
+def _fields(owner : ClassDef, used : dict = None) -> list:
+    # class-level declarations & assignments in __init__ - of the attributes in `used`, or all of them
+    wanted = lambda name: used is None or name in used or name == '__slots__'
+    fields = {}
+    for node in owner.body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(target, ast.Name) and wanted(target.id) for target in targets):
+                fields.setdefault(ast.unparse(node), None)
+
+    if used is None:
+        return list(fields) # __init__'s signature stands in for its assignments
+
+    init = _member(owner, '__init__')
+    for node in ast.walk(init) if init is not None else ():
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(target, ast.Attribute) and target.attr in used for target in targets):
+                fields.setdefault(ast.unparse(node), None)
+    return list(fields)
+
+def _summary(node) -> str:
+    # signature & first docstring line - bodies would blow the budget
+    if isinstance(node, ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        header = f"class {node.name}({bases}):" if bases else f"class {node.name}:"
+        fields = _fields(node)
+        init = _member(node, '__init__')
+        members = fields + ([_signature(init)] if init is not None else [])
+        return header + ("\n" + _indent("\n".join(members)) if members else "\n    ...")
+
+    doc = ast.get_docstring(node)
+    doc_line = f'\n    """{doc.strip().splitlines()[0]}"""' if doc else ""
+    return f"{_signature(node)}{doc_line}\n    ..."
+
+def _signature(node) -> str:
+    prefix = "async def" if isinstance(node, AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    decorators = "".join(f"@{ast.unparse(decorator)}\n" for decorator in node.decorator_list)
+    return f"{decorators}{prefix} {node.name}({ast.unparse(node.args)}){returns}:"
+
+def _imports(module : ast.Module) -> list:
+    # (names bound, statement) for every import in the module
+    imports = []
+    for node in ast.walk(module):
+        if isinstance(node, (Import, ImportFrom)):
+            names = {(alias.asname or alias.name).split('.')[0] for alias in node.names}
+            imports.append((names, node))
+    return imports
+
+def _parse(path : Path) -> ast.Module:
+    with open(path, 'r', encoding='utf-8') as f:
+        return ast.parse(f.read(), str(path))
+
+def _indent(text : str) -> str:
+    return "\n".join("    " + line for line in text.splitlines())
+
+def _tokens(text : str) -> int:
+    return len(text) // 4 + 1
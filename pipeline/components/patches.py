@@ -13,7 +13,7 @@ class MyPatch:
 
         self.empty = False
 
-    def _make_patch(self):
+    def patched_module(self) -> tuple:
         file_path = self.code_object['rel_path']
 
         # indices are 0-indexed
@@ -25,15 +25,22 @@ class MyPatch:
             old_module = f.readlines()
 
         # formatting
-        if not self.optimized_code[-1].endswith('\n'):
-            self.optimized_code[-1] += '\n'
+        optimized_code = list(self.optimized_code)
+        if not optimized_code[-1].endswith('\n'):
+            optimized_code[-1] += '\n'
         indent = ' ' * base_indent
-        self.optimized_code = [indent + line if line.strip() else line for line in self.optimized_code]
+        optimized_code = [indent + line if line.strip() else line for line in optimized_code]
 
         # edit module
         optimized_module = (old_module[:start_line] + 
-                            self.optimized_code + 
+                            optimized_code + 
                             old_module[end_line + 1:])
+        
+        return old_module, optimized_module
+
+    def _make_patch(self):
+        file_path = self.code_object['rel_path']
+        old_module, optimized_module = self.patched_module()
 
         diff_lines = list(difflib.unified_diff(old_module,
                                                optimized_module,
@@ -84,4 +91,15 @@ class MyPatch:
         try:
             os.unlink(self.patch_path)
         except:
-            pass
\ No newline at end of file
+            pass
+
+    def revert_at(self, root) -> bool:
+        # takes the patch back out of another checkout holding it (e.g. a mirrored worktree) - this one is untouched
+        if self.empty:
+            return True
+        if self.patch is None:
+            return False
+
+        reversion = subprocess.run(['git', 'apply', '--whitespace=nowarn', '--reverse'],
+                                   input=self.patch, capture_output=True, text=True, cwd=root)
+        return reversion.returncode == 0
\ No newline at end of file
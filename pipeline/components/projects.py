@@ -2,9 +2,11 @@ from ast import FunctionDef, AsyncFunctionDef, ClassDef
 import ast
 
 from pathlib import Path
+import copy
 import json
 
-from constants import PROJECTS
+from pipeline.components.context import build_context
+from constants import PROJECTS, CONTEXT_TOKEN_BUDGET
  
 class InvalidTask(Exception):
     pass
@@ -14,6 +16,7 @@ class Project:
         self.name = name
         self.optimized = []
         self.root_dir = Path(__file__).parent.parent / "profiler" / "projects" / name
+        self.src_dir = self.root_dir # checkout the profile was recorded in
         self.revisions = 0
 
         if name not in PROJECTS:
@@ -26,12 +29,61 @@ class PyProj(Project):
     def __init__(self, name: str):
         super().__init__(name)
         self.top_bottlenecks = _speedscope_bottlenecks(self.name) # should return list of nodes
-
-    def load_function(self): # rename to load bottleneck
-        current_node = self.top_bottlenecks[self.revisions]
-        return _node_to_obj(current_node, self.root_dir)
+        self.weights = _speedscope_weights(self.name, self.src_dir) # {(rel_path, function name) : time}
+
+    def load_function(self, index : int = None): # rename to load bottleneck
+        current_node = self.top_bottlenecks[self.revisions if index is None else index]
+        function = _node_to_obj(current_node, self.root_dir, self.src_dir)
+        # callee signatures, class attributes & imports for the prompt
+        function['context'] = build_context(function, self.root_dir, self.weights, CONTEXT_TOKEN_BUDGET)
+        return function
+
+    def at(self, root_dir):
+        # same bottlenecks, patched & tested in another checkout (e.g. a leased worktree)
+        project = copy.copy(self)
+        project.root_dir = Path(root_dir)
+        project.revisions = 0
+        return project
         
 def _speedscope_bottlenecks(name : str):
+    frames, frame_times = _frame_times(name)
+    
+    if not frames:
+        print("ERROR: No frames found in filtered profile")
+        return []
+    
+    # sort frames by total time (descending)
+    sorted_frames = sorted(frame_times.items(), key=lambda x: x[1], reverse=True)
+    seen_names = set()
+    seen_nodes = set()
+    
+    top_nodes = []
+
+    for frame_idx, _ in sorted_frames:
+        if frame_idx < len(frames):
+            frame = frames[frame_idx]
+            frame_name = frame.get('name', '')
+            # avoid dupes
+            if frame_name not in seen_names:
+                seen_names.add(frame_name)
+                file_path = frame.get('file', '')
+                line_no = frame.get('line', 0)
+
+                node = _get_node(file_path, line_no)
+                node_dump = ast.dump(node) 
+                if node_dump not in seen_nodes:
+                    seen_nodes.add(node_dump)
+                    top_nodes.append(node)
+
+                    if len(top_nodes) >= 10:
+                        break
+    
+    if len(top_nodes) < 10:
+        print("WARNING: Not enough top nodes found in profile")
+
+    return top_nodes
+
+def _frame_times(name : str):
     # Define paths
     profiler_dir = Path(__file__).parent.parent / "profiler"
     filtered_file = profiler_dir / "profiles" / f"{name}_filtered{0}.speedscope"
@@ -46,10 +98,6 @@ def _speedscope_bottlenecks(name : str):
     shared = data.get('shared', {})
     frames = shared.get('frames', [])
     
-    if not frames:
-        print("ERROR: No frames found in filtered profile")
-        return []
-    
     # frame time tracking
     frame_times = {}  # {frame_index : total_time}
     for profile in data.get('profiles', []):
@@ -69,37 +117,22 @@ def _speedscope_bottlenecks(name : str):
                 if sample not in frame_times:
                     frame_times[sample] = 0
                 frame_times[sample] += weight
-    
-    # sort frames by total time (descending)
-    sorted_frames = sorted(frame_times.items(), key=lambda x: x[1], reverse=True)
-    seen_names = set()
-    seen_nodes = set()
-    
-    top_nodes = []
+    return frames, frame_times
 
-    for frame_idx, _ in sorted_frames:
+def _speedscope_weights(name : str, src_dir : Path) -> dict:
+    # total time per (file relative to the checkout, function name) - ranks context for the prompt
+    frames, frame_times = _frame_times(name)
+    weights = {}
+    for frame_idx, time in frame_times.items():
         if frame_idx < len(frames):
             frame = frames[frame_idx]
-            frame_name = frame.get('name', '')
-            # avoid dupes
-            if frame_name not in seen_names:
-                seen_names.add(frame_name)
-                file_path = frame.get('file', '')
-                line_no = frame.get('line', 0)
-
-                node = _get_node(file_path, line_no)
-                node_dump = ast.dump(node) 
-                if node_dump not in seen_nodes:
-                    seen_nodes.add(node_dump)
-                    top_nodes.append(node)
-
-                    if len(top_nodes) >= 10:
-                        break
-    
-    if len(top_nodes) < 10:
-        print("WARNING: Not enough top nodes found in profile")
-
-    return top_nodes
+            try:
+                rel_path = Path(frame.get('file', '')).relative_to(src_dir).as_posix()
+            except ValueError:
+                continue # outside the project
+            key = (rel_path, frame.get('name', ''))
+            weights[key] = weights.get(key, 0) + time
+    return weights
     
 def _get_node(abs_path : str, target : int):
     with open(abs_path, 'r', encoding='utf-8') as f:
@@ -128,8 +161,10 @@ def _get_node(abs_path : str, target : int):
     best_match.filename = abs_path
     return best_match
 
-def _node_to_obj(node, root_dir : Path):
+def _node_to_obj(node, root_dir : Path, src_dir : Path = None):
     abs_path = node.filename
+    if src_dir is not None and Path(src_dir) != Path(root_dir):
+        abs_path = Path(root_dir) / Path(abs_path).relative_to(src_dir)
 
     with open(abs_path, 'r', encoding='utf-8') as f:
         lines = f.readlines()
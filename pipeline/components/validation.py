@@ -0,0 +1,206 @@
+from ast import FunctionDef, AsyncFunctionDef, ClassDef
+from textwrap import dedent
+from pathlib import Path
+import subprocess
+import tokenize
+import ast
+import io
+import re
+
+from pipeline.components.patches import MyPatch
+
+class InvalidCandidate(Exception):
+    def __init__(self, stage : str, message : str):
+        self.stage = stage
+        super().__init__(f"[{stage}] {message}")
+
+class StreamAborted(InvalidCandidate):
+    def __init__(self, message : str, partial : str):
+        self.partial = partial
+        super().__init__('stream', message)
+
+# cheap gates run before any test execution - each raises InvalidCandidate
+def check_candidate(code_object : dict, new_snippet : str, root) -> None:
+    if not new_snippet or not new_snippet.strip():
+        raise InvalidCandidate('syntax', "empty candidate")
+
+    candidate = _parse(new_snippet)
+    _check_signature(code_object['code'], candidate)
+    _check_compiles(code_object, new_snippet, root)
+
+def import_check(code_object : dict, root, python, env : dict = None, timeout : int = 60) -> None:
+    # smoke test of just the patched module - must run after the patch is applied
+    module = module_name(code_object['rel_path'])
+    if module is None:
+        return
+
+    try:
+        result = subprocess.run([str(python), '-c', 'import importlib, sys; importlib.import_module(sys.argv[1])', module],
+                                cwd=root, env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise InvalidCandidate('import', f"importing {module} timed out after {timeout}s")
+
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        raise InvalidCandidate('import', f"importing {module} failed: {error[-1] if error else result.returncode}")
+
+class StreamGuard:
+    """
+    Checks a structured response while it streams in. Raises StreamAborted as
+    soon as the complete lines of the partial `code` field can't tokenize, or
+    the field ends without a top-level def/class of the object being optimized
+    (helpers may come before it).
+    """
+    def __init__(self, old_snippet : str, field : str = 'code'):
+        self.field = field
+        self.name = None
+        self._checked = 0 # complete lines already validated
+        self._closed = False
+
+        try:
+            original = _top_level_def(ast.parse(dedent(old_snippet)))
+            self.name = original.name if original else None
+        except SyntaxError:
+            pass
+
+    def feed(self, buffer : str) -> None:
+        code, closed = _json_string(buffer, self.field)
+        if code is None or self._closed:
+            return
+
+        lines = code.split('\n') if closed else code.split('\n')[:-1] # the last line may still be growing
+        if len(lines) <= self._checked and not closed:
+            return
+        self._checked = len(lines)
+        self._closed = closed
+
+        complete = dedent('\n'.join(lines) + '\n')
+        self._check_tokens(complete, code)
+        self._check_name(complete, code, closed)
+
+    def _check_tokens(self, complete : str, code : str) -> None:
+        pairs = {')': '(', ']': '[', '}': '{'}
+        brackets = []
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(complete).readline):
+                if token.type == tokenize.ERRORTOKEN and token.string.strip():
+                    raise StreamAborted(f"invalid token {token.string!r} on line {token.start[0]}", code)
+                if token.type != tokenize.OP:
+                    continue
+
+                # the tokenizer only reports unclosed brackets at EOF - catch stray closers here
+                if token.string in '([{':
+                    brackets.append(token.string)
+                elif token.string in pairs:
+                    if not brackets or brackets.pop() != pairs[token.string]:
+                        raise StreamAborted(f"unmatched {token.string!r} on line {token.start[0]}", code)
+        except IndentationError as e:
+            raise StreamAborted(f"{e.msg} (line {e.lineno})", code)
+        except tokenize.TokenError as e:
+            if 'EOF' not in str(e.args[0]): # unclosed brackets/strings are just unfinished output
+                raise StreamAborted(str(e.args[0]), code)
+
+    def _check_name(self, complete : str, code : str, closed : bool) -> None:
+        if self.name is None:
+            return
+
+        for line in complete.splitlines():
+            match = re.match(r'(?:async\s+def|def|class)\s+(\w+)', line)
+            if match and match.group(1) == self.name:
+                self.name = None # confirmed - stop checking
+                return
+        if closed:
+            raise StreamAborted(f"candidate does not define '{self.name}'", code)
+
+def _json_string(buffer : str, field : str) -> tuple:
+    # (decoded value of `field` so far, whether its closing quote has arrived) - from partial JSON
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(field), buffer)
+    if match is None:
+        return None, False
+
+    escapes = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '/': '/', '\\': '\\', '"': '"'}
+    chars = []
+    i = match.end()
+    while i < len(buffer):
+        char = buffer[i]
+        if char == '"':
+            return ''.join(chars), True
+        if char != '\\':
+            chars.append(char)
+            i += 1
+            continue
+
+        if i + 1 >= len(buffer):
+            break # escape split across chunks
+        escape = buffer[i + 1]
+        if escape == 'u':
+            if i + 6 > len(buffer):
+                break
+            chars.append(chr(int(buffer[i + 2:i + 6], 16)))
+            i += 6
+        else:
+            chars.append(escapes.get(escape, escape))
+            i += 2
+    return ''.join(chars), False
+
+def module_name(rel_path) -> str | None:
+    parts = list(Path(rel_path).with_suffix('').parts)
+    if parts and parts[0] == 'src':
+        parts = parts[1:]
+    if parts and parts[-1] == '__init__':
+        parts = parts[:-1]
+
+    if not parts or not all(part.isidentifier() for part in parts):
+        return None # scripts & odd layouts aren't importable by name
+    return '.'.join(parts)
+
+def _parse(snippet : str) -> ast.Module:
+    try:
+        return ast.parse(dedent(snippet))
+    except SyntaxError as e:
+        raise InvalidCandidate('syntax', f"{e.msg} (line {e.lineno})")
+
+def _check_signature(old_snippet : str, candidate : ast.Module) -> None:
+    try:
+        original = _top_level_def(ast.parse(dedent(old_snippet)))
+    except SyntaxError:
+        return # nothing to compare against
+    if original is None:
+        return
+
+    matches = [node for node in candidate.body
+               if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)) and node.name == original.name]
+    if not matches:
+        raise InvalidCandidate('signature', f"candidate does not define '{original.name}'")
+
+    if _signature(matches[0]) != _signature(original):
+        raise InvalidCandidate('signature', f"signature of '{original.name}' changed")
+
+def _check_compiles(code_object : dict, new_snippet : str, root) -> None:
+    _, optimized_module = MyPatch(code_object, new_snippet, root).patched_module()
+    filename = str(Path(root) / code_object['rel_path'])
+
+    try:
+        compile(''.join(optimized_module), filename, 'exec', dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        raise InvalidCandidate('compile', f"patched module does not compile: {e}")
+
+def _top_level_def(tree : ast.Module):
+    for node in tree.body:
+        if isinstance(node, (FunctionDef, AsyncFunctionDef, ClassDef)):
+            return node
+    return None
+
+def _signature(node) -> tuple:
+    if isinstance(node, ClassDef):
+        return ('class', node.name, [ast.dump(base) for base in node.bases])
+
+    args = node.args
+    return (type(node).__name__, node.name,
+            [arg.arg for arg in args.posonlyargs],
+            [arg.arg for arg in args.args],
+            args.vararg.arg if args.vararg else None,
+            [arg.arg for arg in args.kwonlyargs],
+            args.kwarg.arg if args.kwarg else None,
+            len(args.defaults),
+            [default is not None for default in args.kw_defaults])
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+from pathlib import Path
+import subprocess
+import threading
+import shutil
+import queue
+
+from constants import WORKERS
+
+WORKTREES_DIR = Path(__file__).parent.parent / "profiler" / "worktrees"
+
+class WorktreePool:
+    """
+    Leases isolated `git worktree` checkouts of a project so candidates can be
+    patched and tested side by side. Trees are created lazily up to `size` and
+    reset to the pool's base snapshot whenever they are released.
+    """
+    def __init__(self, repo_root, size : int = None, worktrees_dir = WORKTREES_DIR, base : str = None):
+        self.repo_root = Path(repo_root).resolve()
+        self.size = size or WORKERS
+        self.base_dir = Path(worktrees_dir).resolve() / self.repo_root.name
+
+        self._free = queue.Queue()
+        self._trees = []
+        self._lock = threading.Lock()
+        self._snapshot = base # pools of one project in several processes share a snapshot()
+
+    @contextmanager
+    def lease(self):
+        tree = self.acquire()
+        try:
+            yield tree
+        finally:
+            self.release(tree)
+
+    def acquire(self) -> Path:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._trees) < self.size:
+                tree = self._add_tree(len(self._trees))
+                self._trees.append(tree)
+                return tree
+
+        return self._free.get() # pool exhausted - wait for a release
+
+    def release(self, tree : Path) -> None:
+        # drop every patch applied during the lease
+        _git(['reset', '--hard', '-q'], tree)
+        _git(['clean', '-fdq'], tree)
+        self._free.put(tree)
+
+    def mirror(self, tree : Path, source) -> None:
+        # replay the patches applied in another checkout of the same base onto `tree`
+        diff = _git(['diff', '--binary', 'HEAD'], source).stdout
+        if diff:
+            subprocess.run(['git', 'apply', '--whitespace=nowarn'], cwd=tree, input=diff, 
+                           check=True, capture_output=True, text=True)
+
+    def close(self) -> None:
+        with self._lock:
+            for tree in self._trees:
+                _git(['worktree', 'remove', '--force', str(tree)], self.repo_root, check=False)
+            _git(['worktree', 'prune'], self.repo_root, check=False)
+
+            self._trees.clear()
+            self._free = queue.Queue()
+
+    def _base(self) -> str:
+        if self._snapshot is None:
+            self._snapshot = snapshot(self.repo_root)
+        return self._snapshot
+
+    def _add_tree(self, index : int) -> Path:
+        tree = self.base_dir / str(index)
+
+        if tree.exists(): # left behind by an interrupted run
+            _git(['worktree', 'remove', '--force', str(tree)], self.repo_root, check=False)
+            shutil.rmtree(tree, ignore_errors=True)
+            _git(['worktree', 'prune'], self.repo_root, check=False)
+
+        tree.parent.mkdir(parents=True, exist_ok=True)
+        _git(['worktree', 'add', '--detach', '-q', str(tree), self._base()], self.repo_root)
+        return tree
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def snapshot(repo_root) -> str:
+    # setup.py rewrites pyproject.toml without committing, so snapshot the working tree
+    stash = _git(['stash', 'create'], repo_root).stdout.strip()
+    return stash or _git(['rev-parse', 'HEAD'], repo_root).stdout.strip()
+
+def _git(args : list, cwd, check = True):
+    return subprocess.run(['git', *args], cwd=cwd, check=check,
+                          capture_output=True, text=True)
@@ -0,0 +1,70 @@
+from constants import CONCURRENCY_LIMITS
+from pipeline.telemetry import tagged, current_tags
+
+from concurrent.futures import Future
+import threading
+import asyncio
+
+class GenerationPool:
+    """
+    Runs optimizer & metaprompter calls on a background event loop so LLM
+    latency overlaps with local test execution. Requests for the same model
+    share a semaphore sized by CONCURRENCY_LIMITS.
+    """
+    def __init__(self, limits : dict = None, default_limit : int = 4):
+        self.limits = dict(CONCURRENCY_LIMITS if limits is None else limits)
+        self.default_limit = default_limit
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self._semaphores = {}
+
+    def generate(self, optim, prompt, snippet : str, scope) -> Future:
+        # prompt may itself be a pending Future (e.g. a meta prompt still generating)
+        return self.submit(optim.model_name, self._generate, optim, prompt, snippet, scope)
+
+    def get_prompt(self, metaprompter, objective : str, project : str, task : str, model : str, store = None) -> Future:
+        if store is not None: # reuse a stored meta prompt, generating only when the pool is empty
+            return self.submit(metaprompter.model_name, store.aget_prompt, metaprompter, objective, project, task, model)
+        return self.submit(metaprompter.model_name, metaprompter.aget_prompt, objective, project, task, model)
+
+    def submit(self, key : str, coro_fn, *args) -> Future:
+        # the loop thread has its own context - carry the submitter's call tags over
+        return asyncio.run_coroutine_threadsafe(self._limited(key, current_tags(), coro_fn, *args), self.loop)
+
+    def close(self) -> None:
+        if self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._cancel_pending(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    async def _cancel_pending(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _generate(self, optim, prompt, snippet : str, scope):
+        return await optim.agenerate(prompt, snippet, scope)
+
+    async def _limited(self, key : str, tags : dict, coro_fn, *args):
+        # pending futures are resolved outside the semaphore so they don't hold a slot
+        args = [await asyncio.wrap_future(arg) if isinstance(arg, Future) else arg for arg in args]
+
+        with tagged(**tags):
+            async with self._semaphore(key):
+                return await coro_fn(*args)
+
+    def _semaphore(self, key : str) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.limits.get(key, self.default_limit))
+        return self._semaphores[key]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
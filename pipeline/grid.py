@@ -0,0 +1,180 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import multiprocessing
+import threading
+import traceback
+import queue
+import os
+
+from pipeline.pipeline import (_baseline, _run_job, _prefetch, _base_template, candidates_per_attempt,
+                               job_pool_size, PROMPT_TYPES, PyProj, WorktreePool, GenerationPool, MetaPromptStore)
+from pipeline.journal import Journal
+from pipeline.profiler.filter_profiles import PROFILER_DIR, set_benchmark_lane
+from pipeline.components.worktrees import snapshot
+from pipeline.telemetry import tagged, take_records, add_records
+from pipeline.metrics import set_jobs, relay, forward
+from constants import *
+
+RUNS_DIR = PROFILER_DIR / "runs"
+
+def optimize_grid(optim_factories : dict, metaprompter_factory, projects : list = None, workers : int = None,
+                  journal : Journal = None):
+    """
+    optimize_projects as independent (project, optimizer, prompt type) jobs on a
+    process pool. Each job builds its own providers from the given picklable
+    factories ({optimizer name : factory}) and patches its own checkouts under
+    RUNS_DIR/<job>; results are yielded in completion order. Timed runs share
+    one benchmark lane across all processes. With a journal, jobs resume the
+    same way they do in optimize_projects.
+    """
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    lane = context.Lock()
+    lane_cpus, job_cpus = _split_cpus()
+    set_benchmark_lane(lane, lane_cpus) # baselines are timed in this process
+    workers = workers or max(1, len(job_cpus or ()) or WORKERS)
+
+    # jobs' records reach the metrics as they happen - the rows & call log still wait for the job
+    with relay(context) as forwarded, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(lane, lane_cpus, job_cpus, forwarded)) as executor:
+        # baselines are measured on a thread of their own, so finished jobs stream back in the meantime
+        events = queue.Queue() # (future, job) as jobs are submitted, (future, None) as they finish,
+                               # None once every project is submitted
+        errors = []
+        measuring = threading.Thread(target=_submit_jobs, daemon=True,
+                                     args=(executor, events, errors, optim_factories, metaprompter_factory,
+                                           projects, journal))
+        measuring.start()
+
+        futures = {}
+        submitting = True
+        while submitting or futures:
+            event = events.get()
+            if event is None:
+                submitting = False
+                continue
+            future, job = event
+            if job is not None:
+                futures[future] = job
+                set_jobs(_job_counts(futures))
+                continue
+
+            job = futures.pop(future)
+            set_jobs(_job_counts(futures))
+            try:
+                results, calls = future.result()
+            except Exception as e:
+                print(f"Job {_job_name(job)} failed: {e}")
+                continue
+            add_records(calls, observed=True)
+            print(f"Job {_job_name(job)} done - {len(results)} rows")
+            yield results
+            if journal is not None:
+                journal.record_done(job['project'], job['optimizer'], job['prompt_type'])
+        measuring.join()
+        if errors:
+            raise errors[0]
+
+def _submit_jobs(executor : ProcessPoolExecutor, events : queue.Queue, errors : list, optim_factories : dict,
+                 metaprompter_factory, projects : list = None, journal : Journal = None) -> None:
+    # measures each project's baseline, then submits its jobs - jobs of the first project run while
+    # later baselines are measured
+    try:
+        for proj_name in list(projects or PROJECTS):
+            pending = [(optim_name, prompt_type) for optim_name in optim_factories for prompt_type in PROMPT_TYPES
+                       if journal is None or not journal.done(proj_name, optim_name, prompt_type)]
+            if not pending:
+                continue
+
+            baseline = _baseline(proj_name, journal)
+            if baseline is None:
+                continue
+
+            base = snapshot(PyProj(proj_name).src_dir)
+            for optim_name, prompt_type in pending:
+                job = {'project': proj_name, 'optimizer': optim_name, 'prompt_type': prompt_type,
+                       'baseline': baseline, 'base': base,
+                       'journal': str(journal.directory) if journal is not None else None}
+                future = executor.submit(_grid_job, job, optim_factories[optim_name], metaprompter_factory)
+                events.put((future, job))
+                future.add_done_callback(lambda future: events.put((future, None))) # after its submission
+    except Exception as e: # raised by optimize_grid once the submitted jobs are done
+        traceback.print_exc()
+        errors.append(e)
+    finally:
+        events.put(None)
+
+def _grid_job(job : dict, optim_factory, metaprompter_factory) -> tuple:
+    # runs in a worker process - returns its results & the llm calls it made
+    run_dir = RUNS_DIR / _job_name(job)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    take_records() # inherited from the parent, or sent back with this process's previous job
+
+    with open(run_dir / "log.txt", 'w', encoding='utf-8') as log, redirect_stdout(log):
+        proj_name, prompt_type = job['project'], job['prompt_type']
+        task = list(TASKS)[0]
+        optim = optim_factory()
+        metaprompter = metaprompter_factory() if prompt_type == 'MP' else None
+        prompt_store = MetaPromptStore(META_PROMPTS_PATH, META_PROMPT_POOL, META_PROMPT_MAX_FAILURES)
+
+        base_project = PyProj(proj_name)
+        pool = WorktreePool(base_project.src_dir, size=job_pool_size(candidates_per_attempt()),
+                            worktrees_dir=run_dir / "worktrees", base=job['base'])
+        gen = GenerationPool()
+        try:
+            with tagged(project=proj_name, optimizer=optim.name, prompt_type=prompt_type):
+                prompt = _job_prompt(gen, metaprompter, prompt_store, optim, proj_name, task, prompt_type)
+                code_objects = [base_project.load_function(i) for i in range(len(base_project.top_bottlenecks))]
+                with tagged(stage='prefetch'):
+                    queued = _prefetch(gen, optim, prompt, code_objects)
+
+            og_failures, og_runtime = job['baseline']
+            journal = Journal(job['journal']) if job['journal'] else None
+            results = _run_job(base_project, pool, gen, optim, prompt, metaprompter, prompt_type, task,
+                               og_failures, og_runtime, queued, prompt_store, journal)
+        except BaseException:
+            traceback.print_exc()
+            raise
+        finally:
+            pool.close()
+            gen.close()
+
+    return results, take_records()
+
+def _job_prompt(gen : GenerationPool, metaprompter, prompt_store : MetaPromptStore, optim,
+                proj_name : str, task : str, prompt_type : str) -> str:
+    if prompt_type == 'MP':
+        with tagged(stage='meta_prompt'):
+            return gen.get_prompt(metaprompter, OBJECTIVE, proj_name, task, optim.name, store=prompt_store).result()
+    if prompt_type == 'FS':
+        return FEW_SHOT
+    if prompt_type == 'COT':
+        return COT
+    return _base_template(OBJECTIVE, proj_name, task, optim.name)
+
+def _init_worker(lane, lane_cpus : set, job_cpus : set, forwarded = None) -> None:
+    set_benchmark_lane(lane, lane_cpus)
+    if forwarded is not None:
+        forward(forwarded)
+    if job_cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, job_cpus) # validation runs stay off the lane's cpu
+
+def _split_cpus() -> tuple:
+    # one cpu reserved for timed runs, the rest for jobs - (None, None) where affinity isn't available
+    if not hasattr(os, 'sched_getaffinity'):
+        return None, None
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < 2:
+        return None, None
+    return {cpus[0]}, set(cpus[1:])
+
+def _job_counts(futures : dict) -> dict:
+    # {state : jobs} of the submitted jobs
+    done = [future for future in futures if future.done()]
+    failed = sum(1 for future in done if future.exception() is not None)
+    running = sum(1 for future in futures if future.running())
+    return {'pending': len(futures) - len(done) - running, 'running': running,
+            'done': len(done) - failed, 'failed': failed}
+
+def _job_name(job : dict) -> str:
+    return f"{job['project']}-{job['optimizer']}-{job['prompt_type']}"
@@ -0,0 +1,108 @@
+from pathlib import Path
+import threading
+import shutil
+import json
+import time
+import os
+
+class Journal:
+    """
+    Durable, append-only record of a sweep, so an interrupted run can resume.
+
+    Holds measured baselines (with the filtered profile the bottlenecks were
+    picked from), every revision of every (project, optimizer, prompt type)
+    job, resets of a job's patch stack and finished jobs. Each entry is one
+    fsynced JSON line, so a crash loses at most the entry being written.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.path = self.directory / "journal.jsonl"
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def baseline(self, project : str, profile_path) -> tuple | None:
+        # (failing test ids, runtime) - the saved profile is put back so bottlenecks come out in the same order
+        entry = self._last('baseline', project)
+        saved = self.directory / f"{project}_filtered0.speedscope"
+        if entry is None or not saved.exists():
+            return None
+        Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(saved, profile_path)
+        return frozenset(entry['failures']), entry['runtime']
+
+    def record_baseline(self, project : str, failures : frozenset, runtime : float, profile_path) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(profile_path, self.directory / f"{project}_filtered0.speedscope")
+        self._append({'event': 'baseline', 'project': project, 'failures': sorted(failures), 'runtime': runtime})
+
+    def done(self, project : str, optimizer : str, prompt_type : str) -> bool:
+        return self._last('done', project, optimizer, prompt_type) is not None
+
+    def record_done(self, project : str, optimizer : str, prompt_type : str) -> None:
+        self._append({'event': 'done', 'project': project, 'optimizer': optimizer, 'prompt_type': prompt_type})
+
+    def revisions(self, project : str, optimizer : str, prompt_type : str) -> list:
+        # every revision of an unfinished job, in order - 'reset' marks those whose patches were reverted
+        job = (project, optimizer, prompt_type)
+        revisions = []
+        for entry in self._entries:
+            if _job(entry) != job:
+                continue
+            if entry['event'] == 'revision':
+                revisions.append(entry)
+            elif entry['event'] == 'reset':
+                revisions = [{**revision, 'reverted': True} for revision in revisions]
+        return revisions
+
+    def record_revision(self, project : str, optimizer : str, prompt_type : str,
+                        edits : dict, failed_attempts : int, prompt : str, accepted : bool) -> None:
+        self._append({'event': 'revision', 'project': project, 'optimizer': optimizer, 'prompt_type': prompt_type,
+                      'edits': edits, 'failed_attempts': failed_attempts, 'prompt': prompt, 'accepted': accepted})
+
+    def record_reset(self, project : str, optimizer : str, prompt_type : str) -> None:
+        self._append({'event': 'reset', 'project': project, 'optimizer': optimizer, 'prompt_type': prompt_type})
+
+    def _last(self, event : str, *job) -> dict | None:
+        with self._lock:
+            for entry in reversed(self._entries):
+                if entry['event'] == event and _job(entry)[:len(job)] == job:
+                    return entry
+        return None
+
+    def _append(self, entry : dict) -> None:
+        entry = {'timestamp': time.time(), **entry}
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # one write per entry - grid jobs append to the same file from several processes
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries.append(entry)
+
+    def _load(self) -> list:
+        if not self.path.exists():
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        if text and not text.endswith("\n"): # torn final line of a crashed run - end it before appending
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("\n")
+
+        entries = []
+        for line in text.splitlines():
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return entries
+
+def fresh_journal(directory) -> None:
+    # set a finished sweep's journal aside so the next run starts over
+    directory = Path(directory)
+    if directory.exists():
+        directory.rename(directory.with_name(f"{directory.name}-{time.strftime('%Y%m%d-%H%M%S')}"))
+
+def _job(entry : dict) -> tuple:
+    return entry.get('project'), entry.get('optimizer'), entry.get('prompt_type')
@@ -8,23 +8,31 @@ class MetaPrompter():
     def generate(self) -> str:
         raise NotImplementedError("No generate method defined for this MetaPrompter instance")
 
+    async def agenerate(self) -> str:
+        raise NotImplementedError("No agenerate method defined for this MetaPrompter instance")
+
     def get_prompt(self, objective : str, project : str, task : str, model : str) -> str:
+        return self.generate(self._template(objective, project, task, model))
+
+    async def aget_prompt(self, objective : str, project : str, task : str, model : str) -> str:
+        return await self.agenerate(self._template(objective, project, task, model))
+
+    def _template(self, objective : str, project : str, task : str, model : str) -> str:
         if project in PROJECTS and task in TASKS:
-            p_name, p_desc, p_lang = (PROJECT_CONTEXTS[project]['name'], 
+            p_name, p_desc, p_lang = (PROJECT_CONTEXTS[project]['name'],
                                       PROJECT_CONTEXTS[project]['description'],
                                       PROJECT_CONTEXTS[project]['languages'])
-            
-            t_desc, t_cons = (TASK_CONTEXTS[task]['description'], 
+
+            t_desc, t_cons = (TASK_CONTEXTS[task]['description'],
                               TASK_CONTEXTS[task]['considerations'])
-            
-            llm_name, llm_cons = (MODEL_CONTEXTS[model]['name'], 
+
+            llm_name, llm_cons = (MODEL_CONTEXTS[model]['name'],
                               MODEL_CONTEXTS[model]['considerations'])
-            
-            prompt = MP_TEMPLATE(objective,
-                                p_name, p_desc, p_lang, 
-                                t_desc, t_cons,
-                                llm_name, llm_cons)
-            return self.generate(prompt)
+
+            return MP_TEMPLATE(objective,
+                               p_name, p_desc, p_lang,
+                               t_desc, t_cons,
+                               llm_name, llm_cons)
         else:
             raise InvalidTask(f"Invalid project/task passed! Must be in {PROJECTS} & {TASKS}")
 
@@ -32,38 +40,102 @@ class GeminiMP(GeminiAgent, MetaPrompter):
     def __init__(self) -> None:
         super().__init__()
         self.generate = self._gemini_gen
+        self.agenerate = self._gemini_agen
 
     def _gemini_gen(self, prompt : str):
-        response = self.client.generate_content(prompt)
+        return self._cached({"contents": prompt}, self._gemini_call)
+
+    async def _gemini_agen(self, prompt : str):
+        return await self._acached({"contents": prompt}, self._gemini_acall)
+
+    def _gemini_call(self, request : dict) -> str:
+        response = self.client.generate_content(**request)
+        self._record_usage(response)
+        return response.text
+
+    async def _gemini_acall(self, request : dict) -> str:
+        response = await self.client.generate_content_async(**request)
+        self._record_usage(response)
         return response.text
 
 class OpenMP(OpenAIAgent, MetaPrompter):
     def __init__(self) -> None:
         super().__init__()
         self.generate = self._openai_gen
+        self.agenerate = self._openai_agen
 
-    def _openai_gen(self, prompt : str):
-        completion = self.client.chat.completions.create(
+    def _openai_request(self, prompt : str) -> dict:
+        return dict(
             model="gpt-4o",
             max_tokens=MAX_TOKENS,
-            messages=[{"role": "system", 
+            messages=[{"role": "system",
                        "content": "You are a metaprompt generator. Generate ONLY the requested prompt with no introductory text, explanatory text, or concluding remarks."},
-                       {"role": "user", 
+                       {"role": "user",
                         "content": prompt}]
             )
+
+    def _openai_gen(self, prompt : str):
+        return self._cached(self._openai_request(prompt), self._openai_call)
+
+    async def _openai_agen(self, prompt : str):
+        return await self._acached(self._openai_request(prompt), self._openai_acall)
+
+    def _openai_call(self, request : dict) -> str:
+        completion = self.client.chat.completions.create(**request)
+        self._record_usage(completion)
+        return completion.choices[0].message.content
+
+    async def _openai_acall(self, request : dict) -> str:
+        completion = await self.aclient.chat.completions.create(**request)
+        self._record_usage(completion)
         return completion.choices[0].message.content
 
 class AnthroMP(AnthroAgent, MetaPrompter):
     def __init__(self) -> None:
-        super().__init__()        
+        super().__init__()
         self.generate = self._anthropic_gen
+        self.agenerate = self._anthropic_agen
 
-    def _anthropic_gen(self, prompt : str):
-        message = self.client.messages.create(
+    def _anthropic_request(self, prompt : str) -> dict:
+        return dict(
             model="claude-sonnet-4-20250514",
             max_tokens=MAX_TOKENS,
             messages=[
                 {"role": "user", "content": prompt}
             ]
         )
+
+    def _anthropic_gen(self, prompt : str):
+        return self._cached(self._anthropic_request(prompt), self._anthropic_call)
+
+    async def _anthropic_agen(self, prompt : str):
+        return await self._acached(self._anthropic_request(prompt), self._anthropic_acall)
+
+    def _anthropic_call(self, request : dict) -> str:
+        message = self.client.messages.create(**request)
+        self._record_usage(message)
+        return message.content[0].text
+
+    async def _anthropic_acall(self, request : dict) -> str:
+        message = await self.aclient.messages.create(**request)
+        self._record_usage(message)
         return message.content[0].text
+
+class MockMP(MockAgent, MetaPrompter):
+    # offline metaprompter - answers every template with the same canned prompt
+    def __init__(self, prompt : str = None, model_name : str = "4o", latency : float = 0, 
+                 ttft : float = None, seed : int = None) -> None:
+        super().__init__(model_name, latency, ttft, seed)
+        self.prompt = prompt or ("Optimize the object for runtime. Keep its name, signature and behaviour identical, "
+                                 "and prefer better algorithms and data structures over micro-optimizations.")
+        self.generate = self._mock_gen
+        self.agenerate = self._mock_agen
+
+    def _mock_gen(self, prompt : str):
+        return self._cached({"prompt": prompt}, self._mock_call)
+
+    async def _mock_agen(self, prompt : str):
+        return await self._acached({"prompt": prompt}, self._mock_acall)
+
+    def _respond(self, request : dict) -> str:
+        return self.prompt
@@ -0,0 +1,243 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from pathlib import Path
+import multiprocessing
+import threading
+import math
+import os
+
+class Metric:
+    """
+    One labelled metric family in the Prometheus text format - counters only
+    go up, gauges are set, histograms count observations into cumulative
+    buckets. Label values are keyed in the order of `labels`.
+    """
+    kind = None
+
+    def __init__(self, name : str, help : str, labels : tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {} # label values : value
+        self._lock = threading.Lock()
+
+    def _key(self, labels : dict) -> tuple:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _samples(self) -> list:
+        # [(suffix, label values, extra labels, value)]
+        with self._lock:
+            return [('', key, {}, value) for key, value in sorted(self._values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples():
+            labels = {**dict(zip(self.labels, key)), **extra}
+            text = ','.join(f'{label}="{_escape(value)}"' for label, value in labels.items())
+            lines.append(f"{self.name}{suffix}{'{' + text + '}' if text else ''} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount : float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value : float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name : str, help : str, labels : tuple = (), buckets : tuple = ()):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value : float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(bucket + (value <= bound) for bucket, bound in zip(counts, self.buckets))
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self) -> list:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket in zip(self.buckets, counts):
+                    samples.append(('_bucket', key, {'le': _number(bound)}, bucket))
+                samples.append(('_bucket', key, {'le': '+Inf'}, count))
+                samples.append(('_sum', key, {}, total))
+                samples.append(('_count', key, {}, count))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric : Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return ''.join(metric.render() for metric in self.metrics)
+
+REGISTRY = Registry()
+
+LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+SUITE_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+LLM_CALLS = REGISTRY.register(Counter('mpco_llm_calls_total', "Provider calls made",
+                                      ('provider', 'model', 'stage')))
+LLM_LATENCY = REGISTRY.register(Histogram('mpco_llm_latency_seconds', "Latency of provider calls",
+                                          ('provider',), LATENCY_BUCKETS))
+LLM_TOKENS = REGISTRY.register(Counter('mpco_llm_tokens_total', "Tokens sent & received", ('provider', 'kind')))
+LLM_COST = REGISTRY.register(Counter('mpco_llm_cost_usd_total', "Cost of provider calls in USD", ('provider',)))
+CANDIDATES = REGISTRY.register(Counter('mpco_candidates_total', "Candidates accepted or rejected, by the gate "
+                                       "that rejected them", ('optimizer', 'outcome', 'reason')))
+TEST_RUNS = REGISTRY.register(Histogram('mpco_test_run_seconds', "Duration of candidate test suite runs",
+                                        ('project',), SUITE_BUCKETS))
+BENCHMARKS = REGISTRY.register(Histogram('mpco_benchmark_runtime_seconds', "Suite runtime of finished benchmark "
+                                         "runs - baselines & patch stacks", ('project', 'kind'), SUITE_BUCKETS))
+JOBS = REGISTRY.register(Gauge('mpco_jobs', "(project, optimizer, prompt type) jobs of the sweep by state",
+                               ('state',)))
+
+_forwarding = None # queue of a job process's parent - see forward & relay
+
+def observe(entry : dict) -> None:
+    # one telemetry record (pipeline.telemetry) into the metrics it feeds - the parent's, in a job process
+    if _forwarding is not None:
+        _forwarding.put(entry)
+        return
+    _route(entry)
+
+def forward(records) -> None:
+    # called in a job process - its records are observed by the parent draining `records` as they happen
+    global _forwarding
+    _forwarding = records
+
+@contextmanager
+def relay(context = multiprocessing):
+    """
+    Yields a queue for job processes to forward their records to (forward);
+    records are observed in this process as they arrive, until the block exits.
+    Exit it only once the processes have - they flush their queued records then.
+    """
+    records = context.Queue()
+    thread = threading.Thread(target=_drain, args=(records,), daemon=True)
+    thread.start()
+    try:
+        yield records
+    finally:
+        records.put(None)
+        thread.join()
+
+def _drain(records) -> None:
+    while (entry := records.get()) is not None:
+        _route(entry)
+
+def _route(entry : dict) -> None:
+    if 'provider' in entry:
+        LLM_CALLS.inc(provider=entry['provider'], model=entry.get('model'), stage=entry.get('stage'))
+        if entry.get('latency') is not None:
+            LLM_LATENCY.observe(entry['latency'], provider=entry['provider'])
+        for kind in ('input', 'output', 'cached'):
+            if entry.get(f'{kind}_tokens'):
+                LLM_TOKENS.inc(entry[f'{kind}_tokens'], provider=entry['provider'], kind=kind)
+        if entry.get('cost'):
+            LLM_COST.inc(entry['cost'], provider=entry['provider'])
+    elif entry.get('event') == 'candidate':
+        CANDIDATES.inc(optimizer=entry.get('optimizer'), outcome=entry['outcome'], reason=entry.get('reason'))
+    elif entry.get('event') == 'benchmark' and entry.get('seconds') is not None:
+        BENCHMARKS.observe(entry['seconds'], project=entry.get('project'), kind=entry['kind'])
+    elif entry.get('stage') == 'tests' and entry.get('latency') is not None:
+        TEST_RUNS.observe(entry['latency'], project=entry.get('project'))
+
+def set_jobs(counts : dict) -> None:
+    # {state : jobs} - states missing from counts are zeroed so finished ones drop off
+    for state in ('pending', 'running', 'done', 'failed'):
+        JOBS.set(counts.get(state, 0), state=state)
+
+def write_textfile(path, registry : Registry = REGISTRY) -> None:
+    # atomically, so a node exporter's textfile collector never reads half a file
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temp.write_text(registry.render(), encoding='utf-8')
+    os.replace(temp, path)
+
+class MetricsExporter:
+    """
+    Exposes the registry while a run is going - rewritten to a Prometheus
+    text file every `interval` seconds and, with a port, served over HTTP at
+    /metrics. close() writes the file one last time.
+    """
+    def __init__(self, path = None, port : int = None, host : str = '127.0.0.1', interval : float = 15,
+                 registry : Registry = REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+        if port is not None:
+            self._server = ThreadingHTTPServer((host, port), _handler(registry))
+            self.port = self._server.server_address[1]
+            self._threads.append(threading.Thread(target=self._server.serve_forever, daemon=True))
+        if path is not None:
+            self._threads.append(threading.Thread(target=self._write_periodically, daemon=True))
+        [thread.start() for thread in self._threads]
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        [thread.join() for thread in self._threads]
+        if self.path is not None:
+            write_textfile(self.path, self.registry)
+
+    def _write_periodically(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                write_textfile(self.path, self.registry)
+            except OSError as e:
+                print(f"Couldn't write metrics to {self.path}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _handler(registry : Registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # scrapes would flood the teed run log
+    return MetricsHandler
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
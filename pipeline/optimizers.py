@@ -1,7 +1,12 @@
 from agents import *
 from constants import MAX_TOKENS
-from google.generativeai import GenerationConfig
+from pipeline.components.validation import StreamGuard
+from pipeline.telemetry import mark_first_token
+from textwrap import dedent
 import json
+import ast
+import csv
+import os
 
 # prompt should be like {prompt} \n\n "here is the code: " \n\n {code}
 
@@ -9,73 +14,284 @@ class GeminiOptimizer(GeminiAgent):
     def __init__(self) -> None:
         super().__init__()
         self.generate = self._gemini_gen
+        self.agenerate = self._gemini_agen
         self.name = "25"
 
-    def _gemini_gen(self, prompt : str, snippet : str, scope : str):
+    def _gemini_request(self, prompt : str, snippet : str, scope : str) -> dict:
+        from google.generativeai import GenerationConfig
         schema = {"type": "object",
             "properties": {"code": {"type": "string"}},
             "required": ["code"]}
-        
-        response = self.client.generate_content(
+
+        return dict(
             contents=assemble_prompt(prompt, snippet, scope),
             generation_config=GenerationConfig(
             response_mime_type="application/json",
-            response_schema=schema, 
+            response_schema=schema,
             max_output_tokens=MAX_TOKENS))
-        
+
+    def _gemini_gen(self, prompt : str, snippet : str, scope : str):
+        call = self._gemini_call
+        if stream_enabled():
+            call = lambda request: self._gemini_stream(request, StreamGuard(snippet))
+        return self._cached(self._gemini_request(prompt, snippet, scope), call)
+
+    async def _gemini_agen(self, prompt : str, snippet : str, scope : str):
+        acall = self._gemini_acall
+        if stream_enabled():
+            acall = lambda request: self._gemini_astream(request, StreamGuard(snippet))
+        return await self._acached(self._gemini_request(prompt, snippet, scope), acall)
+
+    def _gemini_call(self, request : dict) -> str:
+        response = self.client.generate_content(**request)
+        self._record_usage(response)
         return json.loads(response.text)["code"]
 
+    async def _gemini_acall(self, request : dict) -> str:
+        response = await self.client.generate_content_async(**request)
+        self._record_usage(response)
+        return json.loads(response.text)["code"]
+
+    def _gemini_stream(self, request : dict, guard : StreamGuard) -> str:
+        # abandoning the iterator drops the connection
+        response = self.client.generate_content(**request, stream=True)
+        buffer = ""
+        for chunk in response:
+            mark_first_token()
+            buffer += chunk.text
+            guard.feed(buffer)
+        self._record_usage(response)
+        return json.loads(buffer)["code"]
+
+    async def _gemini_astream(self, request : dict, guard : StreamGuard) -> str:
+        response = await self.client.generate_content_async(**request, stream=True)
+        buffer = ""
+        async for chunk in response:
+            mark_first_token()
+            buffer += chunk.text
+            guard.feed(buffer)
+        self._record_usage(response)
+        return json.loads(buffer)["code"]
+
 class OpenOptimizer(OpenAIAgent):
     def __init__(self) -> None:
         super().__init__()
         self.generate = self._openai_gen
+        self.agenerate = self._openai_agen
         self.name = "4o"
 
-    def _openai_gen(self, prompt : str, snippet : str, scope : str):
+    def _openai_request(self, prompt : str, snippet : str, scope : str) -> dict:
         schema = {
             "type": "object",
-            "properties": {"code": {"type": "string"}}, 
+            "properties": {"code": {"type": "string"}},
             "required": ["code"],
             "additionalProperties": False
         }
 
-        completion = self.client.chat.completions.create(
-            model="gpt-4o", 
+        return dict(
+            model="gpt-4o",
             max_tokens=MAX_TOKENS,
             response_format={"type": "json_schema", "json_schema": {"name": "code_response", "schema": schema, "strict": True}},
             messages=[
                 {"role": "system", "content": "Return ONLY the optimized code in the 'code' field. Include only executable code in this field, and exclude any comments, explanations, markdown formatting, or additional text."},
                 {"role": "user", "content": assemble_prompt(prompt, snippet, scope)}
             ])
-        
+
+    def _openai_gen(self, prompt : str, snippet : str, scope : str):
+        call = self._openai_call
+        if stream_enabled():
+            call = lambda request: self._openai_stream(request, StreamGuard(snippet))
+        return self._cached(self._openai_request(prompt, snippet, scope), call)
+
+    async def _openai_agen(self, prompt : str, snippet : str, scope : str):
+        acall = self._openai_acall
+        if stream_enabled():
+            acall = lambda request: self._openai_astream(request, StreamGuard(snippet))
+        return await self._acached(self._openai_request(prompt, snippet, scope), acall)
+
+    def _openai_call(self, request : dict) -> str:
+        completion = self.client.chat.completions.create(**request)
+        self._record_usage(completion)
         return json.loads(completion.choices[0].message.content)["code"]
 
+    async def _openai_acall(self, request : dict) -> str:
+        completion = await self.aclient.chat.completions.create(**request)
+        self._record_usage(completion)
+        return json.loads(completion.choices[0].message.content)["code"]
+
+    def _openai_stream(self, request : dict, guard : StreamGuard) -> str:
+        # usage arrives on a final chunk with no choices
+        stream = self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+        buffer = ""
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    self._record_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    mark_first_token()
+                    buffer += chunk.choices[0].delta.content
+                    guard.feed(buffer)
+        finally:
+            stream.close()
+        return json.loads(buffer)["code"]
+
+    async def _openai_astream(self, request : dict, guard : StreamGuard) -> str:
+        stream = await self.aclient.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+        buffer = ""
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    self._record_usage(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    mark_first_token()
+                    buffer += chunk.choices[0].delta.content
+                    guard.feed(buffer)
+        finally:
+            await stream.close()
+        return json.loads(buffer)["code"]
+
 class AnthroOptimizer(AnthroAgent):
     def __init__(self) -> None:
-        super().__init__()        
+        super().__init__()
         self.generate = self._anthropic_gen
+        self.agenerate = self._anthropic_agen
         self.name = "40"
 
-    def _anthropic_gen(self, prompt : str, snippet : str, scope : str):
-        code_tool={"name": "code_output", 
-                "description": "Return only code", 
-                "input_schema": 
+    def _anthropic_request(self, prompt : str, snippet : str, scope : str) -> dict:
+        code_tool={"name": "code_output",
+                "description": "Return only code",
+                "input_schema":
                 {"type": "object", "properties": {"code": {"type": "string"}},
                  "required": ["code"]}}
-        
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514", 
-            max_tokens=MAX_TOKENS, 
-            messages=[{"role": "user", "content": assemble_prompt(prompt, snippet, scope)}],
+
+        # tools + the long prompt form a stable prefix - cache it across snippets & retries
+        prefix, suffix = prompt_parts(prompt, snippet, scope)
+        return dict(
+            model="claude-sonnet-4-20250514",
+            max_tokens=MAX_TOKENS,
+            messages=[{"role": "user", "content": [
+                {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": suffix}]}],
             tools=[code_tool],
             tool_choice={"type": "tool", "name": "code_output"})
 
-        for block in response.content:
-            if block.type == "tool_use" and block.name == "code_output":
-                return block.input["code"]
-    
-        raise ValueError("No code_output tool use found in response")
-    
+    def _anthropic_gen(self, prompt : str, snippet : str, scope : str):
+        call = self._anthropic_call
+        if stream_enabled():
+            call = lambda request: self._anthropic_stream(request, StreamGuard(snippet))
+        return self._cached(self._anthropic_request(prompt, snippet, scope), call)
+
+    async def _anthropic_agen(self, prompt : str, snippet : str, scope : str):
+        acall = self._anthropic_acall
+        if stream_enabled():
+            acall = lambda request: self._anthropic_astream(request, StreamGuard(snippet))
+        return await self._acached(self._anthropic_request(prompt, snippet, scope), acall)
+
+    def _anthropic_call(self, request : dict) -> str:
+        response = self.client.messages.create(**request)
+        self._record_usage(response)
+        return _tool_code(response)
+
+    async def _anthropic_acall(self, request : dict) -> str:
+        response = await self.aclient.messages.create(**request)
+        self._record_usage(response)
+        return _tool_code(response)
+
+    def _anthropic_stream(self, request : dict, guard : StreamGuard) -> str:
+        # tool input streams as partial JSON - leaving the context manager closes the stream
+        with self.client.messages.stream(**request) as stream:
+            buffer = ""
+            for event in stream:
+                if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                    mark_first_token()
+                    buffer += event.delta.partial_json
+                    guard.feed(buffer)
+            response = stream.get_final_message()
+        self._record_usage(response)
+        return _tool_code(response)
+
+    async def _anthropic_astream(self, request : dict, guard : StreamGuard) -> str:
+        async with self.aclient.messages.stream(**request) as stream:
+            buffer = ""
+            async for event in stream:
+                if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                    mark_first_token()
+                    buffer += event.delta.partial_json
+                    guard.feed(buffer)
+            response = await stream.get_final_message()
+        self._record_usage(response)
+        return _tool_code(response)
+
+# model name -> optimizer, so runs only construct (and import the SDKs of) the providers they use
+OPTIMIZERS = {"25": GeminiOptimizer, "4o": OpenOptimizer, "40": AnthroOptimizer}
+
+class MockOptimizer(MockAgent):
+    """
+    Offline optimizer for benchmarking the pipeline. Modes:
+    - canned: `responses` ({snippet: code}) or the snippet unchanged
+    - mutate: the snippet re-rendered through the AST (same behaviour, new text)
+    - replay: edited snippets from a previous results csv (`replay_path`)
+    `fault_rate` of answers are deliberately broken to exercise retries.
+    """
+    def __init__(self, mode : str = "canned", responses : dict = None, replay_path = None, fault_rate : float = 0,
+                 model_name : str = "4o", latency : float = 0, ttft : float = None, seed : int = None) -> None:
+        super().__init__(model_name, latency, ttft, seed)
+        if mode not in ("canned", "mutate", "replay"):
+            raise ValueError(f"Unknown mock mode {mode} - must be canned, mutate or replay")
+
+        self.mode = mode
+        self.responses = dict(responses or {})
+        if mode == "replay":
+            self.responses.update(load_replay(replay_path))
+        self.fault_rate = fault_rate
+
+        self.generate = self._mock_gen
+        self.agenerate = self._mock_agen
+        self.name = model_name
+
+    def _mock_request(self, prompt : str, snippet : str, scope : str) -> dict:
+        return {"prompt": assemble_prompt(prompt, snippet, scope), "snippet": snippet}
+
+    def _mock_gen(self, prompt : str, snippet : str, scope : str):
+        return self._cached(self._mock_request(prompt, snippet, scope), self._mock_call)
+
+    async def _mock_agen(self, prompt : str, snippet : str, scope : str):
+        return await self._acached(self._mock_request(prompt, snippet, scope), self._mock_acall)
+
+    def _respond(self, request : dict) -> str:
+        snippet = request["snippet"]
+        if self.random.random() < self.fault_rate:
+            return snippet.rstrip() + "\n  return (\n" # bad dedent & an unclosed bracket
+
+        if self.mode == "mutate":
+            try:
+                return ast.unparse(ast.parse(dedent(snippet)))
+            except SyntaxError:
+                return snippet
+        return self.responses.get(snippet, snippet)
+
+def load_replay(path) -> dict:
+    # {original_snippet : edited_snippet} from a results csv written by main.py
+    csv.field_size_limit(2 ** 31 - 1) # snippets outgrow the default field limit
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {row['original_snippet']: row['edited_snippet'] for row in csv.DictReader(f)
+                if row.get('original_snippet') and row.get('edited_snippet')}
+
+def stream_enabled() -> bool:
+    # opt in with MPCO_STREAM=1 (main.py --stream sets it) - hopeless candidates are cut off mid-generation
+    return os.environ.get('MPCO_STREAM', '') in ('1', 'true', 'yes')
+
+def prompt_parts(prompt : str, snippet : str, scope : str) -> tuple:
+    # stable prefix (meta/few-shot/CoT/base prompt) first, per-snippet suffix last - 
+    # openai & gemini cache matching prompt prefixes implicitly, anthropic via cache_control
+    return prompt, f"Object to be optimized:\n\n{snippet}\n\nEnclosing scope of object:\n\n{scope}"
+
 def assemble_prompt(prompt : str, snippet : str, scope : str) -> str:
-    return f"{prompt}\n\nObject to be optimized:\n\n{snippet}\n\nEnclosing scope of object:\n\n{scope}"
+    return "\n\n".join(prompt_parts(prompt, snippet, scope))
+
+def _tool_code(response) -> str:
+    for block in response.content:
+        if block.type == "tool_use" and block.name == "code_output":
+            return block.input["code"]
 
+    raise ValueError("No code_output tool use found in response")
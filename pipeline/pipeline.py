@@ -1,14 +1,27 @@
 from pipeline.metaprompters import OpenMP, MetaPrompter
+from pipeline.generation import GenerationPool
+from pipeline.batches import BatchQueue, BatchError, batch_backend, batch_enabled
+from pipeline.telemetry import tagged, timed_stage, job_records, summarize, record_event
+from pipeline.metrics import set_jobs
+from pipeline.prompt_store import MetaPromptStore, prompt_id
+from pipeline.journal import Journal
+from pipeline.baselines import BaselineCache, baseline_cache_enabled, environment_fingerprint
 from pipeline.optimizers import *
 from pipeline.components import *
 from pipeline.profiler import *
+from pipeline.profiler.filter_profiles import PROFILER_DIR
 
 from constants import *
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
 import pandas as pd
 import traceback
+import os
 
 
+PROMPT_TYPES = ('MP', 'FS', 'COT', 'BASE')
+
 class OptimizationError(Exception):
     def __init__(self, code_object, optimizer_name, attempts=10):
         self.code_object = code_object
@@ -21,160 +34,568 @@ class OptimizationError(Exception):
         )
         super().__init__(message)
 
-def optimize_projects():
-    mpo4 = OpenMP()
-    optims = (AnthroOptimizer(), OpenOptimizer(), GeminiOptimizer(),)
+def optimize_projects(optims : tuple = None, metaprompter : MetaPrompter = None, projects : list = None,
+                      journal : Journal = None):
+    # providers are pluggable - e.g. MockOptimizer / MockMP for offline benchmarking
+    # with a journal, finished jobs & measured baselines are skipped and interrupted jobs resumed
+    mpo4 = metaprompter or OpenMP()
+    prompt_store = MetaPromptStore(META_PROMPTS_PATH, META_PROMPT_POOL, META_PROMPT_MAX_FAILURES)
+    optims = optims or (AnthroOptimizer(), OpenOptimizer(), GeminiOptimizer(),)
+    gen = GenerationPool()
+    jobs = {'pending': 0, 'done': 0} # of the projects reached so far
+
+    for proj_name in list(projects or PROJECTS):        
+        task = list(TASKS)[0]
+        pending = [(optim, prompt_type) for optim in optims for prompt_type in PROMPT_TYPES
+                   if journal is None or not journal.done(proj_name, optim.name, prompt_type)]
+        jobs['pending'] += len(pending)
+        set_jobs(jobs)
+        if not pending:
+            print(f"All jobs for {proj_name} already done - skipping")
+            continue
 
-    for proj_name in list(PROJECTS):        
-        get_pyprofile(proj_name, 0)
-        og_failure_count, _, _ = get_pyprofile(proj_name, 0) 
-        # running twice may be necessary as some test suites need initialization run
+        # meta prompts don't depend on the baseline - let them generate while it runs
+        meta_prompts = {}
+        for optim in optims:
+            with tagged(project=proj_name, optimizer=optim.name, prompt_type='MP', stage='meta_prompt'):
+                meta_prompts[optim.name] = gen.get_prompt(mpo4, OBJECTIVE, proj_name, task, optim.name, 
+                                                          store=prompt_store)
 
-        if og_failure_count is None:
-            print(f"Test suite on {proj_name} errors - skipping")
+        baseline = _baseline(proj_name, journal)
+        if baseline is None:
+            [future.cancel() for future in meta_prompts.values()]
             continue
+        og_failures, og_runtime = baseline
 
-        # get 10 trial average for the original runtime - before optimizations
-        original_runtimes = []
-        for _ in range(10):
-            _, original_runtime, _ = get_pyprofile(proj_name, 0)
-            original_runtimes.append(original_runtime)
-        og_runtime = sum(original_runtimes) / len(original_runtimes)
-        print(f"Benchmark completed for {proj_name} : avg runtime {og_runtime}")
+        base_project = PyProj(proj_name)
+        pool = WorktreePool(base_project.src_dir, size=max(2, WORKERS)) # a job's tree & a spare to lease
 
-        project = PyProj(proj_name)
+        # queue first attempts for every bottleneck, optimizer & prompt type at once
+        code_objects = [base_project.load_function(i) for i in range(len(base_project.top_bottlenecks))]
+        prefetched = {}
+        for optim in optims:
+            for prompt, prompt_type in ((meta_prompts[optim.name], 'MP'),
+                                        (FEW_SHOT, 'FS'),
+                                        (COT, 'COT'),
+                                        (_base_template(OBJECTIVE, proj_name, task, optim.name), 'BASE')):
+                if (optim, prompt_type) not in pending:
+                    continue
+                with tagged(project=proj_name, optimizer=optim.name, prompt_type=prompt_type, stage='prefetch'):
+                    prefetched[optim.name, prompt_type] = _prefetch(gen, optim, prompt, code_objects)
 
         # generate snippets for each revision model
-        task = list(TASKS)[0]
-        
         for optim in optims:
             # generate necessary prompts
-            meta_prompt = mpo4.get_prompt(OBJECTIVE, proj_name, task, optim.name)
-            print("GENERATED META PROMPT: \n" + meta_prompt)
+            meta_prompt = meta_prompts[optim.name].result()
+            print(f"META PROMPT {prompt_id(meta_prompt)}: \n" + meta_prompt)
             base_contextual_prompt = _base_template(OBJECTIVE, proj_name, task, optim.name)
             for prompt, metaprompter, prompt_type in ((meta_prompt, mpo4, 'MP'),
                                                     (FEW_SHOT, None, 'FS'),
                                                     (COT, None, 'COT'),
                                                     (base_contextual_prompt, None, 'BASE')):
-                runtimes = []
-                patches = []
-                
-                all_snippets = []       
-                all_attempts = []
-                try:
-                    while True: # optimization loop given params (project, prompt, optimizer model)
-                        for _ in range(10):
-                            try:
-                                edits, failed_optims, prompt = _optimize_snippet(OBJECTIVE, task, 
-                                                                                project, optim, prompt, 
-                                                                                patches, og_failure_count, 
-                                                                                metaprompter = metaprompter)
-                            except (OptimizationError, ValueError, KeyError) as e: # if theres an error show it
-                                project.revisions += 1
-                                traceback.print_exc()
-                                print(type(e).__name__)
-                                print(f"Error optimizing {proj_name} with {optim.name}: {e}")
-
-                            all_snippets.append(edits)
-                            all_attempts.append(failed_optims)
-
-                        if project.revisions == 0:
-                            print(f"No successful optimizations - moving to next prompt type")
-                            break
-                        print("Optimizations generated - benchmarking...")
-
-                        # now we have ~10 patches - run tests on current revision (10th)
-                        new_failure_count, new_runtime, profile = get_pyprofile(proj_name, 'bench', testing_patch=True)
-
-                        # if the last revision is worse, revert all patches and try again
-                        if new_failure_count > og_failure_count:
-                            print("Critical optimization failure - reverting patches and trying again ")
-                            
-                            # display 
-                            print(profile.stderr.decode('utf-8'))
-                            
-                            [patch.revert_patch() for patch in patches]
-                            continue
-                        
-                        # if the last revision is successful, keep testing and then breka
-                        else:
-                            print(f"Benchmark {1} complete with runtime {new_runtime}")
-                            runtimes.append(new_runtime)
-                            for bench in range(9):
-                                _, new_runtime, _ = get_pyprofile(proj_name, 'bench', testing_patch=True)
-                                print(f"Benchmark {bench + 2} complete with runtime {new_runtime}")
-                                runtimes.append(new_runtime)
-                            break
-                except BaseException as e:
-                    print(f"Error during optimization loop: {e}")
-                    traceback.print_exc()
-                finally:
-                    print(f"\nDone with {prompt_type} prompting - moving to next prompt type for project {proj_name} with optimizer {optim.name}\n")
-                    yield _assemble_results(all_snippets, 
-                                           proj_name, optim.name, 
-                                           prompt, prompt_type, 
-                                           all_attempts, runtimes,
-                                           og_runtime) # record results
-
-                    [patch.revert_patch() for patch in patches] # always revert all patches at the end
-                    project.revisions = 0 # reset revisions for next set of revisions
+                if (optim, prompt_type) not in pending:
+                    print(f"{prompt_type} prompting with {optim.name} already done - skipping")
+                    continue
+                jobs['pending'] -= 1
+                set_jobs({**jobs, 'running': 1})
+                results = _run_job(base_project, pool, gen, optim, prompt, metaprompter, prompt_type, task,
+                                   og_failures, og_runtime, prefetched.pop((optim.name, prompt_type)), prompt_store,
+                                   journal)
+                jobs['done'] += 1
+                set_jobs(jobs)
+                yield results
+                if journal is not None: # results were handed over - at worst a crash here repeats their rows
+                    journal.record_done(proj_name, optim.name, prompt_type)
                     
             print(f"Done with {optim.name} - moving to next optimizer...")
+        pool.close()
         print(f"Optimization complete for project {proj_name}")
+    gen.close()
     return
 
+def _baseline(proj_name : str, journal : Journal = None) -> tuple | None:
+    # (ids of failing tests, 10 trial average runtime) of the unpatched project - None if its suite errors
+    profile_path = PROFILER_DIR / "profiles" / f"{proj_name}_filtered0.speedscope"
+    restored, source = journal.baseline(proj_name, profile_path) if journal is not None else None, 'journal'
+    cache = BaselineCache(BASELINE_CACHE_DIR)
+    fingerprint = environment_fingerprint(proj_name) if restored is None and baseline_cache_enabled() else None
+    if fingerprint is not None:
+        restored, source = cache.get(proj_name, fingerprint, profile_path), 'cache'
+        if restored is not None and journal is not None: # the sweep sticks to it, even if the venv changes
+            journal.record_baseline(proj_name, *restored, profile_path)
+    if restored is not None:
+        print(f"Baseline for {proj_name} restored from {source} : avg runtime {restored[1]}")
+        _capture(proj_name) # only runs if the corpus was cleared
+        return restored
+
+    get_pyprofile(proj_name, 0)
+    og_failures, _, _ = get_pyprofile(proj_name, 0) 
+    # running twice may be necessary as some test suites need initialization run
+
+    if og_failures is None:
+        print(f"Test suite on {proj_name} errors - skipping")
+        return None
+
+    # get 10 trial average for the original runtime - before optimizations
+    original_runtimes = []
+    with benchmark_lane():
+        for _ in range(10):
+            _, original_runtime, _ = get_pyprofile(proj_name, 0)
+            original_runtimes.append(original_runtime)
+            record_event('benchmark', project=proj_name, kind='baseline', seconds=original_runtime)
+    og_runtime = sum(original_runtimes) / len(original_runtimes)
+    print(f"Benchmark completed for {proj_name} : avg runtime {og_runtime}")
+    _capture(proj_name)
+    if journal is not None:
+        journal.record_baseline(proj_name, og_failures, og_runtime, profile_path)
+    if fingerprint is not None:
+        cache.put(proj_name, fingerprint, og_failures, og_runtime, profile_path)
+    return og_failures, og_runtime
+
+def _capture(proj_name : str) -> None:
+    # calls to the bottlenecks picked from the last baseline profile, replayable without the suite
+    project = PyProj(proj_name)
+    capture_inputs(proj_name, [project.load_function(i) for i in range(len(project.top_bottlenecks))])
+
+def job_pool_size(candidates : int) -> int:
+    # checkouts a lone job needs - its own tree, one to leave patches out in & one per tournament candidate
+    return 2 + (candidates if candidates > 1 else 0)
+
+def _run_job(base_project : PyProj, pool : WorktreePool, gen : GenerationPool, optim, prompt : str,
+             metaprompter : MetaPrompter, prompt_type : str, task : str,
+             og_failures : frozenset, og_runtime : float, queued : dict, 
+             prompt_store : MetaPromptStore, journal : Journal = None) -> pd.DataFrame:
+    # one (project, optimizer, prompt type) cell - ~10 revisions, benchmarked together
+    proj_name = base_project.name
+    job = (proj_name, optim.name, prompt_type)
+    runtimes = []
+    patches = []
+    func_speedups = {}
+    patch_speedups = {}
+    dropped = []
+
+    all_snippets = []       
+    all_attempts = []
+    all_prompts = [] # meta prompts rotate on failure - record which one each snippet used
+
+    # each (optimizer, prompt type) patches its own leased checkout
+    tree = pool.acquire()
+    project = base_project.at(tree)
+    try:
+        # an interrupted run of this job left revisions in the journal - pick up where it stopped
+        revisions = journal.revisions(*job) if journal is not None else []
+        restored = _restore(project, revisions, patches)
+        for revision in revisions:
+            all_snippets.append(revision['edits'])
+            all_attempts.append(revision['failed_attempts'])
+            all_prompts.append(prompt_id(revision['prompt']))
+            prompt = revision['prompt'] # meta prompts may have rotated
+            for original in revision['edits']: # its prefetched first attempt isn't needed anymore
+                if original in queued:
+                    queued.pop(original)[1].cancel()
+        if revisions:
+            print(f"Resumed {len(revisions)} revisions from journal ({len(patches)} patches re-applied)")
+
+        while True: # optimization loop given params (project, prompt, optimizer model)
+            for _ in range(max(10 - restored, 0)):
+                accepted = False
+                try:
+                    with tagged(project=proj_name, optimizer=optim.name, prompt_type=prompt_type):
+                        edits, failed_optims, prompt = _optimize_snippet(OBJECTIVE, task, 
+                                                                        project, optim, prompt, 
+                                                                        patches, og_failures, 
+                                                                        metaprompter = metaprompter,
+                                                                        queued = queued,
+                                                                        prompt_store = prompt_store,
+                                                                        gen = gen, pool = pool)
+                    accepted = True
+                except (OptimizationError, ValueError, KeyError) as e: # if theres an error show it
+                    edits, failed_optims = {}, MAX_ATTEMPTS # no revision - the slot is journaled empty
+                    project.revisions += 1
+                    traceback.print_exc()
+                    print(type(e).__name__)
+                    print(f"Error optimizing {proj_name} with {optim.name}: {e}")
+
+                all_snippets.append(edits)
+                all_attempts.append(failed_optims)
+                all_prompts.append(prompt_id(prompt))
+                if journal is not None:
+                    journal.record_revision(*job, edits, failed_optims, prompt, accepted)
+            restored = 0
+
+            if project.revisions == 0:
+                print(f"No successful optimizations - moving to next prompt type")
+                break
+            print("Optimizations generated - benchmarking...")
+
+            # now we have ~10 patches - run tests on current revision (10th)
+            with benchmark_lane(): # timed runs never share cores with other jobs' test runs
+                new_failures, new_runtime, profile = get_pyprofile(proj_name, 'bench', testing_patch=True, 
+                                                                   repo_path=project.root_dir)
+
+            # if the last revision is worse, revert all patches and try again
+            if new_failures is None or not new_failures <= og_failures:
+                print("Critical optimization failure - reverting patches and trying again ")
+                print(f"Newly failing tests: {sorted(new_failures - og_failures) if new_failures else 'suite errored'}")
+                
+                # display 
+                print(profile.stderr.decode('utf-8'))
+                
+                [patch.revert_patch() for patch in patches]
+                if journal is not None:
+                    journal.record_reset(*job)
+                continue
+            
+            # if the last revision is successful, keep testing and then breka
+            else:
+                print(f"Benchmark {1} complete with runtime {new_runtime}")
+                record_event('benchmark', project=proj_name, kind='stack', seconds=new_runtime)
+                func_speedups = _microbenchmark(base_project, project, patches)
+                patch_speedups = _attribute(pool, project, patches, og_failures)
+                if DROP_REGRESSIONS:
+                    dropped = _drop_regressions(project, patches, patch_speedups, func_speedups, og_failures)
+                runtimes = [] if dropped else [new_runtime] # the first run timed patches that are gone
+                with benchmark_lane():
+                    while len(runtimes) < 10:
+                        _, new_runtime, _ = get_pyprofile(proj_name, 'bench', testing_patch=True,
+                                                          repo_path=project.root_dir)
+                        runtimes.append(new_runtime)
+                        record_event('benchmark', project=proj_name, kind='stack', seconds=new_runtime)
+                        print(f"Benchmark {len(runtimes)} complete with runtime {new_runtime}")
+                break
+    except BaseException as e:
+        print(f"Error during optimization loop: {e}")
+        traceback.print_exc()
+        if isinstance(e, (KeyboardInterrupt, SystemExit)): # cleaned up below, but not handed over as done
+            raise
+    finally:
+        # prefetches overlap prompt types, so this is cumulative for the optimizer
+        cache_stats = optim.prompt_cache_stats()
+        print(f"Prompt cache for {optim.name} so far: {cache_stats['cached_tokens']}/{cache_stats['input_tokens']} "
+              f"input tokens cached over {cache_stats['calls']} calls ({cache_stats['hit_rate']:.0%})")
+        print(f"\nDone with {prompt_type} prompting - moving to next prompt type for project {proj_name} with optimizer {optim.name}\n")
+        results = _assemble_results(all_snippets, 
+                                    proj_name, optim.name, 
+                                    prompt, prompt_type, 
+                                    all_attempts, runtimes,
+                                    og_runtime, 
+                                    job_records(proj_name, optim.name, prompt_type),
+                                    all_prompts, func_speedups,
+                                    patch_speedups, dropped) # record results
+
+        [patch.revert_patch() for patch in patches] # always revert all patches at the end
+        project.revisions = 0 # reset revisions for next set of revisions
+        pool.release(tree)
+        [future.cancel() for _, future in queued.values()] # unused prefetches
+    return results
+
+def _microbenchmark(base_project : PyProj, project : PyProj, patches : list) -> dict:
+    # {original snippet : speedup of that function alone} - suite time hides small functions' gains
+    code_objects = [patch.code_object for patch in patches]
+    with timed_stage('tests'): # captured with the baseline - unless the corpus was cleared since
+        capture_inputs(base_project.name, code_objects, base_project.src_dir)
+
+    speedups = {}
+    for code_object in code_objects:
+        speedup = function_speedup(base_project.name, code_object, base_project.src_dir, project.root_dir)
+        if speedup is not None:
+            print(f"Microbenchmark of {code_object['rel_path']}:{code_object['start_line'] + 1} - {speedup:.2f}x")
+            speedups[code_object['code']] = speedup
+    return speedups
+
+def _attribute(pool : WorktreePool, project : PyProj, patches : list, og_failures : frozenset) -> dict:
+    # {original snippet : suite runtime without the patch / with the whole stack} - leave-one-out, above 1
+    # where the patch helped. missing where taking it out breaks the stack (later patches build on it)
+    full = _best_runtime(project.name, project.root_dir)
+    speedups = {}
+    for patch in patches:
+        if patch.empty or full in (0, float('inf')):
+            continue
+        with pool.lease() as tree:
+            pool.mirror(tree, project.root_dir)
+            if not patch.revert_at(tree):
+                continue
+            with timed_stage('tests'):
+                failures, _, _ = get_pyprofile(project.name, 'candidate', testing_patch=True, repo_path=tree,
+                                               failfast=og_failures)
+            if failures is None or not failures <= og_failures:
+                continue
+            without = _best_runtime(project.name, tree)
+
+        if without != float('inf'):
+            speedups[patch.code_object['code']] = without / full
+            print(f"Patch to {patch.code_object['rel_path']}:{patch.code_object['start_line'] + 1} - "
+                  f"{without / full:.3f}x of the stack's runtime")
+    return speedups
+
+def _regressions(patch_speedups : dict, func_speedups : dict, tolerance : float = ATTRIBUTION_TOLERANCE) -> list:
+    # patches the suite is slower with beyond noise - unless their own function got faster in its microbenchmark
+    return [original for original, speedup in patch_speedups.items()
+            if speedup < 1 - tolerance and (func_speedups.get(original) or 0) <= 1]
+
+def _drop_regressions(project : PyProj, patches : list, patch_speedups : dict, func_speedups : dict,
+                      og_failures : frozenset) -> list:
+    # reverts the regressing patches from the stack - returns their original snippets
+    regressions = _regressions(patch_speedups, func_speedups)
+    dropped = []
+    for patch in [patch for patch in patches if patch.code_object['code'] in regressions]:
+        try:
+            patch.revert_patch()
+        except Exception:
+            continue
+        patches.remove(patch)
+        dropped.append(patch)
+    if not dropped:
+        return []
+
+    # each was only left out alone - check the stack without all of them together
+    with timed_stage('tests'):
+        failures, _, _ = get_pyprofile(project.name, 'bench', testing_patch=True, repo_path=project.root_dir,
+                                       failfast=og_failures)
+    if failures is None or not failures <= og_failures:
+        print("Stack fails without the regressing patches - keeping them")
+        for patch in dropped:
+            if patch.apply_patch():
+                patches.insert(0, patch)
+        return []
+
+    for patch in dropped:
+        print(f"Dropped regressing patch to {patch.code_object['rel_path']}:{patch.code_object['start_line'] + 1}")
+    return [patch.code_object['code'] for patch in dropped]
+
+def _restore(project : PyProj, revisions : list, patches : list) -> int:
+    # re-apply accepted patches in journal order - returns the revisions made since the last reset
+    for revision in revisions:
+        if revision['accepted'] and not revision.get('reverted'):
+            code_object = project.load_function()
+            (original, edited), = revision['edits'].items()
+            patch = MyPatch(code_object, edited, project.root_dir)
+            if code_object['code'] == original and patch.apply_patch():
+                patches.insert(0, patch)
+            else:
+                print(f"Journaled patch for {code_object['rel_path']} no longer applies - skipped")
+        project.revisions += 1
+    return sum(1 for revision in revisions if not revision.get('reverted'))
+
 def _optimize_snippet(objective : str, task : str, 
                       project : PyProj, optim : AnthroOptimizer | OpenOptimizer | GeminiOptimizer, 
                       prompt : str, patches : list, 
-                      og_failure_count : list, metaprompter : MetaPrompter = None):
+                      og_failures : frozenset, metaprompter : MetaPrompter = None,
+                      queued : dict = None, prompt_store : MetaPromptStore = None,
+                      gen : GenerationPool = None, pool : WorktreePool = None):
     
     proj_name = project.name
+    candidates = candidates_per_attempt() if gen and pool and pool.size > 1 else 1 # needs a spare checkout
 
     code_object = project.load_function()
     old_snippet = code_object['code']
-    scope = code_object['scope']
-
-    for failed_optims in range(10):
-        try: 
-            print("Optimizing...")
-            new_snippet = optim.generate(prompt, old_snippet, scope)
-        except (ValueError, KeyError) as e:
-            print(f"Error generating code: {e}")
-            print("Trying one more time...")
-            new_snippet = optim.generate(prompt, old_snippet, scope)
-
-        patch = MyPatch(code_object, new_snippet, project.root_dir)
-        if patch.apply_patch():
-            # run tests to get runtimes in this scope
-            new_failure_count, _, profile = get_pyprofile(proj_name, project.revisions + 1, testing_patch = True)
+    scope = prompt_scope(code_object)
 
-            if (new_failure_count is None) or (new_failure_count > og_failure_count):
-                print("============FAULTY CODE============")
-                print(f"filename : {code_object['rel_path']}, startline : {code_object['start_line']}")
-                print(new_snippet) 
-                print("===================================")
+    # first attempt may already be generated - only usable if snippet & prompt still match
+    prefetch = (queued or {}).pop(old_snippet, None)
+
+    for failed_optims in range(MAX_ATTEMPTS):
+        try:
+            try: 
+                print("Optimizing...")
+                usable = failed_optims == 0 and prefetch and _resolve(prefetch[0]) == prompt
+                if candidates > 1: # the fastest of k candidates still goes through the gates below
+                    new_snippet = _tournament(gen, pool, project, optim, prompt, code_object, og_failures,
+                                              candidates, prefetch[1] if usable else None)
+                elif usable:
+                    try:
+                        new_snippet = prefetch[1].result()
+                    except BatchError as e: # the batch failed, not the candidate - ask again interactively
+                        print(f"Batched generation failed ({e}) - generating interactively")
+                        with tagged(snippet=old_snippet, stage='generate'):
+                            new_snippet = optim.generate(prompt, old_snippet, scope)
+                else:
+                    with tagged(snippet=old_snippet, stage='generate'):
+                        new_snippet = optim.generate(prompt, old_snippet, scope)
+            except (ValueError, KeyError) as e: # unparseable output - provider errors are retried by the scheduler
+                raise InvalidCandidate('generate', f"error generating code: {e}")
 
-                print(profile.stdout.decode('utf-8'))
+            patch = MyPatch(code_object, new_snippet, project.root_dir)
 
+            # static gate - parse, signature & compile before touching the checkout
+            check_candidate(code_object, new_snippet, project.root_dir)
+            if not patch.apply_patch():
+                record_event('candidate', outcome='rejected', reason='patch')
                 patch.revert_patch()
-                print(f"{failed_optims + 1} failed optimizations : regenerating attempt...")
-                
-                if failed_optims == 9:
-                    raise OptimizationError(code_object, optim.name)
-                if metaprompter: # only regenerate prompt if the very first revision fails
-                    print("Regenerating prompt...")
-                    prompt = metaprompter.get_prompt(objective, proj_name, task, optim.name) 
-                    print("GENERATED META PROMPT: \n" + prompt)
+                continue
+            
+            try:
+                import_check(code_object, project.root_dir, 
+                             venv_python(proj_name), checkout_env(project.root_dir))
+                # behaviour gate - recorded calls must come out as they do in the original
+                differential_check(proj_name, code_object, project.src_dir, project.root_dir)
+            except InvalidCandidate:
+                patch.revert_patch()
+                raise
 
-            else:
+        except InvalidCandidate as e:
+            # streamed generations are cut off as soon as the partial code is hopeless
+            if e.stage not in ('tournament', 'generate'): # tournament candidates are reported as they drop out
+                print("============INVALID CODE============")
+                print(f"filename : {code_object['rel_path']}, startline : {code_object['start_line']}")
+                print(e.partial if isinstance(e, StreamAborted) else new_snippet)
+                print("====================================")
+            print(f"Rejected before testing: {e}")
+            if e.stage != 'tournament':
+                record_event('candidate', outcome='rejected', reason=e.stage)
+
+        else:
+            # run tests to get runtimes in this scope
+            with tagged(snippet=old_snippet), timed_stage('tests'):
+                new_failures, _, profile = get_pyprofile(proj_name, project.revisions + 1, testing_patch = True,
+                                                         repo_path = project.root_dir, failfast = og_failures)
+
+            # accepted only if every failing test already failed on the baseline - a subset, not a count
+            if (new_failures is not None) and (new_failures <= og_failures):
+                record_event('candidate', outcome='accepted', reason='')
                 patches.insert(0, patch)
                 project.revisions += 1
                 return {old_snippet : new_snippet}, failed_optims, prompt
-        else:
+
+            record_event('candidate', outcome='rejected', reason='tests')
+            print("============FAULTY CODE============")
+            print(f"filename : {code_object['rel_path']}, startline : {code_object['start_line']}")
+            print(new_snippet) 
+            print("===================================")
+
+            print(profile.stdout.decode('utf-8'))
+
             patch.revert_patch()
 
+        print(f"{failed_optims + 1} failed optimizations : regenerating attempt...")
+        
+        if failed_optims == MAX_ATTEMPTS - 1:
+            raise OptimizationError(code_object, optim.name)
+        if metaprompter and prompt_store: # move to the next stored meta prompt instead of regenerating
+            print("Rotating meta prompt...")
+            with tagged(snippet=old_snippet, stage='meta_prompt'):
+                prompt = prompt_store.rotate(metaprompter, objective, proj_name, task, optim.name, prompt)
+            print(f"META PROMPT {prompt_id(prompt)}: \n" + prompt)
+        elif metaprompter: # only regenerate prompt if the very first revision fails
+            print("Regenerating prompt...")
+            with tagged(snippet=old_snippet, stage='meta_prompt'):
+                prompt = metaprompter.get_prompt(objective, proj_name, task, optim.name) 
+            print("GENERATED META PROMPT: \n" + prompt)
+
     raise OptimizationError(code_object, optim.name)
 
+def candidates_per_attempt() -> int:
+    # MPCO_CANDIDATES (main.py --candidates) overrides the configured k
+    return max(1, int(os.environ.get('MPCO_CANDIDATES', CANDIDATES_PER_ATTEMPT)))
+
+def _tournament(gen : GenerationPool, pool : WorktreePool, project : PyProj, optim, prompt : str,
+                code_object : dict, og_failures : frozenset, k : int, prefetched : Future = None) -> str:
+    # k candidates -> static gate -> tests in parallel checkouts -> fastest survivor
+    old_snippet, scope = code_object['code'], prompt_scope(code_object)
+    with tagged(snippet=old_snippet, stage='generate'):
+        futures = [prefetched] if prefetched else []
+        futures += [gen.generate(optim, prompt, old_snippet, scope) for _ in range(k - len(futures))]
+
+    snippets = []
+    for future in futures:
+        try:
+            snippets.append(future.result())
+        except (ValueError, KeyError, InvalidCandidate) as e:
+            print(f"Candidate failed to generate: {e}")
+
+    valid = []
+    for snippet in dict.fromkeys(snippets): # identical samples only need testing once
+        try:
+            check_candidate(code_object, snippet, project.root_dir)
+            valid.append(snippet)
+        except InvalidCandidate as e:
+            print(f"Candidate rejected before testing: {e}")
+            record_event('candidate', outcome='rejected', reason=e.stage)
+    if not valid:
+        raise InvalidCandidate('tournament', f"none of {len(futures)} candidates passed static checks")
+
+    # one checkout per candidate, leaving the project's own tree free - trials keep this thread's tags
+    context = copy_context()
+    with ThreadPoolExecutor(max_workers=max(1, min(len(valid), pool.size - 1))) as executor:
+        trials = list(executor.map(lambda snippet: context.copy().run(_trial, pool, project, code_object, snippet,
+                                                                      og_failures), valid))
+    survivors = [snippet for snippet, failures in zip(valid, trials)
+                 if failures is not None and failures <= og_failures]
+    for failures in trials:
+        if failures is not None and not failures <= og_failures:
+            record_event('candidate', outcome='rejected', reason='tests')
+    print(f"{len(survivors)}/{len(valid)} distinct candidates kept the test suite passing")
+
+    if not survivors:
+        raise InvalidCandidate('tournament', f"none of {len(futures)} candidates passed the tests")
+    if len(survivors) == 1:
+        return survivors[0]
+
+    # time survivors one after another - parallel timings would contend for the CPU
+    timings = {snippet: _time_candidate(pool, project, code_object, snippet) for snippet in survivors}
+    for snippet, runtime in timings.items():
+        print(f"Candidate {prompt_id(snippet)} : best runtime {runtime}")
+    fastest = min(survivors, key=lambda snippet: timings[snippet])
+    for _ in range(len(survivors) - 1):
+        record_event('candidate', outcome='rejected', reason='slower')
+    return fastest
+
+def _trial(pool : WorktreePool, project : PyProj, code_object : dict, snippet : str,
+           og_failures : frozenset) -> frozenset | None:
+    # failing tests of the candidate applied on top of the project's accepted patches - stops at the first new one
+    with pool.lease() as tree:
+        pool.mirror(tree, project.root_dir)
+        if not MyPatch(code_object, snippet, tree).apply_patch():
+            record_event('candidate', outcome='rejected', reason='patch')
+            return None
+        try:
+            import_check(code_object, tree, venv_python(project.name), checkout_env(tree))
+            differential_check(project.name, code_object, project.src_dir, tree)
+        except InvalidCandidate as e:
+            print(f"Candidate rejected before testing: {e}")
+            record_event('candidate', outcome='rejected', reason=e.stage)
+            return None
+
+        with timed_stage('tests'):
+            failures, _, _ = get_pyprofile(project.name, 'candidate', testing_patch=True, repo_path=tree,
+                                           failfast=og_failures)
+        return failures
+
+def _time_candidate(pool : WorktreePool, project : PyProj, code_object : dict, snippet : str) -> float:
+    with pool.lease() as tree:
+        pool.mirror(tree, project.root_dir)
+        MyPatch(code_object, snippet, tree).apply_patch()
+        return _best_runtime(project.name, tree, TOURNAMENT_ROUNDS)
+
+def _best_runtime(proj_name : str, repo_path, rounds : int = ATTRIBUTION_ROUNDS) -> float:
+    runtimes = []
+    for _ in range(rounds):
+        with timed_stage('tests'), benchmark_lane():
+            _, runtime, _ = get_pyprofile(proj_name, 'candidate', testing_patch=True, repo_path=repo_path)
+        runtimes.append(runtime if runtime is not None else float('inf'))
+    return min(runtimes) # least disturbed run
+
+def _prefetch(gen : GenerationPool, optim, prompt, code_objects : list) -> dict:
+    # {snippet : (prompt, future)} - prompt may be a pending meta prompt
+    backend, request_fn = batch_backend(optim) if batch_enabled() else (None, None)
+    if backend is None:
+        queued = {}
+        for code_object in code_objects:
+            with tagged(snippet=code_object['code']):
+                queued[code_object['code']] = (prompt, gen.generate(optim, prompt, code_object['code'], prompt_scope(code_object)))
+        return queued
+
+    # batch mode - every first attempt for this (optimizer, prompt type) goes out as one job
+    batch = BatchQueue(optim, backend, request_fn, poll_interval=BATCH_POLL_SECONDS)
+    prompt = _resolve(prompt)
+    queued = {code_object['code'] : (prompt, batch.add(prompt, code_object['code'], prompt_scope(code_object)))
+              for code_object in code_objects}
+    batch.submit()
+    return queued
+
+def _resolve(prompt) -> str:
+    return prompt.result() if isinstance(prompt, Future) else prompt
+
 def _base_template(objective, proj_name, task, optim_name):
     p_name, p_desc, p_lang = (PROJECT_CONTEXTS[proj_name]['name'], 
                                 PROJECT_CONTEXTS[proj_name]['description'],
@@ -194,21 +615,31 @@ def _assemble_results(all_snippets : list,
                       proj_name : str, optim_name : str, 
                       prompt : str, prompt_type : str, 
                       all_attempts : list, runtimes : list,
-                      original_runtime : float) -> list:
+                      original_runtime : float, calls : list = None, 
+                      prompt_ids : list = None, func_speedups : dict = None,
+                      patch_speedups : dict = None, dropped : list = None) -> list:
 
     rows = []
     avg_runtime = sum(runtimes) / len(runtimes) if runtimes else 0
     
-    for (snippet_dict, attempts) in zip(all_snippets, all_attempts):
+    prompt_ids = prompt_ids or [prompt_id(prompt)] * len(all_snippets)
+    for (snippet_dict, attempts, snippet_prompt_id) in zip(all_snippets, all_attempts, prompt_ids):
         for original, edited in snippet_dict.items():
+            # llm vs test time, tokens & cost spent on this snippet
+            usage = summarize([call for call in calls if call.get('snippet') == original]) if calls is not None else {}
             rows.append({'original_snippet': original,
                          'edited_snippet': edited,
                          'project': proj_name,
                          'optimizer': optim_name,
                          'prompt': prompt,
+                         'prompt_id': snippet_prompt_id,
                          'prompt_type': prompt_type,
                          'failed_attempts': attempts,
                          'avg_runtime': avg_runtime,
-                         'original_runtime' : original_runtime})            
+                         'original_runtime' : original_runtime,
+                         'func_speedup': (func_speedups or {}).get(original),
+                         'patch_speedup': (patch_speedups or {}).get(original),
+                         'dropped': original in (dropped or ()),
+                         **usage})            
 
     return pd.DataFrame(rows)
\ No newline at end of file
@@ -1,3 +1,5 @@
-from pipeline.profiler.filter_profiles import get_pyprofile
+from pipeline.profiler.filter_profiles import get_pyprofile, venv_python, checkout_env, benchmark_lane, set_benchmark_lane
+from pipeline.profiler.harness import capture_inputs, function_speedup, differential_check
 
-__all__ = ['get_pyprofile']
\ No newline at end of file
+__all__ = ['get_pyprofile', 'venv_python', 'checkout_env', 'benchmark_lane', 'set_benchmark_lane',
+           'capture_inputs', 'function_speedup', 'differential_check']
\ No newline at end of file
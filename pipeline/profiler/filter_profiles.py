@@ -1,42 +1,117 @@
+from contextlib import contextmanager
 from pathlib import Path
 import xml.etree.ElementTree as ET
 
 import sys
 import subprocess
+import threading
+import hashlib
 import json
 import platform
+import os
 
 PROFILER_DIR = Path(__file__).parent
+PLUGINS_DIR = PROFILER_DIR / "plugins" # run inside the project venvs - standard library only
 
-# fixing venv should be refactored into different func
-def get_pyprofile(proj_name : str, revision_no = 0, testing_patch = False) -> float:
+# timed runs (baselines & benchmarks) take turns on the lane - and its cpus, where the OS can pin them
+_lane = threading.Lock()
+_lane_cpus = None
+
+def venv_python(proj_name : str) -> Path:
     if platform.system() == "Windows":
-        venv_python = PROFILER_DIR / "venvs" / f'venv_{proj_name}' / "Scripts" / "python.exe"
-    else:
-        venv_python = PROFILER_DIR / "venvs" / f'venv_{proj_name}' / "bin" / "python"
+        return PROFILER_DIR / "venvs" / f'venv_{proj_name}' / "Scripts" / "python.exe"
+    return PROFILER_DIR / "venvs" / f'venv_{proj_name}' / "bin" / "python"
+
+def run_id(proj_name : str, repo_path = None) -> str:
+    # leased worktrees get their own profile/report files so runs can overlap
+    default_repo = PROFILER_DIR / "projects" / proj_name
+    if repo_path is None or Path(repo_path).resolve() == default_repo.resolve():
+        return proj_name
+    # trees of different pools share index names - the path keeps their files apart
+    digest = hashlib.sha1(str(Path(repo_path).resolve()).encode('utf-8')).hexdigest()[:8]
+    return f"{proj_name}@{Path(repo_path).name}-{digest}"
+
+def set_benchmark_lane(lock, cpus : set = None) -> None:
+    # the process-wide lane - a multiprocessing lock to serialize timings across worker processes
+    global _lane, _lane_cpus
+    _lane, _lane_cpus = lock, cpus
+
+@contextmanager
+def benchmark_lane():
+    with _lane:
+        if not (_lane_cpus and hasattr(os, 'sched_setaffinity')):
+            yield
+            return
+
+        # subprocesses inherit the calling thread's affinity
+        previous = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, _lane_cpus)
+        try:
+            yield
+        finally:
+            os.sched_setaffinity(0, previous)
+
+def checkout_env(repo_path) -> dict:
+    # PYTHONPATH entries win over the .pth / finder hooks of an editable install
+    repo_path = Path(repo_path)
+    env = os.environ.copy()
 
-    output_file = PROFILER_DIR / "profiles" / f"{proj_name}_profile{revision_no}.speedscope"
+    src_paths = [str(repo_path.resolve())]
+    if (repo_path / "src").is_dir():
+        src_paths.append(str((repo_path / "src").resolve()))
+    if env.get("PYTHONPATH"):
+        src_paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(src_paths)
+    return env
 
-    repo_path = PROFILER_DIR / "projects" / proj_name 
-    report_file = PROFILER_DIR / "temp" / "report.xml"
+# fixing venv should be refactored into different func
+def get_pyprofile(proj_name : str, revision_no = 0, testing_patch = False, repo_path = None,
+                  capture : dict = None, failfast : frozenset = None) -> tuple:
+    # (ids of failing tests, suite time, completed process) - (None, None, process) if the suite errors.
+    # with failfast (the baseline's failing ids), the run stops at the first other failing test
+    venv_py = venv_python(proj_name)
+    run_name = run_id(proj_name, repo_path)
+
+    output_file = PROFILER_DIR / "profiles" / f"{run_name}_profile{revision_no}.speedscope"
+
+    repo_path = Path(repo_path) if repo_path else PROFILER_DIR / "projects" / proj_name
+    report_file = PROFILER_DIR / "temp" / ("report.xml" if run_name == proj_name else f"report_{run_name}.xml")
+    if capture is not None: # capture runs may overlap the timed runs on the same tree
+        report_file = report_file.with_name(f"report_capture_{run_name}.xml")
+
+    # the venv is shared between checkouts - leased trees go ahead of the editable install
+    env = checkout_env(repo_path) if run_name != proj_name else os.environ.copy()
     
-    # run py-spy with pytest
-    print("Running py-spy profiler...")
+    command = [str(venv_py), "-m", "pytest", 
+              str(repo_path), f"--tb={"short" if testing_patch else "no"}", 
+              f"--junit-xml={report_file}"]
+    specs = []
+    if failfast is not None:
+        env = _plugin_env(env, "MPCO_FAILFAST", {'allowed': sorted(failfast)}, specs)
+        command += ["-p", "mpco_failfast"]
+    if capture is not None:
+        # capture mode - record bottleneck inputs instead of a profile (the hook would skew it)
+        env = _plugin_env(env, "MPCO_MICROBENCH", capture, specs)
+        command += ["-p", "mpco_microbench"]
+    else:
+        # run py-spy with pytest
+        print("Running py-spy profiler...")
+        command = ["py-spy", "record",
+                  "-f", "speedscope",
+                  "--full-filenames",
+                  "-o", str(output_file),
+                  "--subprocesses",
+                  "--"] + command
     try:
-        profile_results = subprocess.run(["py-spy", "record",
-                                            "-f", "speedscope",
-                                            "--full-filenames",
-                                            "-o", str(output_file),
-                                            "--subprocesses",
-                                            "--",
-                                            str(venv_python), "-m", "pytest", 
-                                            str(repo_path), f"--tb={"short" if testing_patch else "no"}", 
-                                            f"--junit-xml={report_file}"],
-                                            capture_output=testing_patch,
-                                            cwd=PROFILER_DIR)
+        profile_results = subprocess.run(command,
+                                         capture_output=testing_patch,
+                                         cwd=PROFILER_DIR,
+                                         env=env)
 
     except KeyboardInterrupt:
         print("Tests halted - speedscope saved")
+    finally:
+        [spec.unlink(missing_ok=True) for spec in specs]
     
     root = ET.parse(report_file).getroot()
     report = root if root.tag == 'testsuite' else root.find('testsuite')
@@ -46,24 +121,43 @@ def get_pyprofile(proj_name : str, revision_no = 0, testing_patch = False) -> fl
         print(f"Error: Test suite encountered {errors} errors")
         return None, None, profile_results
     
-    failure_count = int(report.get('failures', 0))
+    failures = failing_tests(root)
     duration = float(report.get('time', 0.0))
     
     # finally generate filtered speedscope
-    _filter_speedscope(proj_name, revision_no)
+    if capture is None:
+        _filter_speedscope(proj_name, revision_no, repo_path, run_name)
+
+    return failures, duration, profile_results
+
+def failing_tests(report_root) -> frozenset:
+    # classname::name of every failed test in a JUnit report - compared as sets, a fixed test can't hide a broken one
+    return frozenset(f"{case.get('classname')}::{case.get('name')}" for case in report_root.iter('testcase')
+                     if case.find('failure') is not None)
 
-    return failure_count, duration, profile_results
+def _plugin_env(env : dict, variable : str, spec : dict, specs : list) -> dict:
+    # plugins read their spec from a file named in the env - specs collects the files to remove afterwards
+    env = dict(env)
+    if str(PLUGINS_DIR) not in env.get("PYTHONPATH", "").split(os.pathsep):
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PLUGINS_DIR), env.get("PYTHONPATH")]))
+    path = PROFILER_DIR / "temp" / f"{variable.lower()}_{os.getpid()}_{threading.get_ident()}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f)
+    env[variable] = str(path)
+    specs.append(path)
+    return env
 
 # probably merge into get_pyprofile
-def _filter_speedscope(proj_name : str, revision_no = 0):
+def _filter_speedscope(proj_name : str, revision_no = 0, project_path = None, run_name = None):
     """
     Filter speedscope profile to keep only functions from a given project.
     Removes external library calls and import statements.
     """
     profiler_dir = Path(__file__).parent
-    input_file = profiler_dir / "profiles" / f"{proj_name}_profile{revision_no}.speedscope"
-    output_file = profiler_dir / "profiles" / f"{proj_name}_filtered{revision_no}.speedscope"
-    project_path = profiler_dir / "projects" / proj_name
+    run_name = run_name or proj_name
+    input_file = profiler_dir / "profiles" / f"{run_name}_profile{revision_no}.speedscope"
+    output_file = profiler_dir / "profiles" / f"{run_name}_filtered{revision_no}.speedscope"
+    project_path = Path(project_path) if project_path else profiler_dir / "projects" / proj_name
     
     project_abs = str(project_path.resolve()).replace('\\', '/')
         
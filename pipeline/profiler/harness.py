@@ -0,0 +1,125 @@
+from pathlib import Path
+from textwrap import dedent
+import subprocess
+import tempfile
+import hashlib
+import json
+import ast
+import os
+
+from pipeline.profiler.filter_profiles import (PROFILER_DIR, PLUGINS_DIR, get_pyprofile, venv_python, checkout_env,
+                                               benchmark_lane)
+from pipeline.components.validation import InvalidCandidate, module_name
+from constants import CAPTURE_SAMPLES, MICROBENCH_REPEAT, DIFF_TOLERANCE, DIFF_TIMEOUT
+
+CAPTURES_DIR = PROFILER_DIR / "captures" # corpus of recorded calls - one gzipped pickle per project & bottleneck
+
+def bench_target(code_object : dict) -> dict | None:
+    # {key, module, qualname} of a bottleneck - None where it can't be imported by name (nested defs, scripts)
+    module = module_name(code_object['rel_path'])
+    if module is None or any(scope['type'] != 'class' for scope in code_object['scope']):
+        return None
+
+    try:
+        tree = ast.parse(dedent(code_object['code']))
+    except SyntaxError:
+        return None
+    defs = [node for node in tree.body if isinstance(node, ast.FunctionDef)]
+    if not defs or any(isinstance(node, (ast.Yield, ast.YieldFrom)) for node in ast.walk(defs[0])):
+        return None # classes, async defs & generators (resumes look like calls to the hook) aren't captured
+
+    qualname = '.'.join([scope['name'] for scope in code_object['scope']] + [defs[0].name])
+    key = hashlib.sha1(f"{Path(code_object['rel_path']).as_posix()}\n{code_object['code']}".encode('utf-8'))
+    return {'key': key.hexdigest()[:16], 'module': module, 'qualname': qualname}
+
+def corpus_path(proj_name : str, code_object : dict) -> Path | None:
+    # where the bottleneck's recorded calls live - None if it can't be captured at all
+    target = bench_target(code_object)
+    return CAPTURES_DIR / proj_name / f"{target['key']}.pkl.gz" if target else None
+
+def capture_inputs(proj_name : str, code_objects : list, repo_path = None, size : int = CAPTURE_SAMPLES) -> dict:
+    # one suite run samples the calls of every bottleneck not captured yet - {key : corpus path}
+    out = CAPTURES_DIR / proj_name
+    targets = [target for target in map(bench_target, code_objects) if target is not None]
+    missing = [target for target in targets if not (out / f"{target['key']}.pkl.gz").exists()]
+
+    if missing:
+        print(f"Capturing inputs of {len(missing)} functions...")
+        get_pyprofile(proj_name, 'capture', testing_patch=True, repo_path=repo_path,
+                      capture={'targets': missing, 'out': str(out), 'size': size})
+
+    return {target['key'] : out / f"{target['key']}.pkl.gz" for target in targets
+            if (out / f"{target['key']}.pkl.gz").exists()}
+
+def time_function(proj_name : str, code_object : dict, repo_path, inputs,
+                  repeat : int = MICROBENCH_REPEAT, timeout : int = 600) -> float | None:
+    # summed best-of-repeat time of the recorded calls, against the function as defined in repo_path
+    target = bench_target(code_object)
+    if target is None:
+        return None
+
+    try:
+        timing = _replay(proj_name, repo_path, {**target, 'mode': 'time', 'inputs': str(inputs), 'repeat': repeat},
+                         timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    return timing['seconds'] if timing and timing['calls'] else None
+
+def function_speedup(proj_name : str, code_object : dict, original_root, optimized_root,
+                     repeat : int = MICROBENCH_REPEAT) -> float | None:
+    # original / optimized time of one function on its captured inputs - None without usable captures
+    inputs = corpus_path(proj_name, code_object)
+    if inputs is None or not inputs.exists():
+        return None
+
+    with benchmark_lane():
+        original = time_function(proj_name, code_object, original_root, inputs, repeat)
+        optimized = time_function(proj_name, code_object, optimized_root, inputs, repeat)
+    if not original or not optimized:
+        return None
+    return original / optimized
+
+def differential_check(proj_name : str, code_object : dict, original_root, candidate_root,
+                       tolerance : dict = DIFF_TOLERANCE, timeout : int = DIFF_TIMEOUT) -> int:
+    # replays the corpus through the applied candidate - raises InvalidCandidate on the first call
+    # whose outcome differs from the original's, returns the number of calls compared
+    inputs = corpus_path(proj_name, code_object)
+    if inputs is None or not inputs.exists():
+        return 0
+
+    target = bench_target(code_object)
+    spec = {**target, 'inputs': str(inputs), 'expected': str(inputs.with_name(f"{target['key']}.expected.pkl.gz")),
+            'rel': tolerance['rel'], 'tol': tolerance['abs']}
+    if not Path(spec['expected']).exists(): # the original's outcomes only need computing once
+        try:
+            _replay(proj_name, original_root, {**spec, 'mode': 'expect'}, timeout * 2)
+        except subprocess.TimeoutExpired:
+            return 0
+        if not Path(spec['expected']).exists():
+            return 0
+
+    try:
+        result = _replay(proj_name, candidate_root, {**spec, 'mode': 'diff'}, timeout)
+    except subprocess.TimeoutExpired:
+        raise InvalidCandidate('differential', f"replaying recorded calls timed out after {timeout}s")
+    if result is None: # couldn't run at all - the import check & tests judge it
+        return 0
+
+    if result['mismatch'] is not None:
+        raise InvalidCandidate('differential', f"differs from the original on {result['mismatch']}")
+    return result['checked']
+
+def _replay(proj_name : str, repo_path, spec : dict, timeout : int) -> dict | None:
+    # runs the plugin as a script in the project venv against repo_path - None if it fails
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(spec, f)
+    try:
+        result = subprocess.run([str(venv_python(proj_name)), str(PLUGINS_DIR / "mpco_microbench.py"), f.name],
+                                capture_output=True, text=True, cwd=repo_path, env=checkout_env(repo_path),
+                                timeout=timeout)
+    finally:
+        os.unlink(f.name)
+
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
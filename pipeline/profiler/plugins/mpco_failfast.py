@@ -0,0 +1,44 @@
+"""
+Runs inside a project's venv - standard library only.
+
+pytest plugin (-p mpco_failfast) stopping the run at the first failing test
+that isn't among the baseline's failures, named in the MPCO_FAILFAST spec
+file. Tests are identified as in the JUnit report - classname::name - so
+the ids match the ones read back from it.
+"""
+import json
+import re
+import os
+
+_allowed = None
+_session = None
+
+
+def junit_id(nodeid):
+    # tests/test_mod.py::TestCls::test_x[1] -> tests.test_mod.TestCls::test_x[1], as pytest's junitxml names it
+    path, bracket, params = nodeid.partition('[')
+    names = path.split('::')
+    names[0] = re.sub(r'\.py$', '', names[0].replace('/', '.'))
+    names[-1] += bracket + params
+    return '.'.join(names[:-1]) + '::' + names[-1]
+
+
+def pytest_configure(config):
+    global _allowed
+    path = os.environ.get('MPCO_FAILFAST')
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            _allowed = set(json.load(f)['allowed'])
+
+
+def pytest_sessionstart(session):
+    global _session
+    _session = session
+
+
+def pytest_runtest_logreport(report):
+    if _allowed is None or _session is None or not report.failed:
+        return
+    test_id = junit_id(report.nodeid)
+    if test_id not in _allowed:
+        _session.shouldfail = 'new failure: %s' % test_id  # checked between tests, like -x
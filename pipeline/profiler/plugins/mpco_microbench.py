@@ -0,0 +1,308 @@
+"""
+Runs inside a project's venv - standard library only.
+
+As a pytest plugin (-p mpco_microbench, configured by the MPCO_MICROBENCH
+spec file) it keeps a reservoir sample of the pickled arguments & return
+values of each target function's calls during the test run, written as one
+gzipped corpus file per function. As a script it replays a corpus through
+a target, by the spec's mode:
+
+    time    summed best-of-repeat call time
+    expect  outcomes of the calls that reproduce (run in the original tree)
+    diff    first call whose outcome differs from the expected one
+"""
+import importlib
+import inspect
+import pickle
+import random
+import reprlib
+import cmath
+import gzip
+import json
+import sys
+import os
+import time
+import threading
+
+CO_VARARGS, CO_VARKEYWORDS = 0x04, 0x08
+
+
+def resolve(module, qualname):
+    # the plain function behind module.Class.method - None for properties & other descriptors
+    target = importlib.import_module(module)
+    for part in qualname.split('.'):
+        target = inspect.getattr_static(target, part)
+    if isinstance(target, (staticmethod, classmethod)):
+        target = target.__func__
+    return target if inspect.isfunction(target) else None
+
+
+def call_arguments(frame):
+    # (args, kwargs) a function was called with, read from its frame on entry
+    code, values = frame.f_code, frame.f_locals
+    names = code.co_varnames
+    positional = code.co_argcount
+    keyword_only = code.co_kwonlyargcount
+
+    args = [values[name] for name in names[:positional]]
+    kwargs = {name: values[name] for name in names[positional:positional + keyword_only]}
+    index = positional + keyword_only
+    if code.co_flags & CO_VARARGS:
+        args.extend(values[names[index]])
+        index += 1
+    if code.co_flags & CO_VARKEYWORDS:
+        kwargs.update(values[names[index]])
+    return tuple(args), kwargs
+
+
+def load_corpus(path):
+    # {'module', 'qualname', 'calls' seen, 'samples' : [[pickled (args, kwargs), pickled return value]]}
+    with gzip.open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+class Recorder:
+    def __init__(self, spec):
+        self.size = spec['size']
+        self.out = spec['out']
+        self.targets = {}  # code object : target
+        self.corpora = {}  # key : corpus
+        self.pending = {}  # frame of a sampled call : its sample, until it returns
+        self.random = random.Random(0)
+        for target in spec['targets']:
+            # unresolved targets still get an (empty) corpus - it marks them as captured
+            self.corpora[target['key']] = {'module': target['module'], 'qualname': target['qualname'],
+                                           'calls': 0, 'samples': []}
+            try:
+                function = resolve(target['module'], target['qualname'])
+            except Exception:
+                continue
+            if function is not None:
+                self.targets[inspect.unwrap(function).__code__] = target
+
+    def profile(self, frame, event, arg):
+        if frame.f_code not in self.targets:
+            return
+        if event == 'return':
+            sample = self.pending.pop(frame, None)
+            if sample is not None:
+                try:  # None where the call raised - the profile hook can't tell the two apart
+                    sample[1] = pickle.dumps(arg, pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    pass
+            return
+        if event != 'call':
+            return
+
+        # reservoir sampling - every call so far is equally likely to be kept
+        corpus = self.corpora[self.targets[frame.f_code]['key']]
+        corpus['calls'] += 1
+        samples = corpus['samples']
+        slot = len(samples) if len(samples) < self.size else self.random.randrange(corpus['calls'])
+        if slot >= self.size:
+            return
+        try:  # pickled on entry - later mutation of the arguments doesn't leak in
+            sample = [pickle.dumps(call_arguments(frame), pickle.HIGHEST_PROTOCOL), None]
+        except Exception:
+            return  # unpicklable arguments can't be replayed
+        if slot == len(samples):
+            samples.append(sample)
+        else:
+            samples[slot] = sample
+        self.pending[frame] = sample
+
+    def start(self):
+        if self.targets:
+            threading.setprofile(self.profile)
+            sys.setprofile(self.profile)
+
+    def stop(self):
+        sys.setprofile(None)
+        threading.setprofile(None)
+        self.pending.clear()
+        os.makedirs(self.out, exist_ok=True)
+        for key, corpus in self.corpora.items():
+            path = os.path.join(self.out, key + '.pkl.gz')
+            with gzip.open('%s.%d.tmp' % (path, os.getpid()), 'wb') as f:
+                pickle.dump(corpus, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(f.name, path)  # concurrent jobs may capture the same project
+
+
+_recorder = None
+
+
+def pytest_configure(config):
+    global _recorder
+    path = os.environ.get('MPCO_MICROBENCH')
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            _recorder = Recorder(json.load(f))
+
+
+def pytest_sessionstart(session):
+    if _recorder is not None:
+        _recorder.start()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _recorder is not None:
+        _recorder.stop()
+
+
+def outcome(function, blob):
+    # what one call did - its return value & arguments afterwards (in-place edits count), or what it raised
+    args, kwargs = pickle.loads(blob)
+    try:
+        return {'returned': function(*args, **kwargs), 'args': args, 'kwargs': kwargs}
+    except Exception as e:
+        return {'raised': type(e).__module__ + '.' + type(e).__qualname__}
+
+
+def equivalent(expected, actual, rel=1e-6, tol=1e-9):
+    return difference(expected, actual, rel, tol) is None
+
+
+def difference(expected, actual, rel=1e-6, tol=1e-9, path='', _seen=None):
+    # where two values first differ - None if equal up to rel / tol for floats & NumPy arrays.
+    # attributes an object has only in actual (e.g. an added cache) are ignored
+    if expected is actual:
+        return None
+    _seen = set() if _seen is None else _seen
+    if (id(expected), id(actual)) in _seen:
+        return None  # cycle - judged where it started
+    _seen.add((id(expected), id(actual)))
+    differs = '%s: expected %s, got %s' % (path or 'value', reprlib.repr(expected), reprlib.repr(actual))
+
+    if _is_numpy(expected) or _is_numpy(actual):
+        numpy = sys.modules['numpy']
+        a, b = numpy.asarray(expected), numpy.asarray(actual)
+        if a.shape != b.shape:
+            return '%s: expected shape %s, got %s' % (path or 'value', a.shape, b.shape)
+        if a.dtype.kind == 'O' or b.dtype.kind == 'O':
+            return difference(a.tolist(), b.tolist(), rel, tol, path, _seen)
+        try:
+            if a.dtype.kind in 'fc' or b.dtype.kind in 'fc':
+                return None if numpy.allclose(a, b, rtol=rel, atol=tol, equal_nan=True) else differs
+            return None if numpy.array_equal(a, b) else differs
+        except TypeError:
+            return differs
+
+    if _inexact(expected, actual):
+        if cmath.isnan(expected) or cmath.isnan(actual):
+            return None if cmath.isnan(expected) and cmath.isnan(actual) else differs
+        return None if cmath.isclose(expected, actual, rel_tol=rel, abs_tol=tol) else differs
+
+    if type(expected) is not type(actual):
+        return '%s: expected %s, got %s' % (path or 'value', type(expected).__name__, type(actual).__name__)
+    if isinstance(expected, dict):
+        if expected.keys() != actual.keys():
+            return '%s: expected keys %s, got %s' % (path or 'value', reprlib.repr(set(expected)),
+                                                    reprlib.repr(set(actual)))
+        items = [('%s[%r]' % (path, key), expected[key], actual[key]) for key in expected]
+    elif isinstance(expected, (list, tuple)):
+        if len(expected) != len(actual):
+            return '%s: expected length %d, got %d' % (path or 'value', len(expected), len(actual))
+        items = [('%s[%d]' % (path, index), a, b) for index, (a, b) in enumerate(zip(expected, actual))]
+    elif isinstance(expected, (str, bytes, int, frozenset, set)) or expected is None:
+        return None if expected == actual else differs
+    elif type(expected).__eq__ is object.__eq__:  # no equality of its own - compare state
+        state, other = getattr(expected, '__dict__', None), getattr(actual, '__dict__', {})
+        if state is None:
+            return differs
+        missing = [key for key in state if key not in other]
+        if missing:
+            return '%s: missing attribute %s' % (path or 'value', missing[0])
+        items = [('%s.%s' % (path, key), value, other[key]) for key, value in state.items()]
+    else:
+        try:
+            return None if bool(expected == actual) else differs
+        except Exception:  # e.g. elementwise == of dataframes
+            equals = getattr(expected, 'equals', None)
+            return None if equals and bool(equals(actual)) else differs
+
+    for item_path, a, b in items:
+        found = difference(a, b, rel, tol, item_path, _seen)
+        if found is not None:
+            return found
+    return None
+
+
+def _is_numpy(value):
+    return type(value).__module__.split('.')[0] == 'numpy' and hasattr(value, 'dtype')
+
+
+def _inexact(*values):
+    # numbers, at least one a float / complex - ints & bools compare exactly
+    numbers = [value for value in values if isinstance(value, (int, float, complex)) and not isinstance(value, bool)]
+    return len(numbers) == len(values) and any(isinstance(value, (float, complex)) for value in values)
+
+
+def expect(spec):
+    # outcomes of the original - only calls that reproduce (twice, and as recorded) are worth comparing
+    function = resolve(spec['module'], spec['qualname'])
+    corpus = load_corpus(spec['inputs'])
+
+    outcomes = {}
+    for index, (blob, recorded) in enumerate(corpus['samples']):
+        first, second = outcome(function, blob), outcome(function, blob)
+        if not equivalent(first, second, spec['rel'], spec['tol']):
+            continue
+        if recorded is not None and 'returned' in first:
+            try:
+                if not equivalent(pickle.loads(recorded), first['returned'], spec['rel'], spec['tol']):
+                    continue
+            except Exception:
+                continue
+        try:
+            outcomes[index] = pickle.dumps(first, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            continue
+
+    with gzip.open('%s.%d.tmp' % (spec['expected'], os.getpid()), 'wb') as f:
+        pickle.dump(outcomes, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, spec['expected'])
+    return {'stable': len(outcomes), 'calls': len(corpus['samples'])}
+
+
+def diff(spec):
+    function = resolve(spec['module'], spec['qualname'])
+    corpus = load_corpus(spec['inputs'])
+    with gzip.open(spec['expected'], 'rb') as f:
+        outcomes = pickle.load(f)
+
+    for index, expected in sorted(outcomes.items()):
+        expected, actual = pickle.loads(expected), outcome(function, corpus['samples'][index][0])
+        found = difference(expected, actual, spec['rel'], spec['tol'], 'call %d' % index)
+        if found is not None:
+            return {'checked': index + 1, 'mismatch': found}
+    return {'checked': len(outcomes), 'mismatch': None}
+
+
+def replay(spec):
+    function = resolve(spec['module'], spec['qualname'])
+    corpus = load_corpus(spec['inputs'])
+
+    total, calls = 0.0, 0
+    for blob, _ in corpus['samples']:
+        best = None
+        for _ in range(spec['repeat']):
+            args, kwargs = pickle.loads(blob)  # fresh copy per call, outside the timed region
+            start = time.perf_counter()
+            try:
+                function(*args, **kwargs)
+            except Exception:
+                pass  # a raising call is timed like any other
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if best is not None:
+            total += best
+            calls += 1
+    return {'seconds': total, 'calls': calls}
+
+
+MODES = {'time': replay, 'expect': expect, 'diff': diff}
+
+if __name__ == '__main__':
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    print(json.dumps(MODES[spec.get('mode', 'time')](spec)))
@@ -0,0 +1,114 @@
+from pathlib import Path
+import threading
+import hashlib
+import json
+import time
+import os
+
+STORE_VERSION = 1
+
+class MetaPromptStore:
+    """
+    Persistent pools of meta prompts, one per (project, task, target model,
+    metaprompter) and context version - editing a context or the MP template
+    starts a fresh pool. A pool grows to `pool_size` prompts; on failure the
+    pool rotates to its next prompt instead of regenerating, and only prompts
+    that failed `max_failures` times are retired and replaced.
+    """
+    def __init__(self, path, pool_size : int = 3, max_failures : int = 5):
+        self.path = Path(path)
+        self.pool_size = pool_size
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._data = self._load()
+        self._touched = set() # pools this instance changed - the rest may belong to other processes
+
+    def get_prompt(self, metaprompter, objective : str, project : str, task : str, model : str) -> str:
+        key = self.key(metaprompter, objective, project, task, model)
+        prompt = self._current(key)
+        if prompt is None:
+            prompt = self._add(key, metaprompter.get_prompt(objective, project, task, model))
+        return prompt
+
+    async def aget_prompt(self, metaprompter, objective : str, project : str, task : str, model : str) -> str:
+        key = self.key(metaprompter, objective, project, task, model)
+        prompt = self._current(key)
+        if prompt is None:
+            prompt = self._add(key, await metaprompter.aget_prompt(objective, project, task, model))
+        return prompt
+
+    def rotate(self, metaprompter, objective : str, project : str, task : str, model : str, failed : str) -> str:
+        # the failed prompt is charged; a new one is only generated while the pool is short
+        key = self.key(metaprompter, objective, project, task, model)
+        with self._lock:
+            pool = self._pool(key)
+            self._touched.add(key)
+            for entry in pool['prompts']:
+                if entry['text'] == failed:
+                    entry['failures'] += 1
+            pool['prompts'] = [entry for entry in pool['prompts'] if entry['failures'] < self.max_failures]
+
+            if len(pool['prompts']) >= self.pool_size:
+                texts = [entry['text'] for entry in pool['prompts']]
+                pool['cursor'] = (texts.index(failed) + 1 if failed in texts else pool['cursor']) % len(texts)
+                self._save()
+                return texts[pool['cursor']]
+            self._save()
+
+        return self._add(key, metaprompter.get_prompt(objective, project, task, model))
+
+    def key(self, metaprompter, objective : str, project : str, task : str, model : str) -> str:
+        # the rendered template stands in for every context the meta prompt depends on
+        version = hashlib.sha256(metaprompter._template(objective, project, task, model).encode('utf-8')).hexdigest()[:12]
+        return f"{project}|{task}|{model}|{getattr(metaprompter, 'model_id', type(metaprompter).__name__)}|{version}"
+
+    def pool(self, key : str) -> list:
+        with self._lock:
+            return [dict(entry) for entry in self._pool(key)['prompts']]
+
+    def _current(self, key : str) -> str | None:
+        with self._lock:
+            pool = self._pool(key)
+            if not pool['prompts']:
+                return None
+            return pool['prompts'][pool['cursor'] % len(pool['prompts'])]['text']
+
+    def _add(self, key : str, text : str) -> str:
+        with self._lock:
+            pool = self._pool(key)
+            self._touched.add(key)
+            texts = [entry['text'] for entry in pool['prompts']]
+            if text not in texts:
+                pool['prompts'].append({'id': prompt_id(text), 'text': text, 'created': time.time(), 'failures': 0})
+                texts.append(text)
+            pool['cursor'] = texts.index(text)
+            self._save()
+        return text
+
+    def _pool(self, key : str) -> dict:
+        return self._data['pools'].setdefault(key, {'cursor': 0, 'prompts': []})
+
+    def _load(self) -> dict:
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == STORE_VERSION:
+                return data
+        return {'version': STORE_VERSION, 'pools': {}}
+
+    def _save(self) -> None:
+        # grid jobs share the file - pick up their pools before writing ours back
+        pools = self._load()['pools']
+        pools.update({key: self._data['pools'][key] for key in self._touched})
+        self._data['pools'] = pools
+
+        # write-then-rename so an interrupted run never leaves a truncated store
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(f"{self.path.suffix}.{os.getpid()}.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2)
+        os.replace(temp_path, self.path)
+
+def prompt_id(text : str) -> str:
+    # stable identity for any prompt (meta or not) in the results dataset
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
@@ -0,0 +1,162 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pipeline.metrics import observe
+from pathlib import Path
+import threading
+import time
+import csv
+
+# tags (project, optimizer, prompt_type, stage, snippet) tying each call to its results row
+_tags = ContextVar('llm_call_tags', default={})
+_timer = ContextVar('llm_call_timer', default=None)
+
+_records = [] # dropped once written by export_calls
+_exported = 0 # records dropped so far - export offsets count from the start of the run
+_jobs = {} # (project, optimizer, prompt_type) : its records, until the job takes them (job_records)
+_lock = threading.Lock()
+
+FIELDS = ['timestamp', 'stage', 'project', 'optimizer', 'prompt_type', 'provider', 'model',
+          'latency', 'ttft', 'input_tokens', 'output_tokens', 'cached_tokens', 'cache_write_tokens',
+          'cost', 'snippet']
+
+@contextmanager
+def tagged(**tags):
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+def current_tags() -> dict:
+    return dict(_tags.get())
+
+@contextmanager
+def timed_call():
+    # wraps the provider call itself - scheduler waits & retries aren't counted as latency
+    timer = {'started': time.perf_counter(), 'first_token': None}
+    token = _timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _timer.reset(token)
+
+def mark_first_token() -> None:
+    timer = _timer.get()
+    if timer is not None and timer['first_token'] is None:
+        timer['first_token'] = time.perf_counter()
+
+def record(usage : dict, provider : str, model : str, prices : dict = None) -> dict:
+    # called as the response lands - non-streamed responses arrive all at once, so ttft == latency
+    now = time.perf_counter()
+    timer = _timer.get()
+    latency = now - timer['started'] if timer else None
+    ttft = (timer['first_token'] or now) - timer['started'] if timer else None
+
+    entry = {'timestamp': time.time(), 'stage': 'generate', **current_tags(), **usage,
+             'provider': provider, 'model': model, 'latency': latency, 'ttft': ttft,
+             'cost': cost(usage, prices) if prices else None}
+    _append([entry])
+    observe(entry)
+    return entry
+
+def record_stage(stage : str, seconds : float) -> None:
+    # non-LLM work (e.g. test runs) on the same timeline for comparison
+    entry = {'timestamp': time.time(), **current_tags(), 'stage': stage, 'latency': seconds}
+    _append([entry])
+    observe(entry)
+
+def record_event(event : str, **fields) -> None:
+    # pipeline progress (e.g. a rejected candidate) for the metrics - not exported with the calls
+    entry = {'timestamp': time.time(), **current_tags(), 'stage': event, 'event': event, **fields}
+    _append([entry])
+    observe(entry)
+
+@contextmanager
+def timed_stage(stage : str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+def add_records(entries : list, observed : bool = False) -> None:
+    # calls made in another process (e.g. a grid job), merged into this process's log
+    # observed - already counted in the metrics as they happened (pipeline.metrics.relay)
+    _append(entries, index=False) # summarized into rows in the process that ran the job
+    if not observed:
+        for entry in entries:
+            observe(entry)
+
+def records(**match) -> list:
+    # records not exported yet
+    with _lock:
+        return [entry for entry in _records if all(entry.get(k) == v for k, v in match.items())]
+
+def job_records(project : str, optimizer : str, prompt_type : str) -> list:
+    # every record of a (project, optimizer, prompt type) job, exported or not - handed out once
+    with _lock:
+        return _jobs.pop((project, optimizer, prompt_type), [])
+
+def take_records() -> list:
+    # every record not exported yet, dropped from the log - e.g. to send a job's back to the parent process
+    global _exported
+    with _lock:
+        taken = _records[:]
+        _records.clear()
+        _jobs.clear()
+        _exported += len(taken)
+    return taken
+
+def _append(entries : list, index : bool = True) -> None:
+    with _lock:
+        _records.extend(entries)
+        if not index:
+            return
+        for entry in entries:
+            job = (entry.get('project'), entry.get('optimizer'), entry.get('prompt_type'))
+            if None not in job:
+                _jobs.setdefault(job, []).append(entry)
+
+def cost(usage : dict, prices : dict) -> float:
+    # prices are USD per million tokens - cached reads & cache writes are billed at their own rates
+    uncached = usage['input_tokens'] - usage['cached_tokens'] - usage.get('cache_write_tokens', 0)
+    return (uncached * prices['input']
+            + usage['cached_tokens'] * prices.get('cached', prices['input'])
+            + usage.get('cache_write_tokens', 0) * prices.get('cache_write', prices['input'])
+            + usage['output_tokens'] * prices['output']) / 1_000_000
+
+def summarize(calls : list) -> dict:
+    # per results row - llm time vs test time shows which one the pipeline is waiting on
+    llm = [call for call in calls if 'provider' in call]
+    ttfts = [call['ttft'] for call in llm if call.get('ttft') is not None]
+    return {'llm_calls': len(llm),
+            'llm_seconds': sum(call.get('latency') or 0 for call in llm),
+            'llm_ttft': sum(ttfts) / len(ttfts) if ttfts else None,
+            'input_tokens': sum(call.get('input_tokens', 0) for call in llm),
+            'output_tokens': sum(call.get('output_tokens', 0) for call in llm),
+            'cached_tokens': sum(call.get('cached_tokens', 0) for call in llm),
+            'llm_cost': sum(call.get('cost') or 0 for call in llm),
+            'test_seconds': sum(call.get('latency') or 0 for call in calls if call.get('stage') == 'tests')}
+
+def export_calls(path, since : int = 0) -> int:
+    # appends every record from `since` on - returns the new offset. written records are dropped,
+    # so the log doesn't grow over a multi-day sweep
+    global _exported
+    with _lock:
+        rows = [entry for entry in _records[max(since - _exported, 0):] if 'event' not in entry]
+        offset = _exported + len(_records)
+
+    if rows:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = not path.exists()
+        with open(path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+            if header:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    with _lock: # records made while writing stay for the next export
+        del _records[:offset - _exported]
+        _exported = offset
+    return offset
@@ -0,0 +1,283 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import multiprocessing
+import threading
+import platform
+import sqlite3
+import json
+import time
+import os
+
+import pandas as pd
+
+from pipeline.grid import _grid_job, _init_worker, _split_cpus, _job_name
+from pipeline.pipeline import _baseline, PROMPT_TYPES, PyProj
+from pipeline.journal import Journal
+from pipeline.profiler.filter_profiles import set_benchmark_lane
+from pipeline.components.worktrees import snapshot
+from pipeline.telemetry import add_records
+from pipeline.metrics import set_jobs, relay
+from constants import *
+
+class WorkQueue:
+    """
+    SQLite-backed queue of (project, optimizer, prompt type) jobs shared by a
+    coordinator and any number of workers - e.g. on a network filesystem.
+
+    Workers claim a pending job under a lease they keep renewing while it runs;
+    a job whose lease ran out (its worker died) is handed to the next worker
+    that asks. Finished jobs push their result rows & llm call records back,
+    and the coordinator collects them. Failed jobs - and jobs whose lease ran
+    out - are retried up to max_attempts times.
+    """
+    def __init__(self, path, lease_seconds : float = QUEUE_LEASE_SECONDS, max_attempts : int = QUEUE_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # autocommit - transactions that need to be atomic across processes begin explicitly
+        self._conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                id INTEGER PRIMARY KEY, project TEXT NOT NULL, optimizer TEXT NOT NULL,
+                                prompt_type TEXT NOT NULL, state TEXT NOT NULL, worker TEXT,
+                                leased_until REAL, attempts INTEGER NOT NULL, error TEXT, updated REAL NOT NULL,
+                                UNIQUE (project, optimizer, prompt_type))""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                                job_id INTEGER PRIMARY KEY, rows TEXT NOT NULL, calls TEXT NOT NULL)""")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._lock = threading.Lock()
+
+    def enqueue(self, project : str, optimizer : str, prompt_type : str) -> None:
+        # jobs failed or finished & collected in an earlier sweep are queued again - others are left as they are
+        with self._lock:
+            self._conn.execute("""INSERT INTO jobs (project, optimizer, prompt_type, state, attempts, updated)
+                                  VALUES (?, ?, ?, 'pending', 0, ?)
+                                  ON CONFLICT (project, optimizer, prompt_type) DO UPDATE
+                                  SET state = 'pending', worker = NULL, attempts = 0, error = NULL
+                                  WHERE jobs.state = 'failed' OR (jobs.state = 'done' AND NOT EXISTS
+                                        (SELECT 1 FROM results WHERE results.job_id = jobs.id))""",
+                               (project, optimizer, prompt_type, time.time()))
+
+    def seal(self, sealed : bool = True) -> None:
+        # sealed - every job of the sweep is queued, so idle workers can stop once it drains
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('sealed', ?)", (json.dumps(sealed),))
+
+    def claim(self, worker : str, optimizers : list = None, skip : set = None) -> dict | None:
+        # the oldest pending job (or one whose worker's lease ran out) this worker can run - none of the
+        # projects in skip (e.g. whose suite errors on this worker)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # one claimer at a time across processes
+            try:
+                # a job whose worker died on every attempt isn't handed out again
+                self._conn.execute("""UPDATE jobs SET state = 'failed', worker = NULL, error = ?, updated = ?
+                                      WHERE state = 'running' AND leased_until < ? AND attempts >= ?""",
+                                   ("lease expired - worker lost on every attempt", now, now, self.max_attempts))
+                for row in self._conn.execute("""SELECT id, project, optimizer, prompt_type, attempts FROM jobs
+                                                 WHERE state = 'pending' OR (state = 'running' AND leased_until < ?)
+                                                 ORDER BY id""", (now,)).fetchall():
+                    if (optimizers is None or row[2] in optimizers) and row[1] not in (skip or ()):
+                        self._conn.execute("""UPDATE jobs SET state = 'running', worker = ?, leased_until = ?,
+                                              attempts = attempts + 1, updated = ? WHERE id = ?""",
+                                           (worker, now + self.lease_seconds, now, row[0]))
+                        self._conn.execute("COMMIT")
+                        return {'id': row[0], 'project': row[1], 'optimizer': row[2], 'prompt_type': row[3],
+                                'attempt': row[4] + 1}
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def heartbeat(self, job_ids : list, worker : str) -> None:
+        with self._lock:
+            for job_id in job_ids:
+                self._conn.execute("""UPDATE jobs SET leased_until = ? WHERE id = ? AND worker = ?
+                                      AND state = 'running'""", (time.time() + self.lease_seconds, job_id, worker))
+
+    def complete(self, job_id : int, worker : str, results : pd.DataFrame, calls : list) -> bool:
+        # False if the job was already finished - e.g. by another worker after this one's lease ran out
+        rows = json.dumps(results.to_dict('records'), default=str)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._conn.execute("""UPDATE jobs SET state = 'done', worker = ?, updated = ?
+                                                WHERE id = ? AND state = 'running'""",
+                                             (worker, time.time(), job_id)).rowcount
+                if updated:
+                    self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                       (job_id, rows, json.dumps(calls, default=str)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return bool(updated)
+
+    def fail(self, job_id : int, worker : str, error : str) -> None:
+        # back to pending for another try - failed for good after max_attempts
+        with self._lock:
+            self._conn.execute("""UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                  worker = NULL, error = ?, updated = ? WHERE id = ? AND worker = ?
+                                  AND state = 'running'""",
+                               (self.max_attempts, error, time.time(), job_id, worker))
+
+    def collect(self) -> list:
+        # [(job, result rows, llm calls)] pushed since the last collect - each handed out once
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                collected = self._conn.execute("""SELECT jobs.id, project, optimizer, prompt_type, rows, calls
+                                                  FROM results JOIN jobs ON jobs.id = results.job_id
+                                                  ORDER BY jobs.updated""").fetchall()
+                self._conn.executemany("DELETE FROM results WHERE job_id = ?", [(row[0],) for row in collected])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [({'id': job_id, 'project': project, 'optimizer': optimizer, 'prompt_type': prompt_type},
+                 pd.DataFrame(json.loads(rows)), json.loads(calls))
+                for job_id, project, optimizer, prompt_type, rows, calls in collected]
+
+    def counts(self) -> dict:
+        # {state : jobs}
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def failures(self) -> list:
+        with self._lock:
+            return [{'project': row[0], 'optimizer': row[1], 'prompt_type': row[2], 'error': row[3]}
+                    for row in self._conn.execute("""SELECT project, optimizer, prompt_type, error FROM jobs
+                                                     WHERE state = 'failed'""").fetchall()]
+
+    def drained(self) -> bool:
+        # sealed & nothing left to run - a running job may still come back if its worker dies
+        with self._lock:
+            sealed = self._conn.execute("SELECT value FROM meta WHERE key = 'sealed'").fetchone()
+            active = self._conn.execute("""SELECT COUNT(*) FROM jobs
+                                           WHERE state IN ('pending', 'running')""").fetchone()[0]
+        return bool(sealed and json.loads(sealed[0])) and active == 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+def optimize_queue(optim_names : list, queue : WorkQueue, projects : list = None, journal : Journal = None,
+                   poll_seconds : float = QUEUE_POLL_SECONDS):
+    """
+    Coordinator of a multi-machine sweep - queues every (project, optimizer,
+    prompt type) job not finished in the journal, then yields result rows as
+    workers (run_worker, on any node) push them back. Baselines are measured by
+    the workers on their own machines, so runtimes are only ever compared with
+    a baseline from the same host.
+    """
+    queue.seal(False)
+    for proj_name in list(projects or PROJECTS):
+        for optim_name in optim_names:
+            for prompt_type in PROMPT_TYPES:
+                if journal is None or not journal.done(proj_name, optim_name, prompt_type):
+                    queue.enqueue(proj_name, optim_name, prompt_type)
+    queue.seal()
+    print(f"Queued jobs : {queue.counts()}")
+
+    reported = set()
+    while True:
+        drained = queue.drained() # checked first - results pushed after it are collected below
+        set_jobs(queue.counts())
+        for job, results, calls in queue.collect():
+            add_records(calls)
+            print(f"Job {_job_name(job)} done - {len(results)} rows")
+            yield results
+            if journal is not None:
+                journal.record_done(job['project'], job['optimizer'], job['prompt_type'])
+
+        for failure in queue.failures():
+            if _job_name(failure) not in reported:
+                reported.add(_job_name(failure))
+                print(f"Job {_job_name(failure)} failed on every attempt: {failure['error']}")
+        if drained:
+            return
+        time.sleep(poll_seconds)
+
+def run_worker(queue : WorkQueue, optim_factories : dict, metaprompter_factory, slots : int = None,
+               worker : str = None, poll_seconds : float = QUEUE_POLL_SECONDS) -> int:
+    """
+    Pulls jobs for the given optimizers ({optimizer name : picklable factory})
+    and runs up to `slots` of them at once on a process pool, against this
+    machine's checkouts & venvs - the same way optimize_grid runs its jobs.
+    Returns once the sealed queue has drained, with the number of jobs finished.
+    """
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    lane = context.Lock()
+    lane_cpus, job_cpus = _split_cpus()
+    set_benchmark_lane(lane, lane_cpus) # baselines are timed in this process
+    slots = slots or max(1, len(job_cpus or ()) or WORKERS)
+    worker = worker or f"{platform.node()}-{os.getpid()}"
+
+    baselines = {} # project : job fields shared by its jobs - None if its suite errors here
+    running = {} # future : claimed job
+    leased = {} # job id : claimed job - renewed from the claim on, while its baseline is measured too
+    finished = 0
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(queue, worker, leased, stop), daemon=True)
+    heartbeat.start()
+
+    try:
+        # jobs' records reach this node's metrics as they happen - the coordinator's once the job is done
+        with relay(context) as forwarded, \
+             ProcessPoolExecutor(max_workers=slots, mp_context=context, initializer=_init_worker,
+                                 initargs=(lane, lane_cpus, job_cpus, forwarded)) as executor:
+            while True:
+                while len(running) < slots:
+                    broken = {project for project, baseline in baselines.items() if baseline is None}
+                    job = queue.claim(worker, list(optim_factories), broken) # left to the other workers
+                    if job is None:
+                        break
+                    leased[job['id']] = job
+                    print(f"Claimed job {_job_name(job)} (attempt {job['attempt']})")
+                    if job['project'] not in baselines:
+                        baselines[job['project']] = _local_baseline(job['project'])
+                    if baselines[job['project']] is None:
+                        leased.pop(job['id'])
+                        queue.fail(job['id'], worker, f"test suite on {job['project']} errors on {worker}")
+                        continue
+                    grid_job = {**job, **baselines[job['project']], 'journal': None}
+                    future = executor.submit(_grid_job, grid_job, optim_factories[job['optimizer']],
+                                             metaprompter_factory)
+                    running[future] = job
+
+                if not running:
+                    if queue.drained():
+                        return finished
+                    time.sleep(poll_seconds)
+                    continue
+
+                done, _ = wait(list(running), timeout=poll_seconds, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    leased.pop(job['id'])
+                    try:
+                        results, calls = future.result()
+                    except Exception as e:
+                        print(f"Job {_job_name(job)} failed: {e}")
+                        queue.fail(job['id'], worker, repr(e))
+                        continue
+                    if queue.complete(job['id'], worker, results, calls):
+                        finished += 1
+                        print(f"Job {_job_name(job)} done - {len(results)} rows pushed")
+    finally:
+        stop.set()
+        heartbeat.join()
+
+def _local_baseline(proj_name : str) -> dict | None:
+    # measured on this machine - reused from the baseline cache while its environment is unchanged
+    baseline = _baseline(proj_name)
+    if baseline is None:
+        return None
+    return {'baseline': baseline, 'base': snapshot(PyProj(proj_name).src_dir)}
+
+def _heartbeat(queue : WorkQueue, worker : str, leased : dict, stop : threading.Event) -> None:
+    # keeps the leases of claimed jobs - baselines can hold up the claiming loop for minutes
+    while not stop.wait(queue.lease_seconds / 3):
+        queue.heartbeat(list(leased.copy()), worker)
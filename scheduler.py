@@ -0,0 +1,179 @@
+from email.utils import parsedate_to_datetime
+from contextvars import ContextVar
+import threading
+import asyncio
+import random
+import json
+import time
+
+# statuses worth waiting out - rate limits, overload (anthropic's 529) & transient server errors
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = {'RateLimitError', 'APIConnectionError', 'APITimeoutError', 'InternalServerError',
+                    'OverloadedError', 'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded'}
+
+# usage entries logged by the provider call in flight in this thread / task - settle its own estimate
+_call_usage = ContextVar('call_usage', default=None)
+
+class TokenBucket:
+    """
+    Refills `rate` units per minute up to `capacity`. reserve() always succeeds
+    but may leave the bucket in debt, returning how long the caller must wait -
+    callers are served in reservation order, so waiting callers form a queue.
+    """
+    def __init__(self, rate : float, capacity : float = None):
+        self.rate = rate / 60
+        self.capacity = rate if capacity is None else capacity
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount : float = 1) -> float:
+        with self._lock:
+            self._refill()
+            self._level -= min(amount, self.capacity) # oversized requests wait for a full bucket, not forever
+            return max(0.0, -self._level / self.rate)
+
+    def refund(self, amount : float) -> None:
+        # settle an estimate against actual usage (negative amounts charge more)
+        with self._lock:
+            self._refill()
+            self._level = min(self.capacity, self._level + amount)
+
+    def pause(self, seconds : float) -> None:
+        # the provider asked us to back off - drain so every queued caller waits too
+        with self._lock:
+            self._refill()
+            self._level = min(self._level, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+class ProviderScheduler:
+    """
+    Paces one provider's calls under its request & token limits and retries
+    rate limits / transient errors with exponential backoff and full jitter,
+    honouring Retry-After when the provider sends one.
+    """
+    def __init__(self, requests_per_minute : float, tokens_per_minute : float,
+                 max_retries : int = 6, base_delay : float = 1, max_delay : float = 60):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def run(self, call, request : dict):
+        # usage the call logs (log_usage) settles the estimate - concurrent calls each settle their own
+        for attempt in range(self.max_retries + 1):
+            estimate, logged = estimate_tokens(request), []
+            time.sleep(self._reserve(estimate))
+            token = _call_usage.set(logged)
+            try:
+                value = call(request)
+            except Exception as e:
+                time.sleep(self._backoff(e, attempt, estimate))
+                continue
+            finally:
+                _call_usage.reset(token)
+            self._settle(estimate, logged)
+            return value
+
+    async def arun(self, acall, request : dict):
+        for attempt in range(self.max_retries + 1):
+            estimate, logged = estimate_tokens(request), []
+            await asyncio.sleep(self._reserve(estimate))
+            token = _call_usage.set(logged)
+            try:
+                value = await acall(request)
+            except Exception as e:
+                await asyncio.sleep(self._backoff(e, attempt, estimate))
+                continue
+            finally:
+                _call_usage.reset(token)
+            self._settle(estimate, logged)
+            return value
+
+    def _reserve(self, estimate : int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(estimate))
+
+    def _backoff(self, error : Exception, attempt : int, estimate : int) -> float:
+        # re-raises anything not worth retrying, or once retries run out
+        if attempt >= self.max_retries or not retryable(error):
+            raise error
+        self.tokens.refund(estimate) # the failed call's reservation is re-made on the next attempt
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        wait = retry_after(error)
+        if wait is not None:
+            self.requests.pause(wait)
+            delay = max(delay, wait)
+
+        print(f"{type(error).__name__} from provider - retrying in {delay:.1f}s "
+              f"(attempt {attempt + 1}/{self.max_retries})")
+        return delay
+
+    def _settle(self, estimate : int, logged : list) -> None:
+        if not logged:
+            return # cached, or the call logs no usage
+        call = logged[-1]
+        self.tokens.refund(estimate - call['input_tokens'] - call['output_tokens'])
+
+def log_usage(usage : list, entry : dict) -> None:
+    # appends a provider call's usage to the agent's log - and to the scheduler call it was made in
+    usage.append(entry)
+    logged = _call_usage.get()
+    if logged is not None:
+        logged.append(entry)
+
+def retryable(error : Exception) -> bool:
+    status = _status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+def retry_after(error : Exception) -> float | None:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+
+    milliseconds = headers.get('retry-after-ms')
+    if milliseconds is not None:
+        try:
+            return float(milliseconds) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try: # HTTP-date form
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def estimate_tokens(request : dict) -> int:
+    # ~4 characters per token is close enough to pace against a per-minute budget
+    return len(json.dumps(request, default=repr)) // 4
+
+def _status(error : Exception) -> int | None:
+    # openai & anthropic expose status_code, google api_core exceptions expose code
+    for field in ('status_code', 'code'):
+        value = getattr(error, field, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+_schedulers = {}
+_lock = threading.Lock()
+
+def scheduler_for(model_name : str, limits : dict) -> ProviderScheduler:
+    # optimizers & metaprompters on the same model share one budget
+    with _lock:
+        if model_name not in _schedulers:
+            _schedulers[model_name] = ProviderScheduler(**limits)
+        return _schedulers[model_name]
@@ -0,0 +1,14 @@
+import os
+import pytest
+
+# never replay cached LLM responses into mocked SDK calls
+os.environ['MPCO_NO_CACHE'] = '1'
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Don't let one test's mocked SDK client be shared into the next."""
+    from agents import reset_clients
+    reset_clients()
+    yield
+    reset_clients()
@@ -0,0 +1,110 @@
+import pytest
+import tempfile
+import threading
+import subprocess
+from types import SimpleNamespace
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import pipeline
+from pipeline.pipeline import _attribute, _regressions, _drop_regressions, job_pool_size
+from pipeline.components import MyPatch
+from pipeline.components.worktrees import WorktreePool
+
+
+MODULE = 'def f(x):\n    return sorted(x)[0]\n\n\ndef g(x):\n    return list(x)\n'
+F = {'code': 'def f(x):\n    return sorted(x)[0]\n', 'rel_path': Path('module.py'),
+     'start_line': 0, 'end_line': 1, 'base_indent': 0}
+G = {'code': 'def g(x):\n    return list(x)\n', 'rel_path': Path('module.py'),
+     'start_line': 4, 'end_line': 5, 'base_indent': 0}
+
+# suite seconds spent in each version of the functions - f's patch helps, g's hurts
+COSTS = {'sorted(x)[0]': 0.5, 'min(x)': 0.1, 'list(x)': 0.1, '[y for y in x]': 0.3}
+
+
+class TestAttribution:
+    """Test suite for leave-one-out attribution of stacked patches."""
+
+    @pytest.fixture
+    def stack(self, monkeypatch):
+        """A project with both patches applied, whose suite time follows the code in the tree."""
+        broken_without = set() # patches later ones depend on
+        def get_pyprofile(proj_name, identifier, testing_patch=False, repo_path=None, failfast=None):
+            module = (Path(repo_path) / 'module.py').read_text(encoding='utf-8')
+            failures = frozenset({'tests.test_mod::test_g'} if any(code not in module for code in broken_without)
+                                 else ())
+            return failures, sum(cost for code, cost in COSTS.items() if code in module), None
+        monkeypatch.setattr(pipeline, 'get_pyprofile', get_pyprofile)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = Path(temp_dir) / 'project'
+            repo.mkdir()
+            for args in (['init'], ['config', 'user.email', 'test@test.com'], ['config', 'user.name', 'Test User']):
+                subprocess.run(['git', *args], cwd=repo, check=True, capture_output=True)
+            (repo / 'module.py').write_text(MODULE, encoding='utf-8')
+            subprocess.run(['git', 'add', '.'], cwd=repo, check=True, capture_output=True)
+            subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=repo, check=True, capture_output=True)
+            head = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repo, check=True, capture_output=True,
+                                  text=True).stdout.strip()
+
+            patches = [MyPatch(F, 'def f(x):\n    return min(x)\n', repo),
+                       MyPatch(G, 'def g(x):\n    return [y for y in x]\n', repo)]
+            assert all(patch.apply_patch() for patch in patches)
+            with WorktreePool(repo, size=2, worktrees_dir=Path(temp_dir) / 'worktrees', base=head) as pool:
+                yield pool, SimpleNamespace(name='proj', root_dir=repo), patches, broken_without
+
+    def test_leave_one_out(self, stack):
+        """Test that each patch gets the stack's runtime without it over the runtime with it."""
+        pool, project, patches, _ = stack
+        speedups = _attribute(pool, project, patches, frozenset())
+
+        assert speedups[F['code']] == pytest.approx(0.8 / 0.4)
+        assert speedups[G['code']] == pytest.approx(0.2 / 0.4)
+        assert 'min(x)' in (project.root_dir / 'module.py').read_text(encoding='utf-8') # stack untouched
+
+    def test_job_pool_has_spare_tree(self, stack):
+        """Test that attribution doesn't wait forever on a pool sized for one job holding its own tree."""
+        pool, project, patches, _ = stack
+        pool.size = job_pool_size(1)
+        held = pool.acquire() # the job's own checkout, as in _run_job
+        speedups = {}
+        thread = threading.Thread(target=lambda: speedups.update(_attribute(pool, project, patches, frozenset())),
+                                  daemon=True)
+        thread.start()
+        thread.join(timeout=30)
+        pool.release(held)
+
+        assert not thread.is_alive()
+        assert set(speedups) == {F['code'], G['code']}
+
+    def test_required_patch_unmeasured(self, stack):
+        """Test that a patch the stack fails without gets no attribution."""
+        pool, project, patches, broken_without = stack
+        broken_without.add('min(x)')
+        assert list(_attribute(pool, project, patches, frozenset())) == [G['code']]
+
+    def test_regressions(self):
+        """Test that only patches slowing the suite beyond noise, without a faster function, regress."""
+        patch_speedups = {'a': 0.5, 'b': 0.99, 'c': 0.5, 'd': 1.3}
+        assert _regressions(patch_speedups, {'c': 1.5}, tolerance=0.02) == ['a']
+
+    def test_drop_regressions(self, stack):
+        """Test that regressing patches are reverted from the stack and the others kept."""
+        pool, project, patches, _ = stack
+        speedups = _attribute(pool, project, patches, frozenset())
+
+        assert _drop_regressions(project, patches, speedups, {}, frozenset()) == [G['code']]
+        assert [patch.code_object for patch in patches] == [F]
+        module = (project.root_dir / 'module.py').read_text(encoding='utf-8')
+        assert 'min(x)' in module and 'return list(x)' in module
+
+    def test_drop_kept_when_stack_fails(self, stack):
+        """Test that regressing patches are re-applied if the stack fails without them."""
+        pool, project, patches, broken_without = stack
+        broken_without.add('[y for y in x]')
+
+        assert _drop_regressions(project, patches, {G['code']: 0.5}, {}, frozenset()) == []
+        assert len(patches) == 2
+        assert '[y for y in x]' in (project.root_dir / 'module.py').read_text(encoding='utf-8')
@@ -0,0 +1,100 @@
+import pytest
+import subprocess
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import baselines, pipeline
+from pipeline.baselines import BaselineCache, environment_fingerprint
+from pipeline.journal import Journal
+
+
+FINGERPRINT = {'head': 'abc', 'edits': '0', 'packages': '1', 'python': '3.12.1', 'machine': {'node': 'host'}}
+
+
+class TestBaselineCache:
+    """Test suite for baselines reused across sweeps while the environment is unchanged."""
+
+    @pytest.fixture
+    def profile(self, tmp_path):
+        """A filtered baseline profile where the pipeline expects it."""
+        profile = tmp_path / 'profiles' / 'proj_filtered0.speedscope'
+        profile.parent.mkdir()
+        profile.write_text('{"profiles": []}', encoding='utf-8')
+        return profile
+
+    @pytest.fixture
+    def repo(self, tmp_path, monkeypatch):
+        """A project checkout whose venv is the running interpreter."""
+        repo = tmp_path / 'project'
+        repo.mkdir()
+        for args in (['init'], ['config', 'user.email', 'test@test.com'], ['config', 'user.name', 'Test User']):
+            subprocess.run(['git', *args], cwd=repo, check=True, capture_output=True)
+        (repo / 'module.py').write_text('def f():\n    return 1\n', encoding='utf-8')
+        subprocess.run(['git', 'add', '.'], cwd=repo, check=True, capture_output=True)
+        subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=repo, check=True, capture_output=True)
+        monkeypatch.setattr(baselines, 'venv_python', lambda proj_name: Path(sys.executable))
+        return repo
+
+    def test_round_trip(self, tmp_path, profile):
+        """Test that a stored baseline comes back with its profile put in place."""
+        cache = BaselineCache(tmp_path / 'baselines')
+        assert cache.get('proj', FINGERPRINT, profile) is None
+        cache.put('proj', FINGERPRINT, frozenset({'tests.test_a::test_b'}), 1.5, profile)
+
+        profile.unlink()
+        assert cache.get('proj', FINGERPRINT, profile) == (frozenset({'tests.test_a::test_b'}), 1.5)
+        assert profile.read_text(encoding='utf-8') == '{"profiles": []}'
+
+    def test_changed_environment_misses(self, tmp_path, profile):
+        """Test that a baseline isn't reused on another commit, machine or for another project."""
+        cache = BaselineCache(tmp_path / 'baselines')
+        cache.put('proj', FINGERPRINT, frozenset(), 1.5, profile)
+
+        assert cache.get('proj', {**FINGERPRINT, 'head': 'def'}, profile) is None
+        assert cache.get('proj', {**FINGERPRINT, 'machine': {'node': 'other'}}, profile) is None
+        assert cache.get('other', FINGERPRINT, profile) is None
+
+    def test_fingerprint(self, repo):
+        """Test that the fingerprint follows commits & uncommitted edits, and records the venv."""
+        fingerprint = environment_fingerprint('proj', repo)
+        assert fingerprint == environment_fingerprint('proj', repo)
+        assert fingerprint['python'] == sys.version
+
+        (repo / 'module.py').write_text('def f():\n    return 2\n', encoding='utf-8')
+        edited = environment_fingerprint('proj', repo)
+        assert edited['edits'] != fingerprint['edits'] and edited['head'] == fingerprint['head']
+
+        subprocess.run(['git', 'commit', '-am', 'Edit'], cwd=repo, check=True, capture_output=True)
+        assert environment_fingerprint('proj', repo)['head'] != fingerprint['head']
+
+    def test_fingerprint_without_checkout(self, tmp_path, monkeypatch):
+        """Test that a project that can't be inspected isn't cached."""
+        monkeypatch.setattr(baselines, 'venv_python', lambda proj_name: Path(sys.executable))
+        assert environment_fingerprint('proj', tmp_path / 'missing') is None
+
+    def test_baseline_measured_once(self, tmp_path, profile, monkeypatch):
+        """Test that a second sweep reuses the cached baseline without running the suite."""
+        runs = []
+        def get_pyprofile(proj_name, revision_no=0, **kwargs):
+            runs.append(proj_name)
+            return frozenset({'tests.test_a::test_b'}), 2.0, None
+        monkeypatch.setattr(pipeline, 'get_pyprofile', get_pyprofile)
+        monkeypatch.setattr(pipeline, '_capture', lambda proj_name: None)
+        monkeypatch.setattr(pipeline, 'environment_fingerprint', lambda proj_name: FINGERPRINT)
+        monkeypatch.setattr(pipeline, 'PROFILER_DIR', tmp_path)
+        monkeypatch.setattr(pipeline, 'BASELINE_CACHE_DIR', tmp_path / 'baselines')
+        monkeypatch.delenv('MPCO_REMEASURE', raising=False)
+
+        assert pipeline._baseline('proj') == (frozenset({'tests.test_a::test_b'}), 2.0)
+        assert len(runs) == 12
+
+        journal = Journal(tmp_path / 'journal') # a fresh sweep
+        assert pipeline._baseline('proj', journal) == (frozenset({'tests.test_a::test_b'}), 2.0)
+        assert len(runs) == 12
+        assert journal.baseline('proj', profile) == (frozenset({'tests.test_a::test_b'}), 2.0)
+
+        monkeypatch.setenv('MPCO_REMEASURE', '1')
+        pipeline._baseline('proj')
+        assert len(runs) == 24
@@ -0,0 +1,144 @@
+import pytest
+import tempfile
+import json
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import pipeline
+from pipeline.batches import BatchQueue, BatchError, LocalBatchBackend
+from pipeline.cache import ResponseCache
+
+
+class FakeOptimizer:
+    """Optimizer stand-in exposing the attributes BatchQueue relies on."""
+
+    def __init__(self, cache=None):
+        self.name = '4o'
+        self.model_name = '4o'
+        self.model_id = 'gpt-4o'
+        self.cache = cache
+
+    @staticmethod
+    def request(prompt, snippet, scope):
+        return {'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': f"{prompt}\n{snippet}\n{scope}"}]}
+
+
+def responder(body):
+    """Answer a queued request by upper-casing the snippet line."""
+    content = body['messages'][0]['content']
+    if 'explode' in content:
+        raise RuntimeError('model refused')
+    return content.splitlines()[1].upper()
+
+
+class FailingBackend:
+    """Backend whose job errors while it is polled."""
+
+    def create(self, requests):
+        return 'batch-failed'
+
+    def done(self, job_id):
+        raise RuntimeError('batch expired')
+
+
+class TestBatchQueue:
+    """Test suite for batch submission through the local file-backed stand-in."""
+
+    @pytest.fixture
+    def batch_dir(self):
+        """Directory backing the local batch server."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield Path(temp_dir)
+
+    def test_batch_resolves_every_request(self, batch_dir):
+        """Test that all queued requests go out as one job and resolve individually."""
+        backend = LocalBatchBackend(batch_dir, responder)
+        queue = BatchQueue(FakeOptimizer(), backend, FakeOptimizer.request, poll_interval=0.01)
+
+        futures = [queue.add('prompt', f'def f{i}(): pass', []) for i in range(5)]
+        job_id = queue.submit()
+
+        assert [future.result(timeout=5) for future in futures] == [f'DEF F{i}(): PASS' for i in range(5)]
+        assert len(list(batch_dir.glob('*.requests.jsonl'))) == 1
+        with open(batch_dir / f'{job_id}.requests.jsonl', encoding='utf-8') as f:
+            assert len(f.readlines()) == 5
+
+    def test_job_waits_for_server_latency(self, batch_dir):
+        """Test that results are only available once the stand-in finishes the job."""
+        backend = LocalBatchBackend(batch_dir, responder, latency=0.2)
+        queue = BatchQueue(FakeOptimizer(), backend, FakeOptimizer.request, poll_interval=0.01)
+
+        future = queue.add('prompt', 'def f(): pass', [])
+        queue.submit()
+        assert not future.done()
+        assert future.result(timeout=5) == 'DEF F(): PASS'
+
+    def test_failed_request_raises_batch_error(self, batch_dir):
+        """Test that a failed item surfaces as a BatchError (a ValueError) for interactive fallback."""
+        backend = LocalBatchBackend(batch_dir, responder)
+        queue = BatchQueue(FakeOptimizer(), backend, FakeOptimizer.request, poll_interval=0.01)
+
+        ok = queue.add('prompt', 'def f(): pass', [])
+        bad = queue.add('prompt', 'def explode(): pass', [])
+        queue.submit()
+
+        assert ok.result(timeout=5) == 'DEF F(): PASS'
+        with pytest.raises(BatchError):
+            bad.result(timeout=5)
+        assert issubclass(BatchError, ValueError)
+
+    def test_results_populate_response_cache(self, batch_dir):
+        """Test that batch results are replayed from the cache on a rerun without a new job."""
+        cache_path = batch_dir / 'cache.sqlite'
+        backend = LocalBatchBackend(batch_dir / 'server', responder)
+
+        first = BatchQueue(FakeOptimizer(ResponseCache(cache_path)), backend, FakeOptimizer.request, poll_interval=0.01)
+        future = first.add('prompt', 'def f(): pass', [])
+        first.submit()
+        assert future.result(timeout=5) == 'DEF F(): PASS'
+
+        rerun = BatchQueue(FakeOptimizer(ResponseCache(cache_path)), backend, FakeOptimizer.request, poll_interval=0.01)
+        replayed = rerun.add('prompt', 'def f(): pass', [])
+        assert replayed.done() and replayed.result() == 'DEF F(): PASS'
+        assert rerun.submit() is None
+
+    def test_failed_job_skips_cancelled_futures(self):
+        """Test that a failed job still resolves every future that wasn't cancelled."""
+        queue = BatchQueue(FakeOptimizer(), FailingBackend(), FakeOptimizer.request, poll_interval=0.01)
+        unused = queue.add('prompt', 'def f(): pass', [])
+        pending = queue.add('prompt', 'def g(): pass', [])
+        unused.cancel() # an unused prefetch
+        queue.submit()
+
+        with pytest.raises(BatchError, match='batch expired'):
+            pending.result(timeout=5)
+
+
+class TestBatchFallback:
+    """Test suite for first attempts whose batch failed."""
+
+    def test_failed_batch_generates_interactively(self, monkeypatch):
+        """Test that a failed batch request is re-issued interactively without losing the attempt."""
+        code_object = {'code': 'def f(): pass', 'scope': [], 'rel_path': 'pkg/mod.py', 'start_line': 0}
+        project = Mock(revisions=0)
+        project.name = 'proj'
+        project.load_function.return_value = code_object
+        optim = Mock()
+        optim.generate.return_value = 'def f(): return None'
+        failed = Future()
+        failed.set_exception(BatchError('batch expired'))
+
+        monkeypatch.setattr(pipeline, 'MyPatch', Mock())
+        for gate in ('check_candidate', 'import_check', 'differential_check', 'checkout_env'):
+            monkeypatch.setattr(pipeline, gate, lambda *args, **kwargs: None)
+        monkeypatch.setattr(pipeline, 'get_pyprofile', lambda *args, **kwargs: (frozenset(), 1.0, None))
+
+        edits, failed_optims, _ = pipeline._optimize_snippet('objective', 'task', project, optim, 'prompt', [],
+                                                             frozenset(), queued={'def f(): pass': ('prompt', failed)})
+        assert edits == {'def f(): pass': 'def f(): return None'}
+        assert failed_optims == 0
+        optim.generate.assert_called_once_with('prompt', 'def f(): pass', pipeline.prompt_scope(code_object))
@@ -0,0 +1,83 @@
+import pytest
+import tempfile
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.cache import ResponseCache
+
+
+class TestResponseCache:
+    """Test suite for the persistent LLM response cache."""
+
+    @pytest.fixture
+    def cache_path(self):
+        """Temporary SQLite file for the cache."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield Path(temp_dir) / 'cache.sqlite'
+
+    @pytest.fixture
+    def request_body(self):
+        """Sample provider request."""
+        return {'model': 'gpt-4o', 'max_tokens': 16384,
+                'messages': [{'role': 'system', 'content': 'Return code'},
+                             {'role': 'user', 'content': 'optimize def f(): pass'}]}
+
+    def test_miss_then_hit_across_runs(self, cache_path, request_body):
+        """Test that a stored response is replayed by a fresh process (new cache instance)."""
+        cache = ResponseCache(cache_path)
+        key = cache.key('4o', 'gpt-4o', request_body)
+        assert cache.get(key) is None
+        cache.put(key, 'def f(): return 1')
+        cache.close()
+
+        rerun = ResponseCache(cache_path)
+        assert rerun.get(rerun.key('4o', 'gpt-4o', request_body)) == 'def f(): return 1'
+        assert rerun.hits == 1
+
+    def test_repeated_requests_get_distinct_samples(self, cache_path, request_body):
+        """Test that regenerating with an identical request does not replay the first answer."""
+        cache = ResponseCache(cache_path)
+        first, second = cache.key('4o', 'gpt-4o', request_body), cache.key('4o', 'gpt-4o', request_body)
+        assert first != second
+
+        cache.put(first, 'attempt 1')
+        cache.put(second, 'attempt 2')
+        cache.close()
+
+        rerun = ResponseCache(cache_path)
+        assert rerun.get(rerun.key('4o', 'gpt-4o', request_body)) == 'attempt 1'
+        assert rerun.get(rerun.key('4o', 'gpt-4o', request_body)) == 'attempt 2'
+
+    @pytest.mark.parametrize('change', [
+        lambda r: r.update(max_tokens=10),
+        lambda r: r['messages'][0].update(content='Different system prompt'),
+        lambda r: r['messages'][1].update(content='optimize def g(): pass'),
+    ])
+    def test_key_covers_request(self, cache_path, request_body, change):
+        """Test that parameters, system prompt and assembled prompt all change the key."""
+        original = ResponseCache(cache_path).key('4o', 'gpt-4o', request_body)
+        change(request_body)
+        assert ResponseCache(cache_path).key('4o', 'gpt-4o', request_body) != original
+
+    def test_key_covers_provider_and_model(self, cache_path, request_body):
+        """Test that the same request to another provider/model misses."""
+        base = ResponseCache(cache_path).key('4o', 'gpt-4o', request_body)
+        assert ResponseCache(cache_path).key('40', 'gpt-4o', request_body) != base
+        assert ResponseCache(cache_path).key('4o', 'gpt-4.1', request_body) != base
+
+    def test_size_based_eviction(self, cache_path):
+        """Test that least recently used entries are evicted past the size cap."""
+        cache = ResponseCache(cache_path, max_bytes=250)
+        keys = [cache.key('4o', 'gpt-4o', {'n': i}) for i in range(3)]
+
+        cache.put(keys[0], 'a' * 100)
+        cache.put(keys[1], 'b' * 100)
+        cache.get(keys[0]) # keys[1] is now least recently used
+        cache.put(keys[2], 'c' * 100)
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) == 'a' * 100
+        assert cache.get(keys[2]) == 'c' * 100
+        assert cache.size() <= 250
@@ -0,0 +1,107 @@
+import pytest
+import tempfile
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.components.context import build_context, prompt_scope
+
+
+HELPERS = '''
+def normalize(text: str, lower: bool = True) -> str:
+    """Strip & optionally lowercase."""
+    return text.strip().lower() if lower else text.strip()
+
+def unused(x):
+    return x
+'''
+
+MODULE = '''
+import re
+import collections
+from .helpers import normalize
+
+def tokenize(text):
+    return re.findall(r"\\w+", text)
+
+class Counter:
+    limit: int = 10
+    unrelated = "x"
+
+    def __init__(self, words):
+        self.words = words
+        self.cache = {}
+
+    def count(self):
+        result = {}
+        for word in tokenize(" ".join(self.words)):
+            word = normalize(word)
+            result[word] = result.get(word, 0) + 1
+        return self.trim(result)
+
+    def trim(self, result):
+        return dict(list(result.items())[:self.limit])
+'''
+
+SNIPPET = '''def count(self):
+    result = {}
+    for word in tokenize(" ".join(self.words)):
+        word = normalize(word)
+        result[word] = result.get(word, 0) + 1
+    return self.trim(result)
+'''
+
+
+class TestContextBuilder:
+    """Test suite for the callee & type context added to optimization prompts."""
+
+    @pytest.fixture
+    def project(self):
+        """Create a small package with a module importing a sibling helper."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root / 'pkg').mkdir()
+            (root / 'pkg' / '__init__.py').write_text('', encoding='utf-8')
+            (root / 'pkg' / 'helpers.py').write_text(HELPERS, encoding='utf-8')
+            (root / 'pkg' / 'counter.py').write_text(MODULE, encoding='utf-8')
+            yield root, {'rel_path': Path('pkg/counter.py'), 'code': SNIPPET,
+                         'scope': [{'type': 'class', 'name': 'Counter'}]}
+
+    def test_gathers_callees_fields_and_imports(self, project):
+        """Test that signatures of called helpers, read attributes & used imports are included."""
+        root, code_object = project
+        context = build_context(code_object, root)
+
+        assert 'def normalize(text: str, lower: bool=True) -> str:' in context
+        assert 'Strip & optionally lowercase.' in context
+        assert 'def tokenize(text):' in context
+        assert 'def trim(self, result):' in context
+        assert 'self.words = words' in context
+        assert 'from .helpers import normalize' in context
+        assert 'return re.findall' not in context # signatures only
+        assert 'unused' not in context and 'collections' not in context and 'self.cache' not in context
+
+    def test_ranked_by_profile_weight(self, project):
+        """Test that the most profiled definitions come first."""
+        root, code_object = project
+        weights = {('pkg/helpers.py', 'normalize'): 5.0, ('pkg/counter.py', 'tokenize'): 1.0}
+        context = build_context(code_object, root, weights)
+        assert context.index('def normalize') < context.index('def tokenize') < context.index('def trim')
+
+    def test_truncated_to_budget(self, project):
+        """Test that lower ranked definitions are dropped once the token budget is spent."""
+        root, code_object = project
+        weights = {('pkg/helpers.py', 'normalize'): 5.0}
+        context = build_context(code_object, root, weights, budget=40)
+
+        assert len(context) // 4 <= 40
+        assert 'def normalize' in context
+        assert 'def trim' not in context
+
+    def test_prompt_scope(self, project):
+        """Test that the context follows the enclosing scope in the prompt, and is skipped when empty."""
+        _, code_object = project
+        assert prompt_scope(code_object) == str(code_object['scope'])
+        code_object['context'] = 'def tokenize(text):\n    ...'
+        assert prompt_scope(code_object).endswith('def tokenize(text):\n    ...')
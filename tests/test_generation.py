@@ -0,0 +1,74 @@
+import pytest
+import asyncio
+import time
+from concurrent.futures import Future
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.generation import GenerationPool
+
+
+class SlowOptimizer:
+    """Async optimizer stand-in that tracks how many calls overlap."""
+
+    def __init__(self, model_name, delay=0.05):
+        self.model_name = model_name
+        self.name = model_name
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    async def agenerate(self, prompt, snippet, scope):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return f"{prompt}|{snippet}|{scope}"
+
+
+class TestGenerationPool:
+    """Test suite for the asyncio generation layer."""
+
+    def test_generate_returns_result(self):
+        """Test that a submitted generation resolves to the optimizer output."""
+        optim = SlowOptimizer('4o')
+        with GenerationPool(limits={'4o': 2}) as gen:
+            assert gen.generate(optim, 'p', 's', []).result(timeout=5) == 'p|s|[]'
+
+    def test_concurrency_limit_respected(self):
+        """Test that in-flight calls per model never exceed the configured limit."""
+        optim = SlowOptimizer('40')
+        with GenerationPool(limits={'40': 3}) as gen:
+            futures = [gen.generate(optim, 'p', str(i), []) for i in range(12)]
+            [future.result(timeout=5) for future in futures]
+        assert optim.peak == 3
+
+    def test_models_run_concurrently(self):
+        """Test that different providers fan out in parallel rather than in series."""
+        optims = [SlowOptimizer(name, delay=0.2) for name in ('25', '4o', '40')]
+        with GenerationPool(limits={'25': 1, '4o': 1, '40': 1}) as gen:
+            start = time.perf_counter()
+            futures = [gen.generate(optim, 'p', 's', []) for optim in optims]
+            [future.result(timeout=5) for future in futures]
+            elapsed = time.perf_counter() - start
+        assert elapsed < 0.5
+
+    def test_pending_prompt_future_is_resolved(self):
+        """Test that a prompt still being generated is awaited before the call."""
+        optim = SlowOptimizer('25')
+        prompt = Future()
+        with GenerationPool() as gen:
+            result = gen.generate(optim, prompt, 's', [])
+            assert not result.done()
+            prompt.set_result('meta')
+            assert result.result(timeout=5) == 'meta|s|[]'
+
+    def test_close_cancels_pending(self):
+        """Test that closing the pool cancels queued generations."""
+        optim = SlowOptimizer('4o', delay=10)
+        gen = GenerationPool(limits={'4o': 1})
+        futures = [gen.generate(optim, 'p', 's', []) for _ in range(3)]
+        gen.close()
+        assert all(future.cancelled() for future in futures)
@@ -0,0 +1,97 @@
+import pytest
+import threading
+import time
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import grid
+from pipeline.grid import optimize_grid
+from pipeline.profiler import filter_profiles
+from pipeline.profiler.filter_profiles import benchmark_lane, set_benchmark_lane, run_id
+
+
+DELAYS = {'MP': 0.6, 'FS': 0.0, 'COT': 0.4, 'BASE': 0.2}
+
+
+def fake_job(job, optim_factory, metaprompter_factory):
+    """Job finishing after a per prompt type delay."""
+    time.sleep(DELAYS[job['prompt_type']])
+    return [job['prompt_type']], [{'stage': 'generate', 'provider': job['optimizer'], 'latency': 0.1}]
+
+
+class TestGrid:
+    """Test suite for the process-pool (project, optimizer, prompt type) scheduler."""
+
+    @pytest.fixture(autouse=True)
+    def restore_lane(self):
+        """Put back the in-process lane after each test."""
+        yield
+        set_benchmark_lane(threading.Lock(), None)
+
+    def test_results_stream_in_completion_order(self, monkeypatch):
+        """Test that every cell of the grid runs once and results arrive as jobs finish."""
+        monkeypatch.setattr(grid, '_baseline', lambda proj_name, journal=None: (0, 1.0))
+        monkeypatch.setattr(grid, 'PyProj', Mock())
+        monkeypatch.setattr(grid, 'snapshot', lambda repo_root: 'HEAD')
+        monkeypatch.setattr(grid, '_grid_job', fake_job)
+        added = []
+        monkeypatch.setattr(grid, 'add_records', lambda calls, observed=False: added.extend(calls))
+
+        results = list(optimize_grid({'4o': Mock}, Mock, ['proj'], workers=4))
+
+        assert [result[0] for result in results] == ['FS', 'BASE', 'COT', 'MP']
+        assert len(added) == 4 # each job's llm calls are merged into this process's log
+
+    def test_results_stream_while_baselines_run(self, monkeypatch):
+        """Test that finished jobs are handed back before later projects' baselines are measured."""
+        measured = []
+        def baseline(proj_name, journal=None):
+            if proj_name == 'slow':
+                time.sleep(2)
+            measured.append(proj_name)
+            return 0, 1.0
+        monkeypatch.setattr(grid, '_baseline', baseline)
+        monkeypatch.setattr(grid, 'PyProj', Mock())
+        monkeypatch.setattr(grid, 'snapshot', lambda repo_root: 'HEAD')
+        monkeypatch.setattr(grid, '_grid_job', fake_job)
+        monkeypatch.setattr(grid, 'add_records', lambda calls, observed=False: None)
+
+        results = optimize_grid({'4o': Mock}, Mock, ['fast', 'slow'], workers=4)
+        next(results)
+        assert measured == ['fast'] # the slow baseline is still being measured
+        assert len(list(results)) == 7
+
+    def test_lane_serializes_timed_runs(self):
+        """Test that only one timed run holds the lane at a time."""
+        set_benchmark_lane(threading.Lock())
+        active, overlaps = [], []
+        def timed_run():
+            with benchmark_lane():
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.02)
+                active.pop()
+
+        threads = [threading.Thread(target=timed_run) for _ in range(5)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+        assert overlaps == [1] * 5
+
+    @pytest.mark.skipif(not hasattr(filter_profiles.os, 'sched_setaffinity'), reason="no cpu affinity")
+    def test_lane_pins_and_restores_affinity(self):
+        """Test that timed runs are pinned to the lane's cpus only while they hold it."""
+        previous = filter_profiles.os.sched_getaffinity(0)
+        lane_cpu = {min(previous)}
+        set_benchmark_lane(threading.Lock(), lane_cpu)
+
+        with benchmark_lane():
+            assert filter_profiles.os.sched_getaffinity(0) == lane_cpu
+        assert filter_profiles.os.sched_getaffinity(0) == previous
+
+    def test_run_ids_differ_across_pools(self, tmp_path):
+        """Test that same-index trees of different jobs write separate profiles & reports."""
+        assert run_id('proj', tmp_path / 'a' / '0') != run_id('proj', tmp_path / 'b' / '0')
+        assert run_id('proj', tmp_path / 'a' / '0').startswith('proj@0')
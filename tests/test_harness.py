@@ -0,0 +1,204 @@
+import pytest
+import pickle
+import gzip
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.profiler import harness
+from pipeline.profiler.harness import bench_target, corpus_path, function_speedup
+
+sys.path.insert(0, str(harness.PLUGINS_DIR))
+import mpco_microbench
+
+
+SLOW = '''class Deduper:
+    def dedupe(self, items, *rest, keep=None):
+        result = []
+        for item in list(items) + list(rest):
+            if item not in result:
+                result.append(item)
+        return result
+'''
+
+FAST = '''class Deduper:
+    def dedupe(self, items, *rest, keep=None):
+        return list(dict.fromkeys(list(items) + list(rest)))
+'''
+
+SNIPPET = '''def dedupe(self, items, *rest, keep=None):
+    result = []
+    for item in list(items) + list(rest):
+        if item not in result:
+            result.append(item)
+    return result
+'''
+
+
+@pytest.fixture
+def trees(tmp_path, monkeypatch):
+    """Create an original & an optimized checkout of a one module package, timed with this interpreter."""
+    for name, source in (('original', SLOW), ('optimized', FAST)):
+        (tmp_path / name / 'pkg').mkdir(parents=True)
+        (tmp_path / name / 'pkg' / '__init__.py').write_text('', encoding='utf-8')
+        (tmp_path / name / 'pkg' / 'dedupe.py').write_text(source, encoding='utf-8')
+    monkeypatch.setattr(harness, 'venv_python', lambda proj_name: Path(sys.executable))
+    monkeypatch.setattr(harness, 'CAPTURES_DIR', tmp_path / 'captures')
+    code_object = {'rel_path': Path('pkg/dedupe.py'), 'code': SNIPPET,
+                   'scope': [{'type': 'class', 'name': 'Deduper'}]}
+    yield tmp_path, code_object
+    sys.modules.pop('pkg.dedupe', None)
+    sys.modules.pop('pkg', None)
+
+
+class TestHarness:
+    """Test suite for per-function microbenchmarks."""
+
+    def test_bench_target(self, trees):
+        """Test that methods are addressed by module & qualname, and nested functions are skipped."""
+        _, code_object = trees
+        target = bench_target(code_object)
+        assert (target['module'], target['qualname']) == ('pkg.dedupe', 'Deduper.dedupe')
+        assert bench_target({**code_object, 'scope': [{'type': 'function', 'name': 'outer'}]}) is None
+
+    def test_bench_target_skips_generators(self, trees):
+        """Test that generator functions aren't captured - their resumes look like calls."""
+        _, code_object = trees
+        generator = {**code_object, 'code': 'def dedupe(self, items):\n    yield from set(items)\n'}
+        assert bench_target(generator) is None and corpus_path('proj', generator) is None
+
+    def test_recorder_captures_calls(self, trees, monkeypatch):
+        """Test that positional, variadic & keyword arguments are recorded as called, with return values."""
+        tmp_path, code_object = trees
+        monkeypatch.syspath_prepend(str(tmp_path / 'original'))
+        target = bench_target(code_object)
+        recorder = mpco_microbench.Recorder({'targets': [target], 'out': str(tmp_path / 'out'), 'size': 5})
+
+        from pkg.dedupe import Deduper
+        items = [0, 0]
+        recorder.start()
+        for i in range(3):
+            Deduper().dedupe(items, i + 1, keep=i)
+            items.append(i) # mutated after the call - the recorded arguments are not
+        recorder.stop()
+
+        corpus = mpco_microbench.load_corpus(tmp_path / 'out' / f"{target['key']}.pkl.gz")
+        assert corpus['qualname'] == 'Deduper.dedupe' and corpus['calls'] == 3
+        (args, kwargs), result = [(pickle.loads(call), pickle.loads(value)) for call, value in corpus['samples']][1]
+        assert args[1:] == ([0, 0, 0], 2) and kwargs == {'keep': 1}
+        assert result == [0, 2]
+
+    def test_unresolved_targets_marked_captured(self, trees, monkeypatch):
+        """Test that a target the recorder can't resolve gets an empty corpus, so it isn't captured again."""
+        tmp_path, code_object = trees
+        monkeypatch.syspath_prepend(str(tmp_path / 'original'))
+        target = {**bench_target(code_object), 'qualname': 'Deduper.missing'}
+        monkeypatch.setattr(harness, 'bench_target', lambda code_object: target)
+        runs = []
+        def capture_run(proj_name, revision_no, testing_patch, repo_path, capture):
+            runs.append(capture)
+            recorder = mpco_microbench.Recorder(capture)
+            recorder.start()
+            recorder.stop()
+        monkeypatch.setattr(harness, 'get_pyprofile', capture_run)
+
+        inputs = harness.capture_inputs('proj', [code_object])
+        assert harness.capture_inputs('proj', [code_object]) == inputs
+        assert len(runs) == 1
+        assert mpco_microbench.load_corpus(inputs[target['key']])['samples'] == []
+        assert function_speedup('proj', code_object, tmp_path / 'original', tmp_path / 'optimized') is None
+
+    def test_recorder_samples_a_reservoir(self, trees, monkeypatch):
+        """Test that the sample stays bounded and later calls get a chance to be kept."""
+        tmp_path, code_object = trees
+        monkeypatch.syspath_prepend(str(tmp_path / 'original'))
+        target = bench_target(code_object)
+        recorder = mpco_microbench.Recorder({'targets': [target], 'out': str(tmp_path / 'out'), 'size': 10})
+
+        from pkg.dedupe import Deduper
+        recorder.start()
+        for i in range(500):
+            Deduper().dedupe([i])
+        recorder.stop()
+
+        corpus = mpco_microbench.load_corpus(tmp_path / 'out' / f"{target['key']}.pkl.gz")
+        kept = [pickle.loads(call)[0][1][0] for call, _ in corpus['samples']]
+        assert corpus['calls'] == 500 and len(kept) == 10
+        assert max(kept) >= 10 # not just the first calls
+
+    def test_speedup_of_optimized_function(self, trees, tmp_path):
+        """Test that the optimized function replays the recorded calls faster."""
+        _, code_object = trees
+        target = bench_target(code_object)
+        inputs = corpus_path('proj', code_object)
+        inputs.parent.mkdir(parents=True)
+        sys.path.insert(0, str(tmp_path / 'original'))
+        try:
+            from pkg.dedupe import Deduper
+            with gzip.open(inputs, 'wb') as f:
+                pickle.dump({**target, 'calls': 1,
+                             'samples': [[pickle.dumps(((Deduper(), list(range(1500)) * 2), {})), None]]}, f)
+        finally:
+            sys.path.remove(str(tmp_path / 'original'))
+
+        speedup = function_speedup('proj', code_object, tmp_path / 'original', tmp_path / 'optimized', repeat=2)
+        assert speedup > 2
+
+    def test_no_speedup_without_inputs(self, trees, tmp_path):
+        """Test that functions never called by the suite get no speedup."""
+        _, code_object = trees
+        assert function_speedup('proj', code_object, tmp_path / 'original', tmp_path / 'optimized') is None
+
+
+class Cached:
+    """Plain object compared by its state."""
+    def __init__(self, total):
+        self.total = total
+
+
+class TestDifferential:
+    """Test suite for differential output checks of candidates against recorded calls."""
+
+    def test_float_tolerance(self):
+        """Test that floats compare up to the tolerance, NaNs match and ints stay exact."""
+        assert mpco_microbench.equivalent([0.1 + 0.2, float('nan')], [0.3, float('nan')])
+        assert not mpco_microbench.equivalent(0.3, 0.31)
+        assert not mpco_microbench.equivalent(True, 1) and not mpco_microbench.equivalent([1], (1,))
+
+    def test_numpy_tolerance(self):
+        """Test that arrays compare elementwise up to the tolerance, with matching shapes."""
+        numpy = pytest.importorskip('numpy')
+        a = numpy.linspace(0, 1, 10)
+        assert mpco_microbench.equivalent(a, a + 1e-12)
+        assert not mpco_microbench.equivalent(a, a + 1e-3)
+        assert 'shape' in mpco_microbench.difference(a, a.reshape(2, 5))
+
+    def test_object_state(self):
+        """Test that objects compare by state, ignoring attributes only the candidate added."""
+        cached = Cached(3)
+        cached._cache = {}
+        assert mpco_microbench.equivalent(Cached(3), cached)
+        assert mpco_microbench.difference({'a': Cached(3)}, {'a': Cached(4)}, path='call 0') == \
+            "call 0['a'].total: expected 3, got 4"
+
+    def test_rejects_different_outcome(self, trees, tmp_path, monkeypatch):
+        """Test that the candidate is replayed against the original's outcomes and rejected where they differ."""
+        _, code_object = trees
+        (tmp_path / 'wrong' / 'pkg').mkdir(parents=True)
+        (tmp_path / 'wrong' / 'pkg' / '__init__.py').write_text('', encoding='utf-8')
+        (tmp_path / 'wrong' / 'pkg' / 'dedupe.py').write_text(FAST.replace('dict.fromkeys', 'sorted'),
+                                                             encoding='utf-8')
+        target = bench_target(code_object)
+        inputs = corpus_path('proj', code_object)
+        inputs.parent.mkdir(parents=True)
+        monkeypatch.syspath_prepend(str(tmp_path / 'original'))
+        from pkg.dedupe import Deduper
+        with gzip.open(inputs, 'wb') as f:
+            pickle.dump({**target, 'calls': 1, 'samples': [[pickle.dumps(((Deduper(), [3, 1, 3]), {})), None]]}, f)
+
+        tolerance = {'rel': 1e-6, 'abs': 1e-9}
+        assert harness.differential_check('proj', code_object, tmp_path / 'original', tmp_path / 'optimized',
+                                          tolerance) == 1
+        with pytest.raises(harness.InvalidCandidate, match=r"call 0\['returned'\]: expected length 2, got 3"):
+            harness.differential_check('proj', code_object, tmp_path / 'original', tmp_path / 'wrong', tolerance)
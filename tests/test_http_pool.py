@@ -0,0 +1,52 @@
+import pytest
+import asyncio
+import threading
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import agents
+from agents import shared_client, shared_aclient, http2_enabled
+
+
+class TestHttpPool:
+    """Test suite for the provider client registry shared by every agent."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_registry(self, monkeypatch):
+        """Give every test an empty registry."""
+        monkeypatch.setattr(agents, '_clients', {})
+
+    def test_one_client_per_provider(self):
+        """Test that concurrent agents of one provider get the same client, built once."""
+        built = []
+        def factory():
+            built.append(object())
+            return built[-1]
+
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(shared_client('4o', factory))) for _ in range(8)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        assert len(built) == 1
+        assert all(client is built[0] for client in clients)
+        assert shared_client('40', object) is not built[0]
+
+    def test_async_clients_per_loop(self):
+        """Test that async clients are shared within an event loop but not across loops."""
+        async def pair():
+            return shared_aclient('4o', object), shared_aclient('4o', object)
+
+        first, second = asyncio.run(pair())
+        other, _ = asyncio.run(pair())
+        assert first is second
+        assert other is not first
+
+    def test_http2_needs_h2(self, monkeypatch):
+        """Test that HTTP/2 is only requested when the h2 package is importable."""
+        monkeypatch.setattr(agents.importlib.util, 'find_spec', lambda name: None)
+        assert not http2_enabled()
+        monkeypatch.setattr(agents.importlib.util, 'find_spec', lambda name: object())
+        assert http2_enabled() == agents.HTTP_POOL['http2']
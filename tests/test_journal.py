@@ -0,0 +1,124 @@
+import pytest
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import pipeline
+from pipeline.journal import Journal, fresh_journal
+from constants import MAX_ATTEMPTS
+
+
+JOB = ('proj', '4o', 'MP')
+
+
+class TestJournal:
+    """Test suite for the checkpoint journal runs resume from."""
+
+    @pytest.fixture
+    def directory(self):
+        """Create a temporary journal directory."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield Path(temp_dir) / 'journal'
+
+    def test_survives_restart(self, directory):
+        """Test that finished jobs & revisions are read back by a new journal."""
+        journal = Journal(directory)
+        journal.record_revision(*JOB, {'a': 'b'}, 2, 'prompt', True)
+        journal.record_done('proj', '4o', 'FS')
+
+        journal = Journal(directory)
+        assert journal.done('proj', '4o', 'FS')
+        assert not journal.done(*JOB)
+        revision, = journal.revisions(*JOB)
+        assert revision['edits'] == {'a': 'b'} and revision['failed_attempts'] == 2
+        assert revision['prompt'] == 'prompt' and revision['accepted']
+        assert journal.revisions('proj', '4o', 'FS') == []
+
+    def test_torn_line_is_dropped(self, directory):
+        """Test that a half written last entry is skipped and later entries still load."""
+        journal = Journal(directory)
+        journal.record_done(*JOB)
+        with open(journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"event": "done", "proj')
+
+        journal = Journal(directory)
+        journal.record_done('proj', '4o', 'COT')
+        journal = Journal(directory)
+        assert journal.done(*JOB) and journal.done('proj', '4o', 'COT')
+
+    def test_reset_marks_reverted(self, directory):
+        """Test that revisions before a reset are marked reverted and later ones aren't."""
+        journal = Journal(directory)
+        journal.record_revision(*JOB, {'a': 'b'}, 0, 'prompt', True)
+        journal.record_reset(*JOB)
+        journal.record_revision(*JOB, {'c': 'd'}, 1, 'prompt', True)
+
+        first, second = journal.revisions(*JOB)
+        assert first['reverted'] and not second.get('reverted')
+
+    def test_baseline_restores_profile(self, directory, tmp_path):
+        """Test that a journaled baseline puts its filtered profile back in place."""
+        profile = tmp_path / 'profiles' / 'proj_filtered0.speedscope'
+        profile.parent.mkdir()
+        profile.write_text('{"profiles": []}', encoding='utf-8')
+        journal = Journal(directory)
+        assert journal.baseline('proj', profile) is None
+        journal.record_baseline('proj', frozenset({'tests.test_a::test_b'}), 1.5, profile)
+
+        profile.unlink()
+        assert Journal(directory).baseline('proj', profile) == (frozenset({'tests.test_a::test_b'}), 1.5)
+        assert profile.read_text(encoding='utf-8') == '{"profiles": []}'
+
+    def test_fresh_journal(self, directory):
+        """Test that starting over sets the old journal aside."""
+        Journal(directory).record_done(*JOB)
+        fresh_journal(directory)
+
+        assert not Journal(directory).done(*JOB)
+        assert len(list(directory.parent.glob('journal-*'))) == 1
+
+
+class TestJobJournal:
+    """Test suite for the revisions a job journals."""
+
+    @staticmethod
+    def run_job(journal, monkeypatch, pool=None):
+        monkeypatch.setattr(pipeline, '_assemble_results', lambda *args: [])
+        base_project = Mock()
+        base_project.name = 'proj'
+        base_project.at.return_value = Mock(revisions=0)
+        optim = Mock()
+        optim.name = '4o'
+        optim.prompt_cache_stats.return_value = {'cached_tokens': 0, 'input_tokens': 0, 'calls': 0, 'hit_rate': 0}
+        return pipeline._run_job(base_project, pool or Mock(), None, optim, 'prompt', None, 'MP', 'task',
+                                 frozenset(), 1.0, {}, None, journal)
+
+    def test_failed_revision_journaled_empty(self, tmp_path, monkeypatch):
+        """Test that a bottleneck given up on doesn't repeat the previous revision's edits."""
+        outcomes = [ValueError('no code'), ({'a': 'b'}, 1, 'prompt'), RuntimeError('stop')]
+        def optimize_snippet(objective, task, project, *args, **kwargs):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            project.revisions += 1
+            return outcome
+        monkeypatch.setattr(pipeline, '_optimize_snippet', optimize_snippet)
+        journal = Journal(tmp_path / 'journal')
+        self.run_job(journal, monkeypatch)
+
+        failed, accepted = journal.revisions(*JOB)
+        assert (failed['edits'], failed['failed_attempts'], failed['accepted']) == ({}, MAX_ATTEMPTS, False)
+        assert (accepted['edits'], accepted['failed_attempts'], accepted['accepted']) == ({'a': 'b'}, 1, True)
+
+    def test_interrupted_job_raises(self, tmp_path, monkeypatch):
+        """Test that an interrupted job is cleaned up but raises, so it's never journaled as done."""
+        def interrupted(*args, **kwargs):
+            raise KeyboardInterrupt
+        monkeypatch.setattr(pipeline, '_optimize_snippet', interrupted)
+        pool = Mock()
+        with pytest.raises(KeyboardInterrupt):
+            self.run_job(Journal(tmp_path / 'journal'), monkeypatch, pool)
+        pool.release.assert_called_once()
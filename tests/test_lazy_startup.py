@@ -0,0 +1,42 @@
+import subprocess
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def imported_after(code):
+    """Run `code` in a fresh interpreter and return the heavy modules it pulled in."""
+    probe = code + "\nimport sys, json\nprint(json.dumps(sorted(m for m in ('pandas', 'matplotlib', 'openai', 'anthropic', 'google.generativeai') if m in sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class TestLazyStartup:
+    """Test suite for keeping SDKs, pandas and matplotlib out of startup."""
+
+    def test_main_imports_nothing_heavy(self):
+        """Test that importing the entry point (e.g. for --help) loads no SDK, pandas or matplotlib."""
+        assert imported_after("import main") == []
+
+    def test_constants_read_json_on_first_access(self):
+        """Test that JSON-backed constants load lazily and star imports still see them."""
+        code = ("import constants\n"
+                "assert 'PROJECT_CONTEXTS' not in vars(constants)\n"
+                "from constants import PROJECTS\n"
+                "assert constants.PROJECTS is PROJECTS and set(constants.PROJECT_CONTEXTS) == PROJECTS\n"
+                "namespace = {}\n"
+                "exec('from constants import *', namespace)\n"
+                "assert namespace['OBJECTIVE'] == constants.OBJECTIVE")
+        assert imported_after(code) == []
+
+    def test_api_keys_read_on_first_client(self):
+        """Test that importing the pipeline doesn't read API_KEYS.json - only building a client does."""
+        code = ("import constants, pipeline.pipeline\n"
+                "assert not {'GEMINI_KEY', 'OPENAI_KEY', 'ANTHROPIC_KEY'} & set(vars(constants))")
+        imported_after(code)
+
+    def test_optimizers_import_without_sdks(self):
+        """Test that the optimizer module defers every provider SDK import to construction."""
+        assert imported_after("import pipeline.optimizers") == []
@@ -0,0 +1,126 @@
+import pytest
+import multiprocessing
+import urllib.request
+import time
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import metrics, telemetry
+from pipeline.metrics import Counter, Gauge, Histogram, Registry, MetricsExporter, write_textfile, relay, forward
+from pipeline.telemetry import tagged, timed_stage, record, record_event, add_records, export_calls
+
+
+def job_process(forwarded, finish):
+    """Job process rejecting a candidate, then waiting to be let finish."""
+    forward(forwarded)
+    record_event('candidate', optimizer='4o', outcome='rejected', reason='tests')
+    finish.wait(10)
+
+
+class TestMetrics:
+    """Test suite for the live counters & histograms of a run."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_metrics(self, monkeypatch):
+        """Give every test an empty call log and empty pipeline metrics."""
+        monkeypatch.setattr(telemetry, '_records', [])
+        monkeypatch.setattr(telemetry, '_exported', 0)
+        monkeypatch.setattr(telemetry, '_jobs', {})
+        for name in ('LLM_CALLS', 'LLM_LATENCY', 'LLM_TOKENS', 'LLM_COST', 'CANDIDATES', 'TEST_RUNS', 'BENCHMARKS'):
+            metric = getattr(metrics, name)
+            monkeypatch.setattr(metric, '_values', {})
+
+    def test_text_format(self):
+        """Test that counters, gauges & histograms render in the Prometheus text format."""
+        registry = Registry()
+        calls = registry.register(Counter('calls_total', "Calls", ('provider',)))
+        jobs = registry.register(Gauge('jobs', "Jobs", ('state',)))
+        latency = registry.register(Histogram('latency_seconds', "Latency", (), (1, 5)))
+        calls.inc(provider='4o')
+        calls.inc(2, provider='4o')
+        calls.inc(provider='a"b')
+        jobs.set(3, state='pending')
+        for seconds in (0.5, 2.0, 10.0):
+            latency.observe(seconds)
+
+        text = registry.render()
+        assert '# TYPE calls_total counter\n' in text
+        assert 'calls_total{provider="4o"} 3\n' in text
+        assert 'calls_total{provider="a\\"b"} 1\n' in text
+        assert 'jobs{state="pending"} 3\n' in text
+        assert '# TYPE latency_seconds histogram\n' in text
+        assert 'latency_seconds_bucket{le="1"} 1\n' in text
+        assert 'latency_seconds_bucket{le="5"} 2\n' in text # cumulative
+        assert 'latency_seconds_bucket{le="+Inf"} 3\n' in text
+        assert 'latency_seconds_sum 12.5\n' in text and 'latency_seconds_count 3\n' in text
+
+    def test_records_feed_metrics(self):
+        """Test that llm calls, test runs, candidates & benchmarks show up in the metrics."""
+        with tagged(project='proj', optimizer='4o'):
+            record({'input_tokens': 100, 'output_tokens': 20, 'cached_tokens': 0}, '4o', 'gpt-4o')
+            with timed_stage('tests'):
+                pass
+            record_event('candidate', outcome='rejected', reason='differential')
+            record_event('candidate', outcome='accepted', reason='')
+        record_event('benchmark', project='proj', kind='stack', seconds=2.0)
+        record_event('benchmark', project='proj', kind='baseline', seconds=None) # suite errored
+
+        assert metrics.LLM_CALLS._values == {('4o', 'gpt-4o', 'generate'): 1}
+        assert metrics.LLM_TOKENS._values[('4o', 'input')] == 100
+        assert metrics.TEST_RUNS._values[('proj',)][2] == 1
+        assert metrics.CANDIDATES._values == {('4o', 'rejected', 'differential'): 1, ('4o', 'accepted', ''): 1}
+        assert metrics.BENCHMARKS._values[('proj', 'stack')][1:] == (2.0, 1)
+        assert ('proj', 'baseline') not in metrics.BENCHMARKS._values
+
+    def test_merged_records_count(self):
+        """Test that records of another process (e.g. a grid job) are counted when merged."""
+        add_records([{'stage': 'generate', 'provider': '25', 'model': 'gemini', 'latency': 3.0},
+                     {'stage': 'candidate', 'event': 'candidate', 'optimizer': '25', 'outcome': 'rejected',
+                      'reason': 'tests'}])
+        assert metrics.LLM_CALLS._values == {('25', 'gemini', 'generate'): 1}
+        assert metrics.CANDIDATES._values == {('25', 'rejected', 'tests'): 1}
+
+    def test_job_processes_forward_records(self):
+        """Test that a job process's records are counted here while the job is still running."""
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        finish = context.Event()
+        with relay(context) as forwarded:
+            process = context.Process(target=job_process, args=(forwarded, finish))
+            process.start()
+            deadline = time.time() + 10
+            while not metrics.CANDIDATES._values and time.time() < deadline:
+                time.sleep(0.01)
+            counted = dict(metrics.CANDIDATES._values)
+            assert process.is_alive()
+            finish.set()
+            process.join()
+
+        assert counted == {('4o', 'rejected', 'tests'): 1}
+
+    def test_events_not_exported_as_calls(self, tmp_path):
+        """Test that progress events stay out of the llm call log."""
+        record({'input_tokens': 1, 'output_tokens': 1, 'cached_tokens': 0}, '4o', 'gpt-4o')
+        record_event('candidate', outcome='accepted', reason='')
+        assert export_calls(tmp_path / 'calls.csv') == 2
+        assert len((tmp_path / 'calls.csv').read_text(encoding='utf-8').splitlines()) == 2 # header & the call
+
+    def test_exporter(self, tmp_path):
+        """Test that the registry is served over HTTP and written to the text file."""
+        registry = Registry()
+        registry.register(Counter('calls_total', "Calls")).inc()
+        path = tmp_path / 'metrics.prom'
+
+        with MetricsExporter(path, port=0, interval=60, registry=registry) as exporter:
+            with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+                assert response.headers['Content-Type'].startswith('text/plain')
+                assert 'calls_total 1\n' in response.read().decode('utf-8')
+        assert 'calls_total 1\n' in path.read_text(encoding='utf-8') # written on close
+
+    def test_textfile_replaced_atomically(self, tmp_path):
+        """Test that writing leaves no temporary files behind."""
+        registry = Registry()
+        registry.register(Gauge('jobs', "Jobs", ('state',))).set(1, state='done')
+        write_textfile(tmp_path / 'metrics.prom', registry)
+        assert [path.name for path in tmp_path.iterdir()] == ['metrics.prom']
@@ -0,0 +1,76 @@
+import pytest
+import tempfile
+import asyncio
+import ast
+import csv
+import time
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.optimizers import MockOptimizer
+from pipeline.metaprompters import MockMP
+from pipeline.components.validation import check_candidate, InvalidCandidate
+
+
+SNIPPET = 'def total(values):\n    result = 0\n    for value in values:\n        result = result + value\n    return result\n'
+
+
+class TestMockProvider:
+    """Test suite for the offline optimizer & metaprompter used in benchmarks."""
+
+    def test_canned_responses(self):
+        """Test that canned mode answers from the mapping and echoes unknown snippets."""
+        optim = MockOptimizer('canned', responses={SNIPPET: 'def total(values):\n    return sum(values)\n'})
+        assert optim.generate('prompt', SNIPPET, []) == 'def total(values):\n    return sum(values)\n'
+        assert optim.generate('prompt', 'def f(): pass', []) == 'def f(): pass'
+
+    def test_mutate_preserves_behaviour(self):
+        """Test that mutated candidates differ textually but define the same function."""
+        optim = MockOptimizer('mutate')
+        mutated = optim.generate('prompt', SNIPPET, [])
+
+        assert mutated != SNIPPET
+        assert ast.dump(ast.parse(mutated)) == ast.dump(ast.parse(SNIPPET))
+
+    def test_replay_from_results(self):
+        """Test that replay mode serves edited snippets from a previous results csv."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'test_results.csv'
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['original_snippet', 'edited_snippet', 'project'])
+                writer.writeheader()
+                writer.writerow({'original_snippet': SNIPPET, 'edited_snippet': 'def total(values):\n    return sum(values)\n',
+                                 'project': 'proj'})
+
+            optim = MockOptimizer('replay', replay_path=path)
+            assert optim.generate('prompt', SNIPPET, []) == 'def total(values):\n    return sum(values)\n'
+
+    def test_faults_fail_validation(self):
+        """Test that injected faults are rejected by the static gate, exercising retries."""
+        optim = MockOptimizer('canned', fault_rate=1.0)
+        code_object = {'code': SNIPPET, 'base_indent': 0, 'rel_path': 'mod.py'}
+        with pytest.raises(InvalidCandidate):
+            check_candidate(code_object, optim.generate('prompt', SNIPPET, []), '.')
+
+    def test_synthetic_latency_and_usage(self):
+        """Test that calls take the configured latency and are logged like real provider calls."""
+        optim = MockOptimizer('canned', latency=0.05)
+        started = time.perf_counter()
+        asyncio.run(optim.agenerate('prompt', SNIPPET, []))
+
+        assert time.perf_counter() - started >= 0.05
+        assert optim.usage[0]['output_tokens'] == len(SNIPPET) // 4
+        assert optim.prompt_cache_stats()['calls'] == 1
+
+    def test_mock_metaprompter(self):
+        """Test that the mock metaprompter fills the real template and returns its canned prompt."""
+        metaprompter = MockMP(prompt='Be fast.')
+        assert metaprompter.get_prompt('objective', 'canopen', 'runtime', '4o') == 'Be fast.'
+        assert metaprompter.usage[0]['input_tokens'] > 0
+
+    def test_unknown_mode(self):
+        """Test that a typo in the mode fails loudly."""
+        with pytest.raises(ValueError):
+            MockOptimizer('echo')
@@ -250,13 +250,15 @@ class TestOptimizerGenerationFunctions:
         assert tools[0]['name'] == "code_output"
         assert call_args.kwargs['tool_choice']['name'] == "code_output"
         
-        # Check messages
+        # Check messages - the stable prompt prefix is its own cacheable block
         messages = call_args.kwargs['messages']
         assert len(messages) == 1
         assert messages[0]['role'] == 'user'
-        assert sample_prompt in messages[0]['content']
-        assert sample_snippet in messages[0]['content']
-        assert sample_scope in messages[0]['content']
+        prefix_block, suffix_block = messages[0]['content']
+        assert prefix_block['text'] == sample_prompt
+        assert prefix_block['cache_control'] == {'type': 'ephemeral'}
+        assert sample_snippet in suffix_block['text']
+        assert sample_scope in suffix_block['text']
     
     @patch('anthropic.Anthropic')
     def test_anthro_optimizer_gen_with_complex_code(self, mock_anthropic_class, 
@@ -465,5 +467,65 @@ class TestOptimizerGenerationFunctions:
         assert result == "test"
 
 
+
+class TestPromptCaching:
+    """Test suite for shared-prefix prompt caching and its accounting."""
+
+    def test_prompt_parts_keep_assembled_text(self):
+        """Test that splitting into prefix & suffix leaves the assembled prompt unchanged."""
+        from pipeline.optimizers import prompt_parts, assemble_prompt
+
+        prefix, suffix = prompt_parts("long prompt", "def f(): pass", "[]")
+        assert prefix == "long prompt"
+        assert "def f(): pass" in suffix and "long prompt" not in suffix
+        assert assemble_prompt("long prompt", "def f(): pass", "[]") == f"{prefix}\n\n{suffix}"
+
+    @patch('anthropic.Anthropic')
+    def test_anthro_cache_hits_are_accounted(self, mock_anthropic_class):
+        """Test that cache reads & writes are folded into per-call usage records."""
+        from pipeline.optimizers import AnthroOptimizer
+
+        mock_tool_block = Mock()
+        mock_tool_block.type = "tool_use"
+        mock_tool_block.name = "code_output"
+        mock_tool_block.input = {"code": "test"}
+
+        mock_response = Mock()
+        mock_response.content = [mock_tool_block]
+        mock_response.usage = Mock(input_tokens=50, output_tokens=20,
+                                   cache_read_input_tokens=1500, cache_creation_input_tokens=0)
+
+        mock_client = Mock()
+        mock_client.messages.create.return_value = mock_response
+        mock_anthropic_class.return_value = mock_client
+
+        optimizer = AnthroOptimizer()
+        optimizer.generate("prompt", "snippet", "scope")
+
+        assert optimizer.usage == [{'input_tokens': 1550, 'output_tokens': 20,
+                                    'cached_tokens': 1500, 'cache_write_tokens': 0}]
+        assert optimizer.prompt_cache_stats()['hit_rate'] == pytest.approx(1500 / 1550)
+
+    @patch('openai.OpenAI')
+    def test_openai_cached_tokens_are_accounted(self, mock_openai_class):
+        """Test that OpenAI's automatic prefix cache hits are recorded per call."""
+        from pipeline.optimizers import OpenOptimizer
+
+        mock_completion = Mock()
+        mock_completion.choices = [Mock(message=Mock(content=json.dumps({"code": "test"})))]
+        mock_completion.usage = Mock(prompt_tokens=2000, completion_tokens=30,
+                                     prompt_tokens_details=Mock(cached_tokens=1024))
+
+        mock_client = Mock()
+        mock_client.chat.completions.create.return_value = mock_completion
+        mock_openai_class.return_value = mock_client
+
+        optimizer = OpenOptimizer()
+        optimizer.generate("prompt", "snippet", "scope")
+
+        assert optimizer.usage[0]['cached_tokens'] == 1024
+        assert optimizer.usage[0]['input_tokens'] == 2000
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,71 @@
+import pytest
+import xml.etree.ElementTree as ET
+import subprocess
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.profiler.filter_profiles import PLUGINS_DIR, failing_tests
+
+sys.path.insert(0, str(PLUGINS_DIR))
+from mpco_failfast import junit_id
+
+
+SUITE = '''
+import pytest
+
+def test_flaky():
+    assert False
+
+class TestMath:
+    def test_broken(self):
+        assert 1 + 1 == 3
+
+    @pytest.mark.parametrize('x', [1, 2])
+    def test_later(self, x):
+        assert x
+'''
+
+
+class TestOutcomes:
+    """Test suite for per-test outcome sets & failing fast on new failures."""
+
+    def run_suite(self, tmp_path, allowed):
+        """Run the suite with the failfast plugin - returns the failing ids & the test cases that ran."""
+        (tmp_path / 'tests').mkdir()
+        (tmp_path / 'tests' / 'test_math.py').write_text(SUITE, encoding='utf-8')
+        spec, report = tmp_path / 'failfast.json', tmp_path / 'report.xml'
+        spec.write_text(json.dumps({'allowed': sorted(allowed)}), encoding='utf-8')
+        env = {**os.environ, 'PYTHONPATH': str(PLUGINS_DIR), 'MPCO_FAILFAST': str(spec)}
+
+        subprocess.run([sys.executable, '-m', 'pytest', 'tests', '-p', 'mpco_failfast', '-p', 'no:cacheprovider',
+                        f'--junit-xml={report}'], cwd=tmp_path, env=env, capture_output=True)
+        root = ET.parse(report).getroot()
+        return failing_tests(root), len(list(root.iter('testcase')))
+
+    def test_junit_ids(self):
+        """Test that pytest node ids map onto JUnit classname::name."""
+        assert junit_id('tests/test_mod.py::test_a') == 'tests.test_mod::test_a'
+        assert junit_id('tests/test_mod.py::TestCls::test_x[a/b.py]') == 'tests.test_mod.TestCls::test_x[a/b.py]'
+
+    def test_stops_at_new_failure(self, tmp_path):
+        """Test that the run stops at the first failure the baseline didn't have."""
+        failures, ran = self.run_suite(tmp_path, {'tests.test_math::test_flaky'})
+        assert failures == {'tests.test_math::test_flaky', 'tests.test_math.TestMath::test_broken'}
+        assert ran == 2 # the parametrized tests never ran
+
+    def test_baseline_failures_dont_stop(self, tmp_path):
+        """Test that failures already in the baseline let the suite run to the end."""
+        allowed = {'tests.test_math::test_flaky', 'tests.test_math.TestMath::test_broken'}
+        failures, ran = self.run_suite(tmp_path, allowed)
+        assert failures == allowed and ran == 4
+
+    def test_fixing_one_test_cant_hide_another(self):
+        """Test that outcome sets catch a swap a failure count would accept."""
+        baseline = frozenset({'tests.test_math::test_flaky'})
+        swapped = frozenset({'tests.test_math.TestMath::test_broken'})
+        assert len(swapped) <= len(baseline)
+        assert not swapped <= baseline
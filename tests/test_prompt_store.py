@@ -0,0 +1,96 @@
+import pytest
+import tempfile
+import asyncio
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.prompt_store import MetaPromptStore, prompt_id
+from pipeline.metaprompters import MetaPrompter
+
+
+class CountingMP(MetaPrompter):
+    """Metaprompter returning a new numbered prompt per generation."""
+
+    model_id = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return f"meta prompt {self.calls}"
+
+    async def agenerate(self, prompt):
+        return self.generate(prompt)
+
+
+ARGS = ('runtime objective', 'canopen', 'runtime', '4o')
+
+
+class TestMetaPromptStore:
+    """Test suite for the persistent, rotating meta prompt pool."""
+
+    @pytest.fixture
+    def store_path(self):
+        """Temporary JSON file backing the store."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            yield Path(temp_dir) / 'meta_prompts.json'
+
+    def test_prompt_reused_across_runs(self, store_path):
+        """Test that a stored meta prompt is served by a new store instead of regenerating."""
+        metaprompter = CountingMP()
+        assert MetaPromptStore(store_path).get_prompt(metaprompter, *ARGS) == 'meta prompt 1'
+        assert asyncio.run(MetaPromptStore(store_path).aget_prompt(metaprompter, *ARGS)) == 'meta prompt 1'
+        assert metaprompter.calls == 1
+
+    def test_pool_grows_then_rotates(self, store_path):
+        """Test that failures fill the pool to its size, then cycle through it without generating."""
+        metaprompter = CountingMP()
+        store = MetaPromptStore(store_path, pool_size=2)
+
+        first = store.get_prompt(metaprompter, *ARGS)
+        second = store.rotate(metaprompter, *ARGS, failed=first)
+        assert (first, second) == ('meta prompt 1', 'meta prompt 2')
+
+        assert store.rotate(metaprompter, *ARGS, failed=second) == first
+        assert store.rotate(metaprompter, *ARGS, failed=first) == second
+        assert metaprompter.calls == 2
+
+        # the rotation position persists too
+        assert MetaPromptStore(store_path, pool_size=2).get_prompt(metaprompter, *ARGS) == second
+
+    def test_prompts_retired_after_max_failures(self, store_path):
+        """Test that a prompt failing too often is dropped and replaced by a fresh one."""
+        metaprompter = CountingMP()
+        store = MetaPromptStore(store_path, pool_size=1, max_failures=2)
+
+        first = store.get_prompt(metaprompter, *ARGS)
+        assert store.rotate(metaprompter, *ARGS, failed=first) == first
+        assert store.rotate(metaprompter, *ARGS, failed=first) == 'meta prompt 2'
+        key = store.key(metaprompter, *ARGS)
+        assert [entry['text'] for entry in store.pool(key)] == ['meta prompt 2']
+
+    def test_pools_are_keyed_by_model_and_context(self, store_path):
+        """Test that other target models get their own pool."""
+        metaprompter = CountingMP()
+        store = MetaPromptStore(store_path)
+
+        store.get_prompt(metaprompter, *ARGS)
+        assert store.get_prompt(metaprompter, 'runtime objective', 'canopen', 'runtime', '40') == 'meta prompt 2'
+        assert store.key(metaprompter, *ARGS) != store.key(metaprompter, 'other objective', 'canopen', 'runtime', '4o')
+
+    def test_prompt_id_is_stable(self):
+        """Test that prompt identity depends only on the text."""
+        assert prompt_id('abc') == prompt_id('abc') != prompt_id('abd')
+
+    def test_concurrent_stores_keep_each_others_pools(self, store_path):
+        """Test that two stores on one file (e.g. grid jobs) don't overwrite each other's pools."""
+        first, second = MetaPromptStore(store_path), MetaPromptStore(store_path)
+        first.get_prompt(CountingMP(), *ARGS)
+        second.get_prompt(CountingMP(), 'runtime objective', 'canopen', 'runtime', '40')
+
+        reloaded = MetaPromptStore(store_path)
+        assert reloaded.pool(reloaded.key(CountingMP(), *ARGS))
+        assert reloaded.pool(reloaded.key(CountingMP(), 'runtime objective', 'canopen', 'runtime', '40'))
@@ -0,0 +1,36 @@
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from main import _append_results
+
+
+ROW = {'original_snippet': 'a', 'edited_snippet': 'b', 'project': 'proj', 'optimizer': '40', 'prompt': 'p',
+       'prompt_id': 'abc', 'prompt_type': 'MP', 'failed_attempts': 1, 'avg_runtime': 0.5,
+       'original_runtime': 1.0, 'func_speedup': 2.0, 'llm_calls': 3}
+
+
+class TestResultsFile:
+    """Test suite for appending job results to the results csv files."""
+
+    def test_new_file_gets_every_column(self, tmp_path):
+        """Test that a new file is started with the rows' own header."""
+        path = tmp_path / 'results.csv'
+        _append_results(pd.DataFrame([ROW]), path)
+        _append_results(pd.DataFrame([ROW]), path)
+
+        data = pd.read_csv(path, dtype={'optimizer': str})
+        assert list(data.columns) == list(ROW) and len(data) == 2
+
+    def test_rows_follow_existing_header(self, tmp_path):
+        """Test that wider rows are appended under an older, narrower header and still parse."""
+        path = tmp_path / 'results.csv'
+        path.write_text('original_snippet,edited_snippet,project,optimizer,prompt,prompt_type,failed_attempts,'
+                        'avg_runtime,original_runtimes\nx,y,proj,25,p,FS,0,0.4,1.0\n', encoding='utf-8')
+        _append_results(pd.DataFrame([ROW]), path)
+
+        data = pd.read_csv(path, dtype={'optimizer': str})
+        assert len(data.columns) == 9 and len(data) == 2
+        assert data.iloc[1]['prompt_type'] == 'MP' and data.iloc[1]['original_runtimes'] == 1.0
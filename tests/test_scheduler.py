@@ -0,0 +1,148 @@
+import pytest
+import asyncio
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import scheduler
+from scheduler import TokenBucket, ProviderScheduler, retry_after, retryable, log_usage, estimate_tokens
+
+
+class ProviderError(Exception):
+    """Error shaped like the openai/anthropic SDK status errors."""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.response = Mock(headers=headers or {})
+        super().__init__(f"status {status_code}")
+
+
+class FlakyCall:
+    """Provider call failing with the given errors before succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'def f(): pass'
+
+
+class TestScheduler:
+    """Test suite for provider rate limiting and retry scheduling."""
+
+    @pytest.fixture
+    def sleeps(self, monkeypatch):
+        """Record sleeps instead of waiting them out."""
+        slept = []
+        monkeypatch.setattr(scheduler.time, 'sleep', slept.append)
+        return slept
+
+    def test_bucket_queues_callers_past_the_limit(self):
+        """Test that reservations past capacity wait their turn at the refill rate."""
+        bucket = TokenBucket(rate=60) # one per second
+        delays = [bucket.reserve() for _ in range(62)]
+
+        assert delays[:60] == [0.0] * 60
+        assert delays[60] == pytest.approx(1, abs=0.05)
+        assert delays[61] == pytest.approx(2, abs=0.05)
+
+    def test_bucket_pause_delays_everyone(self):
+        """Test that a Retry-After pause makes the next caller wait it out."""
+        bucket = TokenBucket(rate=600)
+        bucket.pause(5)
+        assert bucket.reserve() == pytest.approx(5.1, abs=0.05)
+
+    def test_rate_limit_retries_with_retry_after(self, sleeps):
+        """Test that a 429 is retried after at least the provider's Retry-After."""
+        call = FlakyCall(ProviderError(429, {'retry-after': '7'}))
+        limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=10 ** 6, base_delay=0.01)
+
+        assert limiter.run(call, {'prompt': 'x'}) == 'def f(): pass'
+        assert call.calls == 2
+        assert max(sleeps) >= 7
+
+    def test_backoff_grows_and_gives_up(self, sleeps, monkeypatch):
+        """Test exponential backoff between attempts and that the error surfaces when retries run out."""
+        monkeypatch.setattr(scheduler.random, 'uniform', lambda low, high: high)
+        call = FlakyCall(*[ProviderError(503) for _ in range(4)])
+        limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=10 ** 6,
+                                    max_retries=3, base_delay=1, max_delay=3)
+
+        with pytest.raises(ProviderError):
+            limiter.run(call, {'prompt': 'x'})
+        assert call.calls == 4
+        assert [s for s in sleeps if s > 0] == [1, 2, 3]
+
+    def test_non_retryable_errors_raise_immediately(self, sleeps):
+        """Test that bad requests and parse errors are not retried by the scheduler."""
+        for error in (ProviderError(400), ValueError("bad json")):
+            call = FlakyCall(error)
+            limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=10 ** 6)
+            with pytest.raises(type(error)):
+                limiter.run(call, {'prompt': 'x'})
+            assert call.calls == 1
+
+    def test_async_retry(self, monkeypatch):
+        """Test that the async path retries the same way without blocking the loop."""
+        slept = []
+        async def fake_sleep(seconds):
+            slept.append(seconds)
+        monkeypatch.setattr(scheduler.asyncio, 'sleep', fake_sleep)
+
+        flaky = FlakyCall(ProviderError(529))
+        async def acall(request):
+            return flaky(request)
+
+        limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=10 ** 6, base_delay=0.01)
+        assert asyncio.run(limiter.arun(acall, {'prompt': 'x'})) == 'def f(): pass'
+        assert flaky.calls == 2
+
+    def test_actual_usage_settles_token_estimate(self, sleeps):
+        """Test that the token budget is charged with logged usage rather than the estimate."""
+        usage = []
+        def call(request):
+            log_usage(usage, {'input_tokens': 900, 'output_tokens': 100})
+            return 'ok'
+
+        limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=1000)
+        limiter.run(call, {'prompt': 'x'})
+        assert limiter.tokens.reserve(1) > 0 # 1000 tokens used of a 1000/minute budget
+
+    def test_concurrent_calls_settle_their_own_usage(self):
+        """Test that each of several concurrent calls is settled with the usage it logged itself."""
+        usage, refunds = [], []
+        async def acall(request): # usage lands mid-stream, before the call returns
+            await asyncio.sleep(request['before'])
+            log_usage(usage, {'input_tokens': request['tokens'], 'output_tokens': 0})
+            await asyncio.sleep(request['after'])
+            return request['tokens']
+
+        limiter = ProviderScheduler(requests_per_minute=1000, tokens_per_minute=10 ** 6)
+        limiter.tokens.refund = refunds.append
+        requests = [{'before': 0.0, 'after': 0.05, 'tokens': 10}, {'before': 0.01, 'after': 0.0, 'tokens': 500}]
+        async def both():
+            return await asyncio.gather(*(limiter.arun(acall, request) for request in requests))
+
+        assert asyncio.run(both()) == [10, 500]
+        assert sorted(refunds) == sorted(estimate_tokens(request) - request['tokens'] for request in requests)
+
+    @pytest.mark.parametrize('headers, expected', [
+        ({'retry-after': '12'}, 12),
+        ({'retry-after-ms': '1500', 'retry-after': '2'}, 1.5),
+        ({}, None),
+    ])
+    def test_retry_after_parsing(self, headers, expected):
+        """Test Retry-After in seconds and milliseconds."""
+        assert retry_after(ProviderError(429, headers)) == expected
+
+    def test_retryable_by_name(self):
+        """Test that SDK errors without a status (e.g. connection errors) are matched by type name."""
+        APIConnectionError = type('APIConnectionError', (Exception,), {})
+        assert retryable(APIConnectionError())
+        assert not retryable(KeyError('code'))
@@ -0,0 +1,103 @@
+import pytest
+import tempfile
+import asyncio
+import csv
+import time
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import telemetry
+from pipeline.telemetry import (tagged, timed_call, timed_stage, mark_first_token, record, records, job_records,
+                                summarize, export_calls)
+from pipeline.generation import GenerationPool
+
+
+USAGE = {'input_tokens': 1000, 'output_tokens': 200, 'cached_tokens': 400, 'cache_write_tokens': 0}
+
+
+class TestTelemetry:
+    """Test suite for per-call LLM instrumentation."""
+
+    @pytest.fixture(autouse=True)
+    def fresh_log(self, monkeypatch):
+        """Give every test an empty call log."""
+        monkeypatch.setattr(telemetry, '_records', [])
+        monkeypatch.setattr(telemetry, '_exported', 0)
+        monkeypatch.setattr(telemetry, '_jobs', {})
+
+    def test_record_carries_timing_and_tags(self):
+        """Test that a call records latency, time to first token and the row it belongs to."""
+        with tagged(project='proj', optimizer='4o', prompt_type='FS'), tagged(snippet='def f(): pass'):
+            with timed_call():
+                time.sleep(0.02)
+                mark_first_token()
+                time.sleep(0.02)
+                entry = record(USAGE, '4o', 'gpt-4o')
+
+        assert entry['project'] == 'proj' and entry['prompt_type'] == 'FS' and entry['snippet'] == 'def f(): pass'
+        assert entry['stage'] == 'generate'
+        assert 0.02 <= entry['ttft'] < entry['latency']
+        assert entry['input_tokens'] == 1000
+
+    def test_unstreamed_ttft_is_latency(self):
+        """Test that a response arriving all at once has its first token at the end."""
+        with timed_call():
+            time.sleep(0.01)
+            entry = record(USAGE, '4o', 'gpt-4o')
+        assert entry['ttft'] == entry['latency']
+
+    def test_cost_uses_cached_rate(self):
+        """Test that cached input tokens are billed at the cached price."""
+        entry = record(USAGE, '4o', 'gpt-4o', {'input': 2.0, 'cached': 1.0, 'output': 10.0})
+        assert entry['cost'] == pytest.approx((600 * 2.0 + 400 * 1.0 + 200 * 10.0) / 1e6)
+
+    def test_summarize_splits_llm_and_test_time(self):
+        """Test that per-row summaries separate llm latency from test runs."""
+        with tagged(snippet='a'):
+            with timed_call():
+                record(USAGE, '4o', 'gpt-4o')
+            with timed_stage('tests'):
+                time.sleep(0.01)
+
+        summary = summarize(records(snippet='a'))
+        assert summary['llm_calls'] == 1
+        assert summary['output_tokens'] == 200
+        assert summary['test_seconds'] >= 0.01
+
+    def test_pool_carries_tags_to_loop_thread(self):
+        """Test that calls made on the generation pool are tagged with the submitter's row."""
+        async def call():
+            return record(USAGE, '4o', 'gpt-4o')
+
+        with GenerationPool() as pool, tagged(project='proj', snippet='s', stage='prefetch'):
+            entry = pool.submit('4o', call).result(timeout=5)
+
+        assert entry['project'] == 'proj' and entry['snippet'] == 's' and entry['stage'] == 'prefetch'
+
+    def test_export_appends_new_records(self):
+        """Test that exporting twice writes each call once under a single header."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'llm_calls.csv'
+            record(USAGE, '4o', 'gpt-4o')
+            offset = export_calls(path)
+            record(USAGE, '40', 'claude')
+            export_calls(path, offset)
+
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            assert [row['provider'] for row in rows] == ['4o', '40']
+
+    def test_export_drops_written_records(self, tmp_path):
+        """Test that exported records leave the log, while each job still gets all of its own once."""
+        with tagged(project='proj', optimizer='4o', prompt_type='FS'):
+            record(USAGE, '4o', 'gpt-4o')
+        offset = export_calls(tmp_path / 'llm_calls.csv')
+        assert records() == [] and offset == 1
+
+        with tagged(project='proj', optimizer='4o', prompt_type='FS'):
+            record(USAGE, '4o', 'gpt-4o')
+        assert len(job_records('proj', '4o', 'FS')) == 2 # exported or not
+        assert job_records('proj', '4o', 'FS') == []
+        assert export_calls(tmp_path / 'llm_calls.csv', offset) == 2
@@ -0,0 +1,81 @@
+import pytest
+from concurrent.futures import Future
+from pathlib import Path
+from unittest.mock import Mock
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import pipeline
+from pipeline.pipeline import _tournament
+from pipeline.components import InvalidCandidate
+
+
+OLD = 'def f(x):\n    return sorted(x)[0]\n'
+CODE_OBJECT = {'code': OLD, 'scope': OLD, 'rel_path': 'pkg/mod.py', 'start_line': 1}
+
+
+def resolved(value):
+    future = Future()
+    if isinstance(value, Exception):
+        future.set_exception(value)
+    else:
+        future.set_result(value)
+    return future
+
+
+class FakeGen:
+    """Generation pool handing out queued candidates in order."""
+
+    def __init__(self, *candidates):
+        self.candidates = list(candidates)
+
+    def generate(self, optim, prompt, snippet, scope):
+        return resolved(self.candidates.pop(0))
+
+
+class TestTournament:
+    """Test suite for multi-candidate sampling with tournament selection."""
+
+    @pytest.fixture
+    def trials(self, monkeypatch):
+        """Stand in for checkout test runs - failing tests & runtime are looked up per candidate."""
+        outcomes = {}
+        monkeypatch.setattr(pipeline, 'check_candidate', lambda code_object, snippet, root: None)
+        monkeypatch.setattr(pipeline, '_trial',
+                            lambda pool, project, code_object, snippet, og_failures: outcomes[snippet][0])
+        monkeypatch.setattr(pipeline, '_time_candidate',
+                            lambda pool, project, code_object, snippet: outcomes[snippet][1])
+        return outcomes
+
+    def run(self, gen, k, prefetched=None):
+        return _tournament(gen, Mock(size=4), Mock(root_dir='.'), Mock(), 'prompt',
+                           CODE_OBJECT, frozenset({'tests.test_mod::test_flaky'}), k, prefetched)
+
+    def test_fastest_passing_candidate_wins(self, trials):
+        """Test that failing candidates drop out and the fastest survivor is returned."""
+        trials.update({'def f(x): return min(x)': (frozenset(), 1.0),
+                       'def f(x): return x[0]': (frozenset({'tests.test_mod::test_min'}), 0.1), # fast but wrong
+                       'def f(x): return sorted(x)[0]': (frozenset({'tests.test_mod::test_flaky'}), 3.0)})
+        gen = FakeGen(*trials)
+        assert self.run(gen, 3) == 'def f(x): return min(x)'
+
+    def test_prefetch_counts_towards_k(self, trials):
+        """Test that a prefetched generation is one of the k candidates."""
+        trials.update({'prefetched': (frozenset(), 0.5), 'fresh': (frozenset(), 1.0)})
+        gen = FakeGen('fresh')
+        assert self.run(gen, 2, resolved('prefetched')) == 'prefetched'
+        assert gen.candidates == []
+
+    def test_failed_generations_and_duplicates(self, trials):
+        """Test that generation errors are skipped and identical samples tested once."""
+        trials.update({'def f(x): return min(x)': (frozenset(), 1.0)})
+        gen = FakeGen(ValueError('no code'), 'def f(x): return min(x)', 'def f(x): return min(x)')
+        assert self.run(gen, 3) == 'def f(x): return min(x)'
+
+    def test_no_survivors_is_invalid(self, trials):
+        """Test that a round where every candidate fails is an invalid attempt."""
+        trials.update({'a': (frozenset({'tests.test_mod::test_min'}), 1.0), 'b': (None, None)})
+        with pytest.raises(InvalidCandidate) as e:
+            self.run(FakeGen('a', 'b'), 2)
+        assert e.value.stage == 'tournament'
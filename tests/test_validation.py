@@ -0,0 +1,169 @@
+import pytest
+import tempfile
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.components.validation import (InvalidCandidate, StreamAborted, StreamGuard, check_candidate,
+                                            import_check, module_name, _json_string)
+import json
+
+
+MODULE = '''import math
+
+class Shape:
+    def area(self, radius, scale=1):
+        total = 0
+        for _ in range(scale):
+            total += math.pi * radius ** 2
+        return total
+'''
+
+
+class TestStaticValidation:
+    """Test suite for the static pre-validation gate run before any tests."""
+
+    @pytest.fixture
+    def project(self):
+        """Create a temporary package containing a method to optimize."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root / 'pkg').mkdir()
+            (root / 'pkg' / '__init__.py').write_text('', encoding='utf-8')
+            (root / 'pkg' / 'shapes.py').write_text(MODULE, encoding='utf-8')
+
+            code_object = {'rel_path': Path('pkg') / 'shapes.py',
+                           'base_indent': 4,
+                           'code': 'def area(self, radius, scale=1):\n    total = 0\n    for _ in range(scale):\n'
+                                   '        total += math.pi * radius ** 2\n    return total\n',
+                           'start_line': 3,
+                           'end_line': 7,
+                           'scope': [{'type': 'class', 'name': 'Shape'}]}
+            yield root, code_object
+
+    def test_valid_candidate_passes(self, project):
+        """Test that a well-formed candidate passes every static check."""
+        root, code_object = project
+        check_candidate(code_object, 'def area(self, radius, scale=1):\n    return scale * math.pi * radius ** 2', root)
+
+    def test_syntax_error_rejected(self, project):
+        """Test that unparsable output is rejected at the syntax stage."""
+        root, code_object = project
+        with pytest.raises(InvalidCandidate) as e:
+            check_candidate(code_object, 'def area(self, radius, scale=1)\n    return 0', root)
+        assert e.value.stage == 'syntax'
+
+    def test_empty_candidate_rejected(self, project):
+        """Test that an empty response is rejected instead of crashing the patcher."""
+        root, code_object = project
+        with pytest.raises(InvalidCandidate) as e:
+            check_candidate(code_object, '   \n', root)
+        assert e.value.stage == 'syntax'
+
+    def test_missing_def_rejected(self, project):
+        """Test that a candidate which renames the object is rejected."""
+        root, code_object = project
+        with pytest.raises(InvalidCandidate) as e:
+            check_candidate(code_object, 'def fast_area(self, radius, scale=1):\n    return 0', root)
+        assert e.value.stage == 'signature'
+
+    @pytest.mark.parametrize('candidate', [
+        'def area(self, radius):\n    return 0',
+        'def area(self, r, scale=1):\n    return 0',
+        'def area(self, radius, scale):\n    return 0',
+        'async def area(self, radius, scale=1):\n    return 0',
+    ])
+    def test_changed_signature_rejected(self, project, candidate):
+        """Test that parameter, default or def-kind changes are rejected."""
+        root, code_object = project
+        with pytest.raises(InvalidCandidate) as e:
+            check_candidate(code_object, candidate, root)
+        assert e.value.stage == 'signature'
+
+    def test_compile_error_rejected(self, project):
+        """Test that code which parses but cannot compile in the module is rejected."""
+        root, code_object = project
+        with pytest.raises(InvalidCandidate) as e:
+            check_candidate(code_object, 'def area(self, radius, scale=1):\n    nonlocal total\n    return 0', root)
+        assert e.value.stage == 'compile'
+
+    def test_import_check(self, project):
+        """Test the import smoke test against the patched module on disk."""
+        root, code_object = project
+        import_check(code_object, root, sys.executable)
+
+        (root / 'pkg' / 'shapes.py').write_text('import not_a_real_module_xyz\n' + MODULE, encoding='utf-8')
+        with pytest.raises(InvalidCandidate) as e:
+            import_check(code_object, root, sys.executable)
+        assert e.value.stage == 'import'
+
+    def test_module_name(self):
+        """Test module names derived from project-relative paths."""
+        assert module_name(Path('pkg') / 'shapes.py') == 'pkg.shapes'
+        assert module_name(Path('src') / 'pkg' / '__init__.py') == 'pkg'
+        assert module_name(Path('scripts') / 'run-me.py') is None
+
+
+class TestStreamGuard:
+    """Test suite for aborting streamed generations from partial structured output."""
+
+    OLD = 'def area(self, radius, scale=1):\n    return math.pi * radius ** 2 * scale\n'
+
+    @staticmethod
+    def chunks(code, size=7):
+        """Yield growing prefixes of a JSON response, as a stream would deliver them."""
+        text = json.dumps({'code': code})
+        for end in range(size, len(text) + size, size):
+            yield text[:end]
+
+    def feed_all(self, guard, code):
+        """Feed every prefix, returning how many were consumed before an abort."""
+        for fed, buffer in enumerate(self.chunks(code), 1):
+            guard.feed(buffer)
+        return fed
+
+    @pytest.mark.parametrize('buffer, expected', [
+        ('{"co', (None, False)),
+        ('{"code": "def f(', ('def f(', False)),
+        ('{"code": "a\\nb\\', ('a\nb', False)),
+        ('{"code": "x = \\"1\\"\\u00e9"}', ('x = "1"é', True)),
+    ])
+    def test_json_string(self, buffer, expected):
+        """Test that the code field decodes from truncated JSON, including split escapes."""
+        assert _json_string(buffer, 'code') == expected
+
+    def test_valid_candidate_streams_through(self):
+        """Test that a well-formed candidate never aborts, even with open brackets mid-stream."""
+        code = 'def area(self, radius, scale=1):\n    values = [\n        math.pi,\n    ]\n    return values[0] * radius ** 2 * scale\n'
+        self.feed_all(StreamGuard(self.OLD), code)
+
+    @pytest.mark.parametrize('code', [
+        'def area(self, radius, scale=1):\n        x = 1\n    return x\n    y = 2\n  z = 3\n' + 'pass\n' * 40,
+        'def area(self, radius, scale=1):\n    x = 1)\n' + '    pass\n' * 40,
+    ])
+    def test_untokenizable_code_aborts_early(self, code):
+        """Test that broken indentation or brackets cancel the stream before it finishes."""
+        guard = StreamGuard(self.OLD)
+        with pytest.raises(StreamAborted) as excinfo:
+            self.feed_all(guard, code)
+
+        assert excinfo.value.stage == 'stream'
+        assert len(excinfo.value.partial) < len(code)
+        assert isinstance(excinfo.value, InvalidCandidate)
+
+    def test_renamed_definition_aborts(self):
+        """Test that a candidate whose code ends without defining the original name is aborted."""
+        code = 'def fast_area(self, radius, scale=1):\n' + '    pass\n' * 40
+        with pytest.raises(StreamAborted, match="'area'"):
+            self.feed_all(StreamGuard(self.OLD), code)
+
+    def test_helpers_before_original_are_allowed(self):
+        """Test that imports & helper definitions may come before the original name."""
+        code = 'import math\n\ndef _sq(x):\n    return x * x\n\ndef area(self, radius, scale=1):\n    return _sq(radius) * scale\n'
+        self.feed_all(StreamGuard(self.OLD), code)
+
+    def test_helpers_after_original_are_allowed(self):
+        """Test that only the first definition has to keep the original name."""
+        code = 'def area(self, radius, scale=1):\n    return _sq(radius) * scale\n\ndef _sq(x):\n    return x * x\n'
+        self.feed_all(StreamGuard(self.OLD), code)
@@ -0,0 +1,196 @@
+import pytest
+import threading
+import time
+import pandas as pd
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline import workqueue
+from pipeline.workqueue import WorkQueue, optimize_queue, run_worker
+from pipeline.profiler.filter_profiles import set_benchmark_lane
+
+
+def fake_job(job, optim_factory, metaprompter_factory):
+    """Job returning one row naming its cell."""
+    time.sleep(0.05)
+    if job['prompt_type'] == 'COT':
+        raise ValueError('provider down')
+    row = {'project': job['project'], 'optimizer': job['optimizer'], 'prompt_type': job['prompt_type'],
+           'avg_runtime': 0.5, 'func_speedup': None}
+    return pd.DataFrame([row]), [{'stage': 'generate', 'provider': job['optimizer'], 'latency': 0.1}]
+
+
+class TestWorkQueue:
+    """Test suite for the SQLite work queue of multi-machine sweeps."""
+
+    @pytest.fixture(autouse=True)
+    def restore_lane(self):
+        """Put back the in-process lane after each test."""
+        yield
+        set_benchmark_lane(threading.Lock(), None)
+
+    @pytest.fixture
+    def queue_path(self, tmp_path):
+        """Temporary SQLite file for the queue."""
+        return tmp_path / 'queue.sqlite'
+
+    def test_each_job_claimed_once(self, queue_path):
+        """Test that concurrent workers never get the same job."""
+        queue = WorkQueue(queue_path)
+        for prompt_type in ('MP', 'FS', 'COT', 'BASE'):
+            queue.enqueue('proj', '4o', prompt_type)
+            queue.enqueue('proj', '4o', prompt_type) # queued twice - still one job
+
+        claimed = []
+        def claim_all(worker):
+            queues = WorkQueue(queue_path) # a connection per worker, as on separate nodes
+            while (job := queues.claim(worker)) is not None:
+                claimed.append(job['prompt_type'])
+        threads = [threading.Thread(target=claim_all, args=(f'w{i}',)) for i in range(4)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        assert sorted(claimed) == ['BASE', 'COT', 'FS', 'MP']
+
+    def test_claim_filters_optimizers(self, queue_path):
+        """Test that workers only get jobs of optimizers they can run."""
+        queue = WorkQueue(queue_path)
+        queue.enqueue('proj', '40', 'MP')
+        queue.enqueue('proj', '4o', 'MP')
+        assert queue.claim('w', ['4o'])['optimizer'] == '4o'
+        assert queue.claim('w', ['4o']) is None
+
+    def test_expired_lease_is_reclaimed(self, queue_path):
+        """Test that a dead worker's job goes to the next worker, and only one result is kept."""
+        queue = WorkQueue(queue_path, lease_seconds=0.05)
+        queue.enqueue('proj', '4o', 'MP')
+        first = queue.claim('dead')
+        assert queue.claim('alive') is None
+
+        time.sleep(0.1)
+        second = queue.claim('alive')
+        assert second['id'] == first['id'] and second['attempt'] == 2
+
+        rows = pd.DataFrame([{'prompt_type': 'MP'}])
+        assert queue.complete(second['id'], 'alive', rows, [])
+        assert not queue.complete(first['id'], 'dead', rows, []) # the late one is dropped
+        assert len(queue.collect()) == 1
+
+    def test_lost_workers_give_up(self, queue_path):
+        """Test that a job whose lease runs out on every attempt fails instead of looping."""
+        queue = WorkQueue(queue_path, lease_seconds=0.05, max_attempts=2)
+        queue.enqueue('proj', '4o', 'MP')
+        for _ in range(2):
+            assert queue.claim('dying') is not None
+            time.sleep(0.1)
+
+        assert queue.claim('alive') is None
+        assert queue.counts() == {'failed': 1}
+
+    def test_lease_kept_during_baseline(self, queue_path, monkeypatch):
+        """Test that a claimed job's lease is renewed while the worker measures its baseline."""
+        monkeypatch.setattr(workqueue, '_grid_job', fake_job)
+        stolen = []
+        def slow_baseline(proj_name):
+            time.sleep(0.4) # well past the lease
+            stolen.append(WorkQueue(queue_path).claim('thief'))
+            return {'baseline': (frozenset(), 1.0), 'base': 'HEAD'}
+        monkeypatch.setattr(workqueue, '_local_baseline', slow_baseline)
+
+        queue = WorkQueue(queue_path, lease_seconds=0.15)
+        queue.enqueue('proj', '4o', 'MP')
+        queue.seal()
+        assert run_worker(queue, {'4o': None}, None, slots=1, worker='node', poll_seconds=0.05) == 1
+        assert stolen == [None]
+
+    def test_broken_baseline_left_to_other_workers(self, queue_path, monkeypatch):
+        """Test that a worker whose suite errors doesn't use up a job's attempts on its own."""
+        monkeypatch.setattr(workqueue, '_grid_job', fake_job)
+        failed_here = threading.Event()
+        def local_baseline(proj_name):
+            if threading.current_thread().name == 'broken':
+                failed_here.set()
+                return None
+            return {'baseline': (frozenset(), 1.0), 'base': 'HEAD'}
+        monkeypatch.setattr(workqueue, '_local_baseline', local_baseline)
+
+        queue = WorkQueue(queue_path, max_attempts=2)
+        queue.enqueue('proj', '4o', 'MP')
+        queue.seal()
+        finished = {}
+        def work(name):
+            finished[name] = run_worker(WorkQueue(queue_path, max_attempts=2), {'4o': None}, None, slots=1,
+                                        worker=name, poll_seconds=0.05)
+        broken = threading.Thread(target=work, args=('broken',), name='broken')
+        broken.start()
+        assert failed_here.wait(5)
+        work('healthy')
+        broken.join()
+
+        assert finished == {'broken': 0, 'healthy': 1}
+        assert queue.counts() == {'done': 1}
+
+    def test_heartbeat_keeps_lease(self, queue_path):
+        """Test that a renewed lease keeps other workers off a running job."""
+        queue = WorkQueue(queue_path, lease_seconds=0.2)
+        queue.enqueue('proj', '4o', 'MP')
+        job = queue.claim('w1')
+        time.sleep(0.15)
+        queue.heartbeat([job['id']], 'w1')
+        time.sleep(0.1)
+        assert queue.claim('w2') is None
+
+    def test_failures_retry_then_give_up(self, queue_path):
+        """Test that a failing job is retried up to max_attempts."""
+        queue = WorkQueue(queue_path, max_attempts=2)
+        queue.enqueue('proj', '4o', 'MP')
+        for _ in range(2):
+            job = queue.claim('w')
+            queue.fail(job['id'], 'w', 'boom')
+
+        assert queue.claim('w') is None
+        assert queue.counts() == {'failed': 1}
+        assert queue.failures()[0]['error'] == 'boom'
+
+        queue.enqueue('proj', '4o', 'MP') # a new sweep tries again
+        assert queue.counts() == {'pending': 1}
+
+    def test_collected_once(self, queue_path):
+        """Test that result rows survive the round trip and are handed out once."""
+        queue = WorkQueue(queue_path)
+        queue.enqueue('proj', '4o', 'MP')
+        job = queue.claim('w')
+        queue.complete(job['id'], 'w', pd.DataFrame([{'avg_runtime': 0.5, 'func_speedup': None}]),
+                       [{'stage': 'generate'}])
+
+        (collected, rows, calls), = queue.collect()
+        assert collected['prompt_type'] == 'MP'
+        assert rows.iloc[0]['avg_runtime'] == 0.5 and calls == [{'stage': 'generate'}]
+        assert queue.collect() == []
+
+        queue.enqueue('proj', '4o', 'MP') # done & collected - a new sweep runs it again
+        assert queue.counts() == {'pending': 1}
+
+    def test_workers_drain_the_sweep(self, queue_path, monkeypatch):
+        """Test that two workers run every job once and the coordinator gets every result."""
+        monkeypatch.setattr(workqueue, '_grid_job', fake_job)
+        monkeypatch.setattr(workqueue, '_local_baseline',
+                            lambda proj_name: {'baseline': (frozenset(), 1.0), 'base': 'HEAD'})
+        added = []
+        monkeypatch.setattr(workqueue, 'add_records', added.extend)
+
+        finished = []
+        workers = [threading.Thread(target=lambda name: finished.append(run_worker(
+                       WorkQueue(queue_path, max_attempts=2), {'4o': None, '40': None}, None, slots=2,
+                       worker=name, poll_seconds=0.05)), args=(f'node{i}',)) for i in range(2)]
+        [worker.start() for worker in workers] # wait on the empty queue until the coordinator seals it
+        results = list(optimize_queue(['4o', '40'], WorkQueue(queue_path, max_attempts=2), ['proj'],
+                                      poll_seconds=0.05))
+        [worker.join() for worker in workers]
+
+        cells = sorted((row['optimizer'], row['prompt_type']) for result in results for _, row in result.iterrows())
+        assert cells == sorted((optim, prompt_type) for optim in ('4o', '40') for prompt_type in ('MP', 'FS', 'BASE'))
+        assert sum(finished) == 6 and len(added) == 6
+        assert WorkQueue(queue_path).counts() == {'done': 6, 'failed': 2} # COT jobs failed both attempts
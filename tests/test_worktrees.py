@@ -0,0 +1,112 @@
+import pytest
+import tempfile
+import subprocess
+import threading
+from pathlib import Path
+import sys
+
+# Add parent directory to path to import the module
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from pipeline.components.worktrees import WorktreePool
+
+
+class TestWorktreePool:
+    """Test suite for WorktreePool leasing isolated checkouts."""
+
+    @pytest.fixture
+    def temp_git_repo(self):
+        """Create a temporary git repository with an uncommitted setup edit."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            repo = Path(temp_dir) / 'project'
+            repo.mkdir()
+
+            subprocess.run(['git', 'init'], cwd=repo, check=True, capture_output=True)
+            subprocess.run(['git', 'config', 'user.email', 'test@test.com'], cwd=repo, check=True, capture_output=True)
+            subprocess.run(['git', 'config', 'user.name', 'Test User'], cwd=repo, check=True, capture_output=True)
+
+            (repo / 'module.py').write_text('def f():\n    return 1\n', encoding='utf-8')
+            (repo / 'pyproject.toml').write_text('[tool.pytest.ini_options]\n', encoding='utf-8')
+            subprocess.run(['git', 'add', '.'], cwd=repo, check=True, capture_output=True)
+            subprocess.run(['git', 'commit', '-m', 'Initial commit'], cwd=repo, check=True, capture_output=True)
+
+            # setup.py edits pyproject.toml without committing
+            (repo / 'pyproject.toml').write_text('[tool.pytest.ini_options]\ntestpaths = ["tests"]\n', encoding='utf-8')
+
+            yield repo, Path(temp_dir) / 'worktrees'
+
+    def test_lease_is_isolated_checkout(self, temp_git_repo):
+        """Test that edits in a leased tree do not touch the main checkout."""
+        repo, worktrees = temp_git_repo
+        with WorktreePool(repo, size=2, worktrees_dir=worktrees) as pool:
+            with pool.lease() as tree:
+                assert tree != repo
+                (tree / 'module.py').write_text('def f():\n    return 2\n', encoding='utf-8')
+
+            assert 'return 1' in (repo / 'module.py').read_text(encoding='utf-8')
+
+    def test_lease_includes_uncommitted_setup_edits(self, temp_git_repo):
+        """Test that leased trees see the working-tree state, not just HEAD."""
+        repo, worktrees = temp_git_repo
+        with WorktreePool(repo, size=1, worktrees_dir=worktrees) as pool:
+            with pool.lease() as tree:
+                assert 'testpaths' in (tree / 'pyproject.toml').read_text(encoding='utf-8')
+
+    def test_release_resets_tree(self, temp_git_repo):
+        """Test that a released tree is clean when it is leased again."""
+        repo, worktrees = temp_git_repo
+        with WorktreePool(repo, size=1, worktrees_dir=worktrees) as pool:
+            with pool.lease() as tree:
+                (tree / 'module.py').write_text('broken', encoding='utf-8')
+                (tree / 'scratch.py').write_text('x = 1\n', encoding='utf-8')
+
+            with pool.lease() as same_tree:
+                assert same_tree == tree
+                assert 'return 1' in (same_tree / 'module.py').read_text(encoding='utf-8')
+                assert not (same_tree / 'scratch.py').exists()
+
+    def test_concurrent_leases_are_distinct(self, temp_git_repo):
+        """Test that concurrent leases never share a tree and respect the pool size."""
+        repo, worktrees = temp_git_repo
+        leased = []
+        lock = threading.Lock()
+
+        with WorktreePool(repo, size=2, worktrees_dir=worktrees) as pool:
+            first, second = pool.acquire(), pool.acquire()
+            assert first != second
+
+            def worker():
+                tree = pool.acquire() # blocks until a release
+                with lock:
+                    leased.append(tree)
+                pool.release(tree)
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            pool.release(first)
+            thread.join(timeout=30)
+
+            assert leased == [first]
+            pool.release(second)
+
+    def test_close_removes_worktrees(self, temp_git_repo):
+        """Test that closing the pool unregisters every worktree."""
+        repo, worktrees = temp_git_repo
+        pool = WorktreePool(repo, size=1, worktrees_dir=worktrees)
+        with pool.lease() as tree:
+            pass
+        pool.close()
+
+        listed = subprocess.run(['git', 'worktree', 'list'], cwd=repo, capture_output=True, text=True).stdout
+        assert str(tree) not in listed
+        assert not tree.exists()
+
+    def test_mirror_replays_patches(self, temp_git_repo):
+        """Test that patches applied in one leased tree can be replayed onto another."""
+        repo, worktrees = temp_git_repo
+        with WorktreePool(repo, size=2, worktrees_dir=worktrees) as pool:
+            with pool.lease() as source, pool.lease() as tree:
+                (source / 'module.py').write_text('def f():\n    return 3\n', encoding='utf-8')
+                pool.mirror(tree, source)
+
+                assert 'return 3' in (tree / 'module.py').read_text(encoding='utf-8')
+                assert 'testpaths' in (tree / 'pyproject.toml').read_text(encoding='utf-8')